@@ -1,9 +1,20 @@
-import http.client
 import json
 import csv
+import threading
 import time
+from itertools import chain
 from urllib.parse import urlencode
 
+from degree_index import DegreeIndex
+from snapshot import open_snapshot, write_graph_snapshot
+from tmdb_cache import CacheMiss, InflightMemo, ResponseCache
+from tmdb_metrics import ClientMetrics, endpoint_of
+from tmdb_pool import ACCEPT_ENCODING, ConnectionPool, decode_body
+from tmdb_records import cast_credits, movie_credits
+
+# guards the lazily created TMDBAPIUtils state
+_STATE_LOCK = threading.Lock()
+
 #############################################################################################################################
 
 class Graph:
@@ -30,6 +41,23 @@ class Graph:
             self.edges = [(e[0], e[1]) for e in edges_CSV]
             self._edges_set = {tuple(sorted((e[0], e[1]))) for e in self.edges}
 
+    def _index_edges(self) -> None:
+        """
+        Rebuild the edge dedup set from self.edges; the degree index is rebuilt on its next use
+        """
+        self._edges_set = {(a, b) if a < b else (b, a) for a, b in self.edges}
+        self.__dict__.pop("_degrees", None)
+
+    def _degree_index(self) -> DegreeIndex:
+        """
+        Node degrees, counted from self.edges on first use and kept up to date by add_edge afterwards
+        """
+        degrees = self.__dict__.get("_degrees")
+        if degrees is None:
+            degrees = self._degrees = DegreeIndex()
+            degrees.update(chain.from_iterable(self.edges))
+        return degrees
+
     def add_node(self, id: str, name: str) -> None:
         """
         add a tuple (id, name) representing a node to self.nodes if it does not already exist
@@ -56,6 +84,10 @@ class Graph:
         if (a, b) not in self._edges_set:
             self._edges_set.add((a, b))
             self.edges.append((a, b))
+            degrees = self.__dict__.get("_degrees")
+            if degrees is not None:
+                degrees.increment(a)
+                degrees.increment(b)
 
 
     def total_nodes(self) -> int:
@@ -78,14 +110,19 @@ class Graph:
         e.g. {'a': 8}
         or {'a': 22, 'b': 22}
         """
-        deg = {}
-        for a, b in self.edges:
-            deg[a] = deg.get(a, 0) + 1
-            deg[b] = deg.get(b, 0) + 1
-        if not deg:
-            return {}
-        mx = max(deg.values())
-        return {nid: d for nid, d in deg.items() if d == mx}
+        return self._degree_index().max_nodes()
+
+    def top_degree_nodes(self, k: int = 10) -> list:
+        """
+        Return the k nodes with the highest degree as a list of (node_id, degree), highest first
+        """
+        return self._degree_index().top(k)
+
+    def degree_histogram(self) -> dict:
+        """
+        Return {degree: number of nodes with that degree}, e.g. for monitoring a crawl as it grows
+        """
+        return self._degree_index().histogram()
 
     def print_nodes(self):
         """
@@ -131,46 +168,219 @@ class Graph:
         nodes_file.close()
         print("finished writing nodes to csv")
 
+    def export_csv(self, nodes_path="nodes.csv", edges_path="edges.csv") -> None:
+        """
+        write nodes.csv and edges.csv in the same format as write_nodes_file / write_edges_file, streamed
+        through a large write buffer instead of one unbuffered write per row
+        :param nodes_path: string
+        :param edges_path: string
+        :return: None
+        """
+        with open(nodes_path, "w", encoding="utf-8", buffering=1 << 20) as nodes_file:
+            nodes_file.write("id,name\n")
+            nodes_file.writelines(n[0] + "," + n[1] + "\n" for n in self.nodes)
+        print("finished writing nodes to csv")
+        with open(edges_path, "w", encoding="utf-8", buffering=1 << 20) as edges_file:
+            edges_file.write("source,target\n")
+            edges_file.writelines(e[0] + "," + e[1] + "\n" for e in self.edges)
+        print("finished writing edges to csv")
+
+    @classmethod
+    def from_csv(cls, nodes_path="nodes.csv", edges_path="edges.csv") -> "Graph":
+        """
+        load a Graph from nodes.csv / edges.csv row by row, without first reading each file into a list
+        :param nodes_path: string
+        :param edges_path: string
+        :return: Graph
+        """
+        g = cls()
+        with open(nodes_path, encoding="utf-8", newline="") as f:
+            rows = csv.reader(f)
+            next(rows, None)
+            g.nodes = [(n[0], n[1]) for n in rows]
+        g._node_ids = {n[0] for n in g.nodes}
+        with open(edges_path, encoding="utf-8", newline="") as f:
+            rows = csv.reader(f)
+            next(rows, None)
+            g.edges = [(e[0], e[1]) for e in rows]
+        g._index_edges()
+        return g
+
+    def save_snapshot(self, path="graph.snap") -> None:
+        """
+        write the graph as a binary snapshot (see snapshot.py)
+        :param path: string
+        :return: None
+        """
+        write_graph_snapshot(path, self.nodes, self.edges)
+
+    @classmethod
+    def load_snapshot(cls, path="graph.snap") -> "Graph":
+        """
+        load a Graph from a binary snapshot written by save_snapshot
+        For zero-copy, read-only access without building a Graph use snapshot.open_snapshot(path)
+        :param path: string
+        :return: Graph
+        """
+        g = cls()
+        with open_snapshot(path) as snap:
+            g.nodes = list(snap.iter_nodes())
+            g.edges = list(snap.iter_edges())
+        g._node_ids = {n[0] for n in g.nodes}
+        g._index_edges()
+        return g
+
 
 class  TMDBAPIUtils:
 
+    # __init__ takes only the key, so these are class defaults that create() sets per client
+    cache = None                       # optional tmdb_cache.ResponseCache
+    log_requests = False               # print every request path sent over the network
+
     # Do not modify
     def __init__(self, api_key:str):
         self.api_key = api_key
         self._host = "api.themoviedb.org"
         self._base = "/3"
 
+    @classmethod
+    def create(cls, api_key: str, cache=None, log_requests: bool = False) -> "TMDBAPIUtils":
+        """
+        A client with an optional response cache and request logging
+        """
+        tmdb = cls(api_key)
+        tmdb.cache = cache
+        tmdb.log_requests = log_requests
+        return tmdb
+
+    def _state(self, name: str, factory):
+        """
+        Per-client state created on first use (by any thread, exactly once), since __init__ can't set it up
+        """
+        value = self.__dict__.get(name)
+        if value is None:
+            with _STATE_LOCK:
+                value = self.__dict__.get(name)
+                if value is None:
+                    value = self.__dict__[name] = factory()
+        return value
+
+    @property
+    def _pool(self) -> ConnectionPool:
+        return self._state("_pool", lambda: ConnectionPool(self._host, timeout=20))
+
+    @_pool.setter
+    def _pool(self, pool: ConnectionPool) -> None:
+        self.__dict__["_pool"] = pool
+
+    @property
+    def _movie_credits(self) -> InflightMemo:
+        # /movie/{id}/credits casts fetched this run
+        return self._state("_movie_credits", InflightMemo)
+
+    @property
+    def metrics(self) -> ClientMetrics:
+        return self._state("metrics", ClientMetrics)
+
     def _get(self, path: str, params: dict) -> dict:
         """
-        Minimal HTTP GET using http.client with retry/backoff.
+        Minimal HTTP GET over pooled keep-alive connections with retry/backoff.
+        gzip/deflate transfer is requested and undone here, the cache stores decoded bodies.
+        Responses are served from / stored in self.cache when one is set.
+        Latency, statuses, retries and give-ups are recorded per endpoint in self.metrics.
         Returns parsed JSON dict or {} on failure.
         """
         params = dict(params or {})
         params.setdefault("language", "en-US")
         params.setdefault("api_key", self.api_key)
 
+        metrics = self.metrics
+        endpoint = endpoint_of(path)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(path, params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.record_cache_hit(endpoint)
+                return json.loads(cached.decode("utf-8"))
+            if self.cache.mode == "replay":
+                metrics.record_failure(endpoint, "cache_miss")
+                raise CacheMiss(key)
+
         qs = "?" + urlencode(params)
         full_path = f"{self._base}{path}{qs}"
-        print(full_path)
+        if self.log_requests:
+            print(full_path)
 
         backoffs = [0.25, 0.5, 1.0]
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
         for i, delay in enumerate(backoffs):
+            if i:
+                metrics.record_retry(endpoint)
+            started = time.perf_counter()
             try:
-                conn = http.client.HTTPSConnection(self._host, timeout=20)
-                conn.request("GET", full_path)
-                resp = conn.getresponse()
-                data = resp.read()
-                conn.close()
-                if resp.status == 200 and data:
-                    try:
-                        return json.loads(data.decode("utf-8"))
-                    except Exception:
-                        return {}
+                status, resp_headers, raw = self._pool.request("GET", full_path, headers)
             except Exception:
+                metrics.record_error(endpoint, time.perf_counter() - started)
                 # brief backoff
                 time.sleep(delay)
+                continue
+            elapsed = time.perf_counter() - started
+            try:
+                data = decode_body(raw, resp_headers.get("Content-Encoding"))
+            except Exception:
+                metrics.record_response(endpoint, status, len(raw), elapsed)
+                metrics.record_failure(endpoint, "bad_encoding")
+                return {}
+            metrics.record_response(endpoint, status, len(raw), elapsed, len(data))
+            if status == 200 and data:
+                try:
+                    parsed = json.loads(data)
+                except Exception:
+                    metrics.record_failure(endpoint, "invalid_json")
+                    return {}
+                if key is not None:
+                    self.cache.put(key, data)
+                return parsed
+        metrics.record_failure(endpoint, "retries_exhausted")
         return {}
 
+    def connection_stats(self) -> dict:
+        """
+        Returns the connection pool counters, e.g. {'created': 2, 'reused': 418, 'idle': 2}
+        """
+        return self._pool.stats()
+
+    def memo_stats(self) -> dict:
+        """
+        Returns the movie credits memo counters (hits, coalesced in-flight waits, hit rate, HTTP calls saved)
+        """
+        return self._movie_credits.stats()
+
+    def stats(self) -> dict:
+        """
+        Returns the request metrics together with the memo, connection pool and cache counters, JSON-serializable
+        """
+        out = self.metrics.snapshot()
+        out["movie_credits_memo"] = self.memo_stats()
+        out["connections"] = self.connection_stats()
+        if self.cache is not None:
+            out["cache"] = self.cache.stats()
+        return out
+
+    def dump_stats(self, path: str) -> None:
+        """
+        Write stats() to `path` as JSON
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.stats(), f, indent=2)
+
+    def close(self) -> None:
+        """
+        Close the pooled connections
+        """
+        self._pool.close()
+
     def get_movie_cast(self, movie_id:str, limit:int=None, exclude_ids:list[int]=None) -> list:
         """
         Get the movie cast for a given movie id, with optional parameters to exclude a cast member
@@ -180,10 +390,18 @@ class  TMDBAPIUtils:
         :param string movie_id: a movie_id
         :param list exclude_ids: a list of ints containing ids of cast members that should be excluded from the returned result
         :param int limit: limit the number of results returned to this value (after sorting by 'order' asc)
-        :return: list of dicts (the 'cast' array from the API), possibly filtered/limited
+        :return: list of dicts (the 'cast' array from the API, keeping 'id', 'name' and 'order'), possibly filtered/limited
         """
-        data = self._get(f"/movie/{movie_id}/credits", params={})
-        cast = data.get("cast") or []
+        return [c.to_dict() for c in self.get_movie_cast_records(movie_id, limit, exclude_ids)]
+
+    def get_movie_cast_records(self, movie_id:str, limit:int=None, exclude_ids:list[int]=None) -> list:
+        """
+        get_movie_cast without the copy to dicts
+        :return: list of tmdb_records.CastCredit (dict-style .get() works), possibly filtered/limited
+        """
+        # the payload is fetched and decoded into records once per movie and shared, the filtering below is per call
+        cast = self._movie_credits.get_or_compute(
+            str(movie_id), lambda: cast_credits(self._get(f"/movie/{movie_id}/credits", params={})))
         filtered = []
         ex = set(str(x) for x in (exclude_ids or []))
         for c in cast:
@@ -191,7 +409,7 @@ class  TMDBAPIUtils:
             if not cid or cid in ex:
                 continue
             ord_val = c.get("order", None)
-            if isinstance(ord_val, int) and 0 <= ord_val < limit:
+            if isinstance(ord_val, int) and 0 <= ord_val and (limit is None or ord_val < limit):
                 filtered.append(c)
 
         filtered.sort(key=lambda c: c.get("order", 10**9))
@@ -210,7 +428,18 @@ class  TMDBAPIUtils:
         :return: list of dicts (the 'cast' array from the API) filtered by the optional dates (inclusive)
         """
         data = self._get(f"/person/{person_id}/movie_credits", params={})
-        cast = data.get("cast") or []
+        return self._in_window(data.get("cast") or [], start_date, end_date)
+
+    def get_movie_credit_records(self, person_id: str, start_date: str = None, end_date: str = None) -> list:
+        """
+        get_movie_credits_for_person keeping only the movie id and release date of each credit
+        :return: list of tmdb_records.MovieCredit (dict-style .get() works) filtered by the optional dates (inclusive)
+        """
+        cast = movie_credits(self._get(f"/person/{person_id}/movie_credits", params={}))
+        return self._in_window(cast, start_date, end_date)
+
+    @staticmethod
+    def _in_window(cast, start_date: str = None, end_date: str = None) -> list:
         # Only include entries that have a release_date string; filter by window 
         out = []
         for credit in cast:
@@ -235,8 +464,8 @@ def return_name()->str:
 
 
 
-def build_coactor_graph_for_1999(api_key: str) -> Graph:
-    tmdb = TMDBAPIUtils(api_key)
+def build_coactor_graph_for_1999(api_key: str, tmdb: TMDBAPIUtils = None) -> Graph:
+    tmdb = tmdb or TMDBAPIUtils(api_key)
     g = Graph()
     SEED_ID = "2975"
     SEED_NAME = "Laurence Fishburne"
@@ -248,12 +477,12 @@ def build_coactor_graph_for_1999(api_key: str) -> Graph:
 
     # --- BASE GRAPH ---
     base_new_nodes = []
-    credits = tmdb.get_movie_credits_for_person(SEED_ID, YEAR_START, YEAR_END)
+    credits = tmdb.get_movie_credit_records(SEED_ID, YEAR_START, YEAR_END)
     for credit in credits:
         movie_id = str(credit.get("id"))
         if not movie_id:
             continue
-        cast = tmdb.get_movie_cast(movie_id, limit=5, exclude_ids=[int(SEED_ID)])
+        cast = tmdb.get_movie_cast_records(movie_id, limit=5, exclude_ids=[int(SEED_ID)])
         for c in cast:
             cid = str(c.get("id") or "")
             cname = c.get("name") or ""
@@ -272,12 +501,12 @@ def build_coactor_graph_for_1999(api_key: str) -> Graph:
         new_nodes_this_iter = []
         # For each node in the current frontier
         for actor_id in list(nodes_to_expand):
-            credits2 = tmdb.get_movie_credits_for_person(actor_id, YEAR_START, YEAR_END)
+            credits2 = tmdb.get_movie_credit_records(actor_id, YEAR_START, YEAR_END)
             for c2 in credits2:
                 mid = str(c2.get("id") or "")
                 if not mid:
                     continue
-                cast2 = tmdb.get_movie_cast(mid, limit=5, exclude_ids=[int(actor_id)])
+                cast2 = tmdb.get_movie_cast_records(mid, limit=5, exclude_ids=[int(actor_id)])
                 for co in cast2:
                     coid = str(co.get("id") or "")
                     coname = co.get("name") or ""
@@ -394,13 +623,29 @@ if __name__ == "__main__":
     except Exception:
         api_key = None
 
-    if not api_key:
+    # Optionally set TMDB_CACHE to a file path to cache responses between runs,
+    # and TMDB_CACHE_MODE=replay to build the graph offline from that cache only.
+    cache = None
+    if _os.environ.get("TMDB_CACHE"):
+        cache = ResponseCache(_os.environ["TMDB_CACHE"], mode=_os.environ.get("TMDB_CACHE_MODE", "readwrite"))
+
+    if not api_key and not (cache and cache.mode == "replay"):
         print("Set TMDB_API_KEY in your environment to build the graph, or import this module and call build_coactor_graph_for_1999(api_key).")
     else:
-        graph = build_coactor_graph_for_1999(api_key)
-        graph.write_nodes_file("nodes.csv")
-        graph.write_edges_file("edges.csv")
+        tmdb = TMDBAPIUtils.create(api_key, cache=cache)
+        graph = build_coactor_graph_for_1999(api_key, tmdb=tmdb)
+        graph.export_csv("nodes.csv", "edges.csv")
         print("nodes:", graph.total_nodes(), "edges:", graph.total_edges())
         print("max-degree:", graph.max_degree_nodes())
+        print("movie credits memo:", tmdb.memo_stats())
+        print("connections:", tmdb.connection_stats())
+        print("requests:", tmdb.metrics.snapshot()["totals"])
+        # Optionally set TMDB_METRICS to a file path to dump the full request metrics as JSON.
+        if _os.environ.get("TMDB_METRICS"):
+            tmdb.dump_stats(_os.environ["TMDB_METRICS"])
+        tmdb.close()
+        if cache is not None:
+            print("cache:", cache.stats())
+            cache.close()
 
 
@@ -0,0 +1,293 @@
+import argparse
+import json
+
+import numpy as np
+
+from snapshot import open_snapshot
+
+
+class CSRGraph:
+    """
+    Immutable undirected graph in CSR form for vectorized analytics.
+
+    Nodes are 0..n-1 with their original ids in `ids`; `src`/`dst` hold every undirected edge
+    once (self-loops and duplicates removed) and the neighbours of node i are
+    indices[indptr[i]:indptr[i + 1]].
+    """
+
+    def __init__(self, ids: np.ndarray, src: np.ndarray, dst: np.ndarray):
+        self.ids = ids
+        n = len(ids)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        keep = src != dst
+        lo = np.minimum(src[keep], dst[keep])
+        hi = np.maximum(src[keep], dst[keep])
+        keys = np.unique(lo * n + hi)
+        self.src = keys // n
+        self.dst = keys % n
+
+        rows = np.concatenate([self.src, self.dst])
+        cols = np.concatenate([self.dst, self.src])
+        order = np.argsort(rows, kind="stable")
+        self.indices = cols[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.indptr[1:])
+
+    @property
+    def n(self) -> int:
+        return len(self.ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.src)
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def index_of(self, node_id) -> int:
+        hits = np.flatnonzero(self.ids == str(node_id))
+        if not len(hits):
+            raise KeyError(node_id)
+        return int(hits[0])
+
+    @classmethod
+    def from_arrays(cls, node_ids, edge_src, edge_dst) -> "CSRGraph":
+        """
+        Build from string id arrays: the node ids and the two endpoint columns of the edges
+        """
+        node_ids = np.asarray(node_ids, dtype=str)
+        edge_src = np.asarray(edge_src, dtype=str)
+        edge_dst = np.asarray(edge_dst, dtype=str)
+        ids, inverse = np.unique(np.concatenate([node_ids, edge_src, edge_dst]), return_inverse=True)
+        k, m = len(node_ids), len(edge_src)
+        return cls(ids, inverse[k:k + m], inverse[k + m:])
+
+    @classmethod
+    def from_graph(cls, g) -> "CSRGraph":
+        """
+        Build from a Q1.Graph, or zero-copy from the edge arrays of a CompactGraph
+        """
+        if hasattr(g, "_src"):
+            src = np.frombuffer(g._src, dtype=np.uint32) if len(g._src) else np.zeros(0, np.uint32)
+            dst = np.frombuffer(g._dst, dtype=np.uint32) if len(g._dst) else np.zeros(0, np.uint32)
+            return cls(np.array(g._ids, dtype=str), src, dst)
+        edges = np.array(g.edges, dtype=str).reshape(-1, 2)
+        return cls.from_arrays([nid for nid, _ in g.nodes], edges[:, 0], edges[:, 1])
+
+    @classmethod
+    def from_files(cls, nodes_path: str = "nodes.csv", edges_path: str = "edges.csv") -> "CSRGraph":
+        """
+        Build straight from nodes.csv / edges.csv as written by Graph.write_*_file
+        """
+        with open(nodes_path, encoding="utf-8") as f:
+            next(f, None)
+            node_ids = [line.split(",", 1)[0] for line in f]
+        # a header-only file loads as shape (0,) even with ndmin=2
+        edges = np.loadtxt(edges_path, dtype=str, delimiter=",", skiprows=1, comments=None, ndmin=2).reshape(-1, 2)
+        return cls.from_arrays(node_ids, edges[:, 0], edges[:, 1])
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "CSRGraph":
+        """
+        Build from a binary snapshot, reading the edge arrays straight out of the mapping
+        """
+        with open_snapshot(path) as snap:
+            src = np.frombuffer(snap.src, dtype="<u4")
+            dst = np.frombuffer(snap.dst, dtype="<u4")
+            g = cls(np.array(snap.ids(), dtype=str), src, dst)
+            del src, dst
+        return g
+
+
+def _gather(g: CSRGraph, nodes: np.ndarray) -> np.ndarray:
+    """
+    Concatenated neighbour lists of `nodes`
+    """
+    starts = g.indptr[nodes]
+    lens = g.indptr[nodes + 1] - starts
+    total = int(lens.sum())
+    if not total:
+        return np.zeros(0, dtype=g.indices.dtype)
+    offsets = np.repeat(starts - (np.cumsum(lens) - lens), lens)
+    return g.indices[offsets + np.arange(total)]
+
+
+def bfs_distances(g: CSRGraph, seed: int) -> np.ndarray:
+    """
+    Hop distance of every node from node index `seed`, -1 where unreachable.
+    Each BFS level is expanded with one vectorized gather.
+    """
+    dist = np.full(g.n, -1, dtype=np.int32)
+    dist[seed] = 0
+    frontier = np.array([seed], dtype=np.int64)
+    level = 0
+    while len(frontier):
+        level += 1
+        nbrs = _gather(g, frontier)
+        nbrs = np.unique(nbrs[dist[nbrs] < 0])
+        dist[nbrs] = level
+        frontier = nbrs
+    return dist
+
+
+def connected_components(g: CSRGraph) -> np.ndarray:
+    """
+    Component label (0..k-1) of every node, by min-label hooking plus pointer jumping
+    over the edge arrays; converges in a logarithmic number of rounds in practice.
+    """
+    labels = np.arange(g.n, dtype=np.int64)
+    while True:
+        ls, ld = labels[g.src], labels[g.dst]
+        lo = np.minimum(ls, ld)
+        hooked = labels.copy()
+        np.minimum.at(hooked, ls, lo)
+        np.minimum.at(hooked, ld, lo)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            break
+        labels = hooked
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def core_numbers(g: CSRGraph) -> np.ndarray:
+    """
+    k-core number of every node: repeatedly peel all nodes whose remaining degree is <= k
+    """
+    deg = g.degrees().astype(np.int64)
+    core = np.zeros(g.n, dtype=np.int64)
+    alive = np.ones(g.n, dtype=bool)
+    k = 0
+    while alive.any():
+        k = max(k, int(deg[alive].min()))
+        while True:
+            peel = np.flatnonzero(alive & (deg <= k))
+            if not len(peel):
+                break
+            core[peel] = k
+            alive[peel] = False
+            deg -= np.bincount(_gather(g, peel), minlength=g.n)
+    return core
+
+
+def degree_centrality(g: CSRGraph) -> np.ndarray:
+    return g.degrees() / max(1, g.n - 1)
+
+
+def pagerank(g: CSRGraph, damping: float = 0.85, tol: float = 1e-10, max_iter: int = 100) -> np.ndarray:
+    """
+    PageRank by power iteration over the CSR arrays; rank of dangling (isolated) nodes is spread uniformly
+    """
+    n = g.n
+    if not n:
+        return np.zeros(0)
+    deg = g.degrees().astype(np.float64)
+    dangling = deg == 0
+    inv_deg = np.divide(1.0, deg, out=np.zeros(n), where=~dangling)
+    rows = np.repeat(np.arange(n), g.degrees())
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        spread = np.bincount(rows, weights=(x * inv_deg)[g.indices], minlength=n)
+        nxt = (1.0 - damping) / n + damping * (spread + x[dangling].sum() / n)
+        done = np.abs(nxt - x).sum() < tol
+        x = nxt
+        if done:
+            break
+    return x
+
+
+def triangle_counts(g: CSRGraph, chunk_wedges: int = 4_000_000) -> np.ndarray:
+    """
+    Number of triangles through every node.
+
+    Edges are oriented from lower to higher (degree, index) rank so each triangle is seen once, as
+    the wedge u->v, u->w closed by v->w. Wedges are generated in vectorized chunks of about
+    `chunk_wedges` and closed by binary search in the sorted oriented edge keys.
+    """
+    n = g.n
+    counts = np.zeros(n, dtype=np.int64)
+    if not g.num_edges:
+        return counts
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.lexsort((np.arange(n), g.degrees()))] = np.arange(n)
+
+    fwd = rank[g.src] < rank[g.dst]
+    u = np.where(fwd, g.src, g.dst)
+    v = np.where(fwd, g.dst, g.src)
+    order = np.lexsort((rank[v], u))        # out-lists grouped by u, sorted by target rank
+    u, v = u[order], v[order]
+    keys = np.sort(u * n + v)
+
+    out_deg = np.bincount(u, minlength=n)
+    group_start = np.concatenate([[0], np.cumsum(out_deg)[:-1]])
+    pos_in_group = np.arange(len(u)) - group_start[u]
+    later = out_deg[u] - 1 - pos_in_group    # wedges starting at each out-edge
+    ends = np.cumsum(later)
+
+    start = 0
+    while start < len(u):
+        stop = int(np.searchsorted(ends, ends[start] - later[start] + chunk_wedges, side="right"))
+        stop = max(stop, start + 1)
+        cnt = later[start:stop]
+        total = int(cnt.sum())
+        if total:
+            p = np.repeat(np.arange(start, stop), cnt)
+            within = np.arange(total) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            a, b, c = u[p], v[p], v[p + 1 + within]
+            wanted = b * n + c
+            hit = np.searchsorted(keys, wanted)
+            closed = (hit < len(keys)) & (keys[np.minimum(hit, len(keys) - 1)] == wanted)
+            for ends_of_triangle in (a[closed], b[closed], c[closed]):
+                counts += np.bincount(ends_of_triangle, minlength=n)
+        start = stop
+    return counts
+
+
+def summary(g: CSRGraph, seed=None, top: int = 5) -> dict:
+    """
+    Headline numbers of all the analytics above, JSON-serializable
+    """
+    def top_ids(values):
+        idx = np.argsort(-values, kind="stable")[:top]
+        return [[str(g.ids[i]), float(values[i])] for i in idx]
+
+    labels = connected_components(g)
+    sizes = np.bincount(labels) if g.n else np.zeros(0, dtype=np.int64)
+    core = core_numbers(g)
+    tri = triangle_counts(g)
+    out = {
+        "nodes": g.n,
+        "edges": g.num_edges,
+        "components": int(len(sizes)),
+        "largest_component": int(sizes.max()) if len(sizes) else 0,
+        "max_core": int(core.max()) if g.n else 0,
+        "triangles": int(tri.sum() // 3),
+        "top_degree": top_ids(g.degrees().astype(np.float64)),
+        "top_pagerank": top_ids(pagerank(g)),
+    }
+    if seed is not None:
+        dist = bfs_distances(g, g.index_of(seed))
+        reached = dist[dist >= 0]
+        out["bfs_from_seed"] = {str(d): int(c) for d, c in enumerate(np.bincount(reached))}
+    return out
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Vectorized analytics over a co-actor graph.")
+    parser.add_argument("--nodes", default="nodes.csv")
+    parser.add_argument("--edges", default="edges.csv")
+    parser.add_argument("--snapshot", default=None, help="read a binary graph snapshot instead of the CSVs")
+    parser.add_argument("--seed", default=None, help="node id to report BFS distances from")
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    g = CSRGraph.from_snapshot(args.snapshot) if args.snapshot else CSRGraph.from_files(args.nodes, args.edges)
+    print(json.dumps(summary(g, args.seed, args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import argparse
+import contextlib
+import gc
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tempfile
+import tracemalloc
+
+import http.client
+from concurrent.futures import ProcessPoolExecutor
+
+from compact_graph import CompactGraph
+from crawl import CoactorCrawler
+from fake_tmdb import SyntheticCredits, local_client
+from Q1 import Graph
+from shard import run_sharded, shards_by_year
+from snapshot import open_snapshot
+from tmdb_pool import ACCEPT_ENCODING, ConnectionPool, decode_body
+from tmdb_records import cast_credits, movie_credits
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def latency_summary(latencies: list) -> dict:
+    lat = sorted(latencies)
+    return {"p50_ms": round(percentile(lat, 50) * 1000, 3),
+            "p95_ms": round(percentile(lat, 95) * 1000, 3),
+            "p99_ms": round(percentile(lat, 99) * 1000, 3)}
+
+
+@contextlib.contextmanager
+def fake_server_process(people: int, latency: float = 0.0, error_rate: float = 0.0, drop_rate: float = 0.0):
+    """
+    Run fake_tmdb.py in a child process (so it does not compete for our GIL) and yield its port
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.join(here, "fake_tmdb.py"), "--people", str(people),
+           "--latency", str(latency), "--error-rate", str(error_rate), "--drop-rate", str(drop_rate)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    try:
+        line = proc.stdout.readline()
+        yield int(line.rsplit(":", 1)[1])
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def time_requests(tmdb) -> list:
+    """
+    Wrap tmdb._get to record the wall time of every call, returns the list being filled
+    """
+    latencies = []
+    inner = tmdb._get
+
+    def timed_get(path, params):
+        t0 = time.perf_counter()
+        try:
+            return inner(path, params)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    tmdb._get = timed_get
+    return latencies
+
+
+def run_crawl(port: int, people: int, workers: int, depth: int, start_date: str, end_date: str,
+              cast_limit: int = 5, trace_memory: bool = False) -> dict:
+    """
+    One measured crawl against the stand-in server on `port`; bench_crawl runs it in its own process,
+    so maxrss_kb belongs to this crawl alone
+    """
+    tmdb = local_client(port)
+    latencies = time_requests(tmdb)
+    seed = (1, SyntheticCredits(people).person_name(0))
+    crawler = CoactorCrawler(tmdb, [seed], start_date, end_date, depth=depth, cast_limit=cast_limit,
+                             max_workers=workers)
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        graph = crawler.run()
+    wall = time.perf_counter() - t0
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    tmdb.close()
+
+    result = {
+        "people": people,
+        "workers": workers,
+        "depth": depth,
+        "nodes": graph.total_nodes(),
+        "edges": graph.total_edges(),
+        "requests": len(latencies),
+        "wall_s": round(wall, 4),
+        "req_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+    result.update(latency_summary(latencies))
+    result["peak_traced_bytes"] = peak
+    result["maxrss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["connections"] = tmdb.connection_stats()
+    result["http"] = tmdb.metrics.snapshot()["totals"]
+    return result
+
+
+def bench_crawl(args) -> list:
+    results = []
+    # a fresh interpreter per crawl: ru_maxrss is a high-water mark that never drops within a process
+    ctx = multiprocessing.get_context("spawn")
+    for people in args.sizes:
+        with fake_server_process(people, args.latency, args.error_rate, args.drop_rate) as port:
+            for workers in args.workers:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    result = pool.submit(run_crawl, port, people, workers, args.depth, args.start_date,
+                                         args.end_date, trace_memory=args.trace_memory).result()
+                print(json.dumps(result), flush=True)
+                results.append(result)
+    return results
+
+
+def synthetic_edges(nodes: int, avg_degree: int, seed: int = 0) -> tuple:
+    """
+    Random co-actor-like graph with TMDb-style numeric string ids: (node list, edge list)
+    """
+    rng = random.Random(seed)
+    ids = [str(i) for i in rng.sample(range(1, 50 * nodes), nodes)]
+    node_list = [(nid, f"Person {nid}") for nid in ids]
+    edge_list = [(rng.choice(ids), rng.choice(ids)) for _ in range(nodes * avg_degree // 2)]
+    return node_list, edge_list
+
+
+def run_graph_build(cls, node_list: list, edge_list: list) -> dict:
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    g = cls()
+    for nid, name in node_list:
+        g.add_node(nid, name)
+    t1 = time.perf_counter()
+    for u, v in edge_list:
+        g.add_edge(u, v)
+    t2 = time.perf_counter()
+    held = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return {
+        "graph": cls.__name__,
+        "nodes": g.total_nodes(),
+        "edges": g.total_edges(),
+        "node_inserts_per_s": round(len(node_list) / (t1 - t0)) if t1 > t0 else None,
+        "edge_inserts_per_s": round(len(edge_list) / (t2 - t1)) if t2 > t1 else None,
+        "bytes": held,
+        "bytes_per_edge": round(held / max(1, g.total_edges()), 1),
+    }
+
+
+def bench_graph(args) -> list:
+    results = []
+    for nodes in args.sizes:
+        node_list, edge_list = synthetic_edges(nodes, args.avg_degree)
+        for cls in (Graph, CompactGraph):
+            result = run_graph_build(cls, node_list, edge_list)
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    return results
+
+
+def _timed(fn) -> tuple:
+    t0 = time.perf_counter()
+    value = fn()
+    return value, round(time.perf_counter() - t0, 4)
+
+
+def bench_snapshot(args) -> list:
+    results = []
+    for nodes in args.sizes:
+        node_list, edge_list = synthetic_edges(nodes, args.avg_degree)
+        g = Graph()
+        for nid, name in node_list:
+            g.add_node(nid, name)
+        for u, v in edge_list:
+            g.add_edge(u, v)
+        with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+            nodes_csv, edges_csv, snap = (os.path.join(tmp, f) for f in ("nodes.csv", "edges.csv", "graph.snap"))
+            with contextlib.redirect_stdout(devnull):
+                _, write_csv_s = _timed(lambda: g.export_csv(nodes_csv, edges_csv))
+            _, write_snap_s = _timed(lambda: g.save_snapshot(snap))
+            _, load_csv_s = _timed(lambda: Graph.from_csv(nodes_csv, edges_csv))
+            _, load_snap_s = _timed(lambda: Graph.load_snapshot(snap))
+            _, load_compact_s = _timed(lambda: CompactGraph.load_snapshot(snap))
+            view, open_snap_s = _timed(lambda: open_snapshot(snap))
+            view.close()
+            result = {
+                "nodes": g.total_nodes(),
+                "edges": g.total_edges(),
+                "csv_bytes": os.path.getsize(nodes_csv) + os.path.getsize(edges_csv),
+                "snapshot_bytes": os.path.getsize(snap),
+                "write_csv_s": write_csv_s,
+                "write_snapshot_s": write_snap_s,
+                "load_csv_graph_s": load_csv_s,
+                "load_snapshot_graph_s": load_snap_s,
+                "load_snapshot_compact_s": load_compact_s,
+                "open_snapshot_mmap_s": open_snap_s,
+            }
+        print(json.dumps(result), flush=True)
+        results.append(result)
+    return results
+
+
+PAYLOAD_ENDPOINTS = {
+    "movie_credits": ("/3/movie/{}/credits", cast_credits),
+    "person_movie_credits": ("/3/person/{}/movie_credits", movie_credits),
+}
+
+
+def fetch_bodies(port: int, paths: list, compressed: bool) -> list:
+    """
+    GET every path from the stand-in server, returns [(raw body, Content-Encoding)]
+    """
+    pool = ConnectionPool("127.0.0.1", port, connection_class=http.client.HTTPConnection)
+    headers = {"Accept-Encoding": ACCEPT_ENCODING} if compressed else {}
+    out = []
+    for path in paths:
+        _, resp_headers, raw = pool.request("GET", path, headers)
+        out.append((raw, resp_headers.get("Content-Encoding")))
+    pool.close()
+    return out
+
+
+def decode_plain(raw: bytes, encoding: str) -> list:
+    # what the client did before: parse the whole body and keep the cast dicts
+    return json.loads(raw).get("cast") or []
+
+
+def measure_decoding(bodies: list, decode) -> dict:
+    """
+    Decode time, peak bytes allocated while decoding one response and bytes retained per credit
+    when every decoded result is kept (as the crawl memo keeps movie casts)
+    """
+    t0 = time.perf_counter()
+    for raw, encoding in bodies:
+        decode(raw, encoding)
+    elapsed = time.perf_counter() - t0
+
+    gc.collect()
+    tracemalloc.start()
+    kept, peaks = [], []
+    base = tracemalloc.get_traced_memory()[0]
+    for raw, encoding in bodies:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        kept.append(decode(raw, encoding))
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    credits = sum(map(len, kept))
+    return {
+        "decode_us_per_request": round(elapsed / len(bodies) * 1e6, 1),
+        "peak_alloc_bytes_per_request": round(sum(peaks) / len(peaks)),
+        "retained_bytes_per_credit": round(retained / max(1, credits), 1),
+    }
+
+
+def bench_payload(args) -> list:
+    results = []
+    universe = SyntheticCredits(args.people)
+    rng = random.Random(0)
+    ids = [rng.randrange(1, universe.n + 1) for _ in range(args.requests)]
+    with fake_server_process(args.people) as port:
+        for endpoint, (template, to_records) in PAYLOAD_ENDPOINTS.items():
+            paths = [template.format(i) + "?language=en-US&api_key=test" for i in ids]
+            variants = {
+                "before": (False, decode_plain),
+                "after": (True, lambda raw, encoding: to_records(json.loads(decode_body(raw, encoding)))),
+            }
+            for variant, (compressed, decode) in variants.items():
+                bodies = fetch_bodies(port, paths, compressed)
+                result = {
+                    "endpoint": endpoint,
+                    "variant": variant,
+                    "requests": len(bodies),
+                    "content_encoding": bodies[0][1] or "identity",
+                    "wire_bytes_per_request": round(sum(len(raw) for raw, _ in bodies) / len(bodies), 1),
+                }
+                result.update(measure_decoding(bodies, decode))
+                print(json.dumps(result), flush=True)
+                results.append(result)
+    return results
+
+
+def bench_shard(args) -> list:
+    """
+    Sharded multi-year crawl at several process counts, each process with its own stand-in server
+    so the server is not the bottleneck
+    """
+    results = []
+    specs = shards_by_year([(1, SyntheticCredits(args.people).person_name(0))], args.first_year, args.last_year)
+    base = None
+    for processes in args.processes:
+        with contextlib.ExitStack() as stack:
+            ports = [stack.enter_context(fake_server_process(args.people, args.latency)) for _ in range(processes)]
+            t0 = time.perf_counter()
+            g, _, stats = run_sharded(specs, {"ports": ports}, processes, args.depth, max_workers=args.workers)
+            wall = time.perf_counter() - t0
+        requests = sum(s["requests"] for s in stats)
+        base = base or wall
+        result = {
+            "processes": processes,
+            "shards": len(specs),
+            "nodes": g.total_nodes(),
+            "edges": g.total_edges(),
+            "requests": requests,
+            "wall_s": round(wall, 4),
+            "req_per_s": round(requests / wall, 1) if wall else 0.0,
+            "speedup_vs_first": round(base / wall, 2) if wall else None,
+        }
+        print(json.dumps(result), flush=True)
+        results.append(result)
+    return results
+
+
+def _int_list(value: str) -> list:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks for the TMDb client and co-actor crawl.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("crawl", help="crawl a local stand-in server and report time, throughput, latency and memory")
+    p.add_argument("--sizes", type=_int_list, default=[1000, 10000, 100000, 1000000],
+                   help="comma separated universe sizes (people)")
+    p.add_argument("--workers", type=_int_list, default=[1, 8], help="comma separated concurrency levels")
+    p.add_argument("--depth", type=int, default=2)
+    p.add_argument("--start-date", default=None, help="release date window, default all credits")
+    p.add_argument("--end-date", default=None)
+    p.add_argument("--latency", type=float, default=0.0, help="injected server latency, seconds")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--drop-rate", type=float, default=0.0)
+    p.add_argument("--trace-memory", action="store_true", help="measure peak Python allocations (slower)")
+    p.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    p.set_defaults(func=bench_crawl)
+
+    p = sub.add_parser("graph", help="memory and insertion throughput of Graph vs CompactGraph")
+    p.add_argument("--sizes", type=_int_list, default=[10000, 100000, 1000000], help="comma separated node counts")
+    p.add_argument("--avg-degree", type=int, default=6)
+    p.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    p.set_defaults(func=bench_graph)
+
+    p = sub.add_parser("snapshot", help="CSV vs binary snapshot save/load times")
+    p.add_argument("--sizes", type=_int_list, default=[10000, 100000, 1000000], help="comma separated node counts")
+    p.add_argument("--avg-degree", type=int, default=6)
+    p.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    p.set_defaults(func=bench_snapshot)
+
+    p = sub.add_parser("shard", help="sharded multi-year crawl throughput vs number of processes")
+    p.add_argument("--people", type=int, default=100000)
+    p.add_argument("--first-year", type=int, default=1995)
+    p.add_argument("--last-year", type=int, default=2004)
+    p.add_argument("--processes", type=_int_list, default=[1, 2, 4, 8], help="comma separated process counts")
+    p.add_argument("--workers", type=int, default=8, help="concurrent requests within each shard")
+    p.add_argument("--depth", type=int, default=2)
+    p.add_argument("--latency", type=float, default=0.0, help="injected server latency, seconds")
+    p.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    p.set_defaults(func=bench_shard)
+
+    p = sub.add_parser("payload", help="wire bytes, decode time and allocations per request, "
+                                        "identity + dicts vs gzip + slotted records")
+    p.add_argument("--people", type=int, default=100000, help="universe size of the stand-in server")
+    p.add_argument("--requests", type=int, default=2000, help="requests per endpoint and variant")
+    p.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    p.set_defaults(func=bench_payload)
+
+    args = parser.parse_args(argv)
+    results = args.func(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
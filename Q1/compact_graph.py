@@ -0,0 +1,296 @@
+import csv
+from array import array
+from itertools import chain
+
+from degree_index import DenseDegreeIndex
+from snapshot import open_snapshot, write_snapshot
+
+
+class _NodeIdView:
+    """
+    Read-only set-like view of the node ids of a CompactGraph (what Graph._node_ids is for Graph)
+    """
+
+    __slots__ = ("_g",)
+
+    def __init__(self, g):
+        self._g = g
+
+    def __contains__(self, nid) -> bool:
+        i = self._g._index.get(nid)
+        return i is not None and self._g._is_node[i] == 1
+
+    def __len__(self) -> int:
+        return len(self._g._node_idx)
+
+    def __iter__(self):
+        ids = self._g._ids
+        return (ids[i] for i in self._g._node_idx)
+
+
+class CompactGraph:
+    """
+    Drop-in, memory-lean alternative to Q1.Graph for multi-million-edge co-actor graphs.
+
+    Node ids are interned to consecutive integers once; edges are kept as two typed uint32 arrays
+    of interned endpoints and deduplicated through a set of packed 64-bit (low << 32 | high) keys,
+    instead of string tuples held both in a list and a set. add_node/add_edge/total_*/max_degree_nodes
+    and the CSV reader/writers behave exactly like Graph, including the undirected canonical form
+    (the smaller id as a string goes first) and the order nodes and edges are written in.
+    """
+
+    def __init__(self, with_nodes_file=None, with_edges_file=None):
+        self._index = {}               # node id (str) -> interned int
+        self._ids = []                 # interned int -> node id (str)
+        self._names = []               # interned int -> name (None if only seen in an edge)
+        self._is_node = bytearray()    # interned int -> 1 if added as a node
+        self._node_idx = array("I")    # interned ints of the nodes, in insertion order
+        self._src = array("I")         # edge endpoints, in insertion order
+        self._dst = array("I")
+        self._edge_keys = set()        # packed canonical edge keys
+        self._degrees = DenseDegreeIndex()  # interned int -> degree, maintained as edges are added
+
+        if with_nodes_file and with_edges_file:
+            with open(with_nodes_file, encoding="utf-8") as f:
+                rows = csv.reader(f)
+                next(rows, None)
+                for n in rows:
+                    i = self._intern(n[0])
+                    self._is_node[i] = 1
+                    self._names[i] = n[1]
+                    self._node_idx.append(i)
+
+            with open(with_edges_file, encoding="utf-8") as f:
+                rows = csv.reader(f)
+                next(rows, None)
+                for e in rows:
+                    u, v = self._intern(e[0]), self._intern(e[1])
+                    self._src.append(u)
+                    self._dst.append(v)
+                    self._edge_keys.add(self._key(e[0], e[1], u, v))
+                    self._degrees.increment(u)
+                    self._degrees.increment(v)
+
+    def _intern(self, nid: str) -> int:
+        i = self._index.get(nid)
+        if i is None:
+            i = self._index[nid] = len(self._ids)
+            self._ids.append(nid)
+            self._names.append(None)
+            self._is_node.append(0)
+        return i
+
+    @staticmethod
+    def _key(u: str, v: str, iu: int, iv: int) -> int:
+        return (iu << 32 | iv) if u < v else (iv << 32 | iu)
+
+    @property
+    def _node_ids(self) -> _NodeIdView:
+        return _NodeIdView(self)
+
+    @property
+    def nodes(self) -> list:
+        """
+        list of (id:str, name:str), materialized on access
+        """
+        ids, names = self._ids, self._names
+        return [(ids[i], names[i]) for i in self._node_idx]
+
+    @property
+    def edges(self) -> list:
+        """
+        list of (source_id:str, target_id:str), materialized on access
+        """
+        ids = self._ids
+        return [(ids[u], ids[v]) for u, v in zip(self._src, self._dst)]
+
+    def add_node(self, id: str, name: str) -> None:
+        """
+        add a node (id, name) if it does not already exist, commas are removed from the name
+        """
+        sid = str(id)
+        sname = str(name) if name is not None else ""
+        sname = sname.replace(",", "")
+        i = self._intern(sid)
+        if not self._is_node[i]:
+            self._is_node[i] = 1
+            self._names[i] = sname
+            self._node_idx.append(i)
+
+    def add_edge(self, source: str, target: str) -> None:
+        """
+        Add an undirected edge between two node ids if it does not already exist (no self-loops)
+        """
+        u = str(source); v = str(target)
+        if u == v:
+            return
+        if v < u:
+            u, v = v, u
+        iu, iv = self._intern(u), self._intern(v)
+        key = iu << 32 | iv
+        if key not in self._edge_keys:
+            self._edge_keys.add(key)
+            self._src.append(iu)
+            self._dst.append(iv)
+            self._degrees.increment(iu)
+            self._degrees.increment(iv)
+
+    def total_nodes(self) -> int:
+        return len(self._node_idx)
+
+    def total_edges(self) -> int:
+        return len(self._src)
+
+    def degrees(self) -> array:
+        """
+        Degree of every interned id, indexed by interned int
+        """
+        degree = self._degrees.degree
+        return array("I", (degree(i) for i in range(len(self._ids))))
+
+    def max_degree_nodes(self) -> dict:
+        """
+        Return the node(s) with the highest degree as {node_id: degree}, several in the event of a tie
+        """
+        ids = self._ids
+        return {ids[i]: d for i, d in self._degrees.max_nodes().items()}
+
+    def top_degree_nodes(self, k: int = 10) -> list:
+        """
+        Return the k nodes with the highest degree as a list of (node_id, degree), highest first
+        """
+        ids = self._ids
+        return [(ids[i], d) for i, d in self._degrees.top(k)]
+
+    def degree_histogram(self) -> dict:
+        """
+        Return {degree: number of nodes with that degree}
+        """
+        return self._degrees.histogram()
+
+    def to_csr(self) -> tuple:
+        """
+        Undirected CSR adjacency over interned ints: (indptr, indices), the neighbours of i
+        are indices[indptr[i]:indptr[i + 1]]
+        """
+        n = len(self._ids)
+        deg = self.degrees()
+        indptr = array("Q", bytes(8 * (n + 1)))
+        for i in range(n):
+            indptr[i + 1] = indptr[i] + deg[i]
+        fill = array("Q", indptr[:-1]) if n else array("Q")
+        indices = array("I", bytes(4 * indptr[n]))
+        for u, v in zip(self._src, self._dst):
+            indices[fill[u]] = v
+            fill[u] += 1
+            indices[fill[v]] = u
+            fill[v] += 1
+        return indptr, indices
+
+    @classmethod
+    def from_graph(cls, graph) -> "CompactGraph":
+        g = cls()
+        for nid, name in graph.nodes:
+            i = g._intern(nid)
+            if not g._is_node[i]:
+                g._is_node[i] = 1
+                g._names[i] = name
+                g._node_idx.append(i)
+        for u, v in graph.edges:
+            g.add_edge(u, v)
+        return g
+
+    def merge_parts(self, ids: list, node_idx, names: list, src, dst) -> list:
+        """
+        Union another interned graph into this one: `ids` is its id table, `node_idx` / `names` its
+        nodes and `src` / `dst` its canonical edges, all in the layout CompactGraph keeps (and
+        snapshots store). Each id is interned once, so every edge is deduplicated by one packed
+        int lookup; nodes already present keep their name. Returns the packed key of every merged
+        edge, in `src` / `dst` order.
+        """
+        intern = self._intern
+        remap = [intern(nid) for nid in ids]
+        is_node, node_names, order = self._is_node, self._names, self._node_idx
+        for i, name in zip(node_idx, names):
+            j = remap[i]
+            if not is_node[j]:
+                is_node[j] = 1
+                node_names[j] = name
+                order.append(j)
+
+        keys = [remap[u] << 32 | remap[v] for u, v in zip(src, dst)]
+        seen = self._edge_keys
+        fresh = [k for k in keys if k not in seen]
+        if fresh:
+            seen.update(fresh)
+            # a part could hold an edge twice only if it was not deduplicated itself
+            fresh = list(dict.fromkeys(fresh))
+            new_src = array("I", [k >> 32 for k in fresh])
+            new_dst = array("I", [k & 0xFFFFFFFF for k in fresh])
+            self._src.extend(new_src)
+            self._dst.extend(new_dst)
+            self._degrees.update(chain(new_src, new_dst))
+        return keys
+
+    def save_snapshot(self, path="graph.snap") -> None:
+        """
+        write the graph as a binary snapshot (see snapshot.py), the interned arrays are written as is
+        """
+        names = self._names
+        write_snapshot(path, self._ids, self._node_idx, [names[i] for i in self._node_idx], self._src, self._dst)
+
+    @classmethod
+    def load_snapshot(cls, path="graph.snap") -> "CompactGraph":
+        """
+        load a CompactGraph from a binary snapshot; the id table and edge arrays are bulk-copied
+        out of the mapping, only the dedup keys and degrees are rebuilt
+        """
+        g = cls()
+        with open_snapshot(path) as snap:
+            g._ids = list(snap.ids())
+            g._index = {nid: i for i, nid in enumerate(g._ids)}
+            g._names = [None] * len(g._ids)
+            g._is_node = bytearray(len(g._ids))
+            g._node_idx.frombytes(snap.node_idx.cast("B"))
+            for i, name in zip(g._node_idx, snap.names()):
+                g._is_node[i] = 1
+                g._names[i] = name
+            g._src.frombytes(snap.src.cast("B"))
+            g._dst.frombytes(snap.dst.cast("B"))
+        ids = g._ids
+        g._edge_keys = {(u << 32 | v) if ids[u] < ids[v] else (v << 32 | u) for u, v in zip(g._src, g._dst)}
+        g._degrees.update(chain(g._src, g._dst))
+        return g
+
+    def print_nodes(self):
+        print(self.nodes)
+
+    def print_edges(self):
+        print(self.edges)
+
+    def write_edges_file(self, path="edges.csv") -> None:
+        """
+        write all edges out as .csv, same format as Graph.write_edges_file
+        """
+        ids = self._ids
+        with open(path, "w", encoding="utf-8") as edges_file:
+            edges_file.write("source,target\n")
+            edges_file.writelines(ids[u] + "," + ids[v] + "\n" for u, v in zip(self._src, self._dst))
+        print("finished writing edges to csv")
+
+    def write_nodes_file(self, path="nodes.csv") -> None:
+        """
+        write all nodes out as .csv, same format as Graph.write_nodes_file
+        """
+        ids, names = self._ids, self._names
+        with open(path, "w", encoding="utf-8") as nodes_file:
+            nodes_file.write("id,name\n")
+            nodes_file.writelines(ids[i] + "," + names[i] + "\n" for i in self._node_idx)
+        print("finished writing nodes to csv")
+
+    def export_csv(self, nodes_path="nodes.csv", edges_path="edges.csv") -> None:
+        """
+        same as Graph.export_csv; write_nodes_file / write_edges_file already stream their rows
+        """
+        self.write_nodes_file(nodes_path)
+        self.write_edges_file(edges_path)
@@ -0,0 +1,325 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from compact_graph import CompactGraph
+from graph_sink import StreamingGraph
+from Q1 import Graph, TMDBAPIUtils
+from tmdb_cache import ResponseCache
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    `rate` tokens are added per second up to `capacity`; acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FrontierExpander:
+    """
+    Expands a whole frontier level of the co-actor crawl with a bounded thread pool.
+
+    All credits and casts of a level are fetched concurrently, then the graph mutations
+    are replayed in exactly the order the serial algorithm performs them, so the resulting
+    graph (node and edge order included) is identical to the serial crawl.
+    """
+
+    def __init__(self, tmdb: TMDBAPIUtils, start_date: str, end_date: str, cast_limit: int = 5,
+                 max_workers: int = 8, rate: float = None):
+        self.tmdb = tmdb
+        self.start_date = start_date
+        self.end_date = end_date
+        self.cast_limit = cast_limit
+        self.limiter = TokenBucket(rate) if rate else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crawl")
+
+    def _limited(self, fn, *args, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return fn(*args, **kwargs)
+
+    def _credits(self, actor_id: str):
+        return self._executor.submit(self._limited, self.tmdb.get_movie_credit_records,
+                                     actor_id, self.start_date, self.end_date)
+
+    def _cast(self, actor_id: str, movie_id: str):
+        return self._executor.submit(self._limited, self.tmdb.get_movie_cast_records,
+                                     movie_id, limit=self.cast_limit, exclude_ids=[int(actor_id)])
+
+    def fetch_level(self, frontier: list) -> list:
+        """
+        Fetch the credits of every actor in the frontier and the cast of each of their movies.
+        Returns [(actor_id, [cast, ...]), ...] in frontier / credit order.
+        """
+        credit_futures = [(actor_id, self._credits(actor_id)) for actor_id in frontier]
+        cast_futures = []
+        for actor_id, fut in credit_futures:
+            movie_ids = [str(c.get("id") or "") for c in fut.result()]
+            cast_futures.append((actor_id, [self._cast(actor_id, mid) for mid in movie_ids if mid]))
+        return [(actor_id, [f.result() for f in futs]) for actor_id, futs in cast_futures]
+
+    @staticmethod
+    def merge_level(g: Graph, fetched: list) -> list:
+        """
+        Apply the fetched casts to the graph in serial order and return the newly added node ids
+        """
+        new_nodes = []
+        for actor_id, casts in fetched:
+            for cast in casts:
+                for co in cast:
+                    coid = str(co.get("id") or "")
+                    coname = co.get("name") or ""
+                    if not coid:
+                        continue
+                    if coid not in g._node_ids:
+                        g.add_node(coid, coname)
+                        new_nodes.append(coid)
+                    g.add_edge(actor_id, coid)
+        return new_nodes
+
+    def expand(self, g: Graph, frontier: list) -> list:
+        """
+        Expand one frontier level, returns the node ids added to the graph
+        """
+        return self.merge_level(g, self.fetch_level(frontier))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CoactorCrawler:
+    """
+    Resumable co-actor crawl for any seed set, release date window, depth and cast limit.
+
+    Level 0 expands the seeds (the base graph), then `depth` expansion levels follow, each
+    expanding the nodes added by the previous level - the same algorithm as
+    build_coactor_graph_for_1999. Frontiers are processed in batches of `checkpoint_every`
+    actors and after every batch the frontier, the position in it, the nodes added so far
+    in this level and the partial graph are written to `checkpoint_path`. Running again with
+    the same parameters resumes after the last completed batch.
+
+    With a graph_sink.StreamingGraph factory the graph itself lives in the nodes/edges files;
+    checkpoints then record how far those files had been written instead of the graph.
+    """
+
+    VERSION = 1
+
+    def __init__(self, tmdb: TMDBAPIUtils, seeds: list, start_date: str = None, end_date: str = None,
+                 depth: int = 2, cast_limit: int = 5, max_workers: int = 8, rate: float = None,
+                 checkpoint_path: str = None, checkpoint_every: int = 200, graph_factory=Graph):
+        self.tmdb = tmdb
+        self.seeds = [(str(sid), name) for sid, name in seeds]
+        self.start_date = start_date
+        self.end_date = end_date
+        self.depth = depth
+        self.cast_limit = cast_limit
+        self.max_workers = max_workers
+        self.rate = rate
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = max(1, int(checkpoint_every))
+        self.graph_factory = graph_factory  # Graph, compact_graph.CompactGraph or a StreamingGraph factory
+
+        self.graph = graph_factory()
+        self.level = 0                 # 0 = base graph, 1..depth = expansion loops
+        self.frontier = []             # actor ids of the level being expanded
+        self.cursor = 0                # number of frontier actors already merged into the graph
+        self.new_nodes = []            # node ids added so far in this level
+
+    def _params(self) -> dict:
+        return {"seeds": [sid for sid, _ in self.seeds], "start_date": self.start_date,
+                "end_date": self.end_date, "depth": self.depth, "cast_limit": self.cast_limit}
+
+    def _start(self) -> None:
+        for sid, name in self.seeds:
+            self.graph.add_node(sid, name)
+        self.level = 0
+        self.frontier = [sid for sid, _ in self.seeds]
+        self.cursor = 0
+        self.new_nodes = []
+
+    def done(self) -> bool:
+        return self.level > self.depth
+
+    def save_checkpoint(self) -> None:
+        """
+        Atomically write the crawl state as gzipped JSON; edges are stored as node index pairs
+        """
+        if not self.checkpoint_path:
+            return
+        state = {
+            "version": self.VERSION,
+            "params": self._params(),
+            "level": self.level,
+            "frontier": self.frontier,
+            "cursor": self.cursor,
+            "new_nodes": self.new_nodes,
+        }
+        if hasattr(self.graph, "checkpoint_state"):
+            state["sink"] = self.graph.checkpoint_state()
+        else:
+            nodes = self.graph.nodes
+            index = {nid: i for i, (nid, _) in enumerate(nodes)}
+            state["nodes"] = nodes
+            state["edges"] = [i for a, b in self.graph.edges for i in (index[a], index[b])]
+        tmp = self.checkpoint_path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp, self.checkpoint_path)
+
+    def load_checkpoint(self) -> bool:
+        """
+        Restore the crawl state from checkpoint_path, returns False if there is nothing to resume
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        with gzip.open(self.checkpoint_path, "rt", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("version") != self.VERSION or state.get("params") != self._params():
+            raise ValueError(f"checkpoint {self.checkpoint_path} was written by a crawl with different parameters")
+
+        g = self.graph_factory()
+        if "sink" in state:
+            g.restore(state["sink"])
+        else:
+            for nid, name in state["nodes"]:
+                g.add_node(nid, name)
+            ids = [nid for nid, _ in state["nodes"]]
+            edges = state["edges"]
+            for i in range(0, len(edges), 2):
+                g.add_edge(ids[edges[i]], ids[edges[i + 1]])
+        self.graph = g
+        self.level = state["level"]
+        self.frontier = state["frontier"]
+        self.cursor = state["cursor"]
+        self.new_nodes = state["new_nodes"]
+        return True
+
+    def run(self) -> Graph:
+        """
+        Run (or resume) the crawl to completion and return the graph
+        """
+        if not self.load_checkpoint():
+            self._start()
+        with FrontierExpander(self.tmdb, self.start_date, self.end_date, cast_limit=self.cast_limit,
+                              max_workers=self.max_workers, rate=self.rate) as expander:
+            while not self.done():
+                while self.cursor < len(self.frontier):
+                    batch = self.frontier[self.cursor:self.cursor + self.checkpoint_every]
+                    self.new_nodes += expander.expand(self.graph, batch)
+                    self.cursor += len(batch)
+                    self.save_checkpoint()
+                self.level += 1
+                self.frontier, self.cursor, self.new_nodes = self.new_nodes, 0, []
+                self.save_checkpoint()
+        return self.graph
+
+
+def build_coactor_graph_concurrent(api_key: str, max_workers: int = 8, rate: float = None,
+                                   tmdb: TMDBAPIUtils = None) -> Graph:
+    """
+    Same co-actor network as Q1.build_coactor_graph_for_1999, with every frontier level
+    fetched concurrently by up to `max_workers` threads and at most `rate` requests per second
+    """
+    tmdb = tmdb or TMDBAPIUtils(api_key)
+    crawler = CoactorCrawler(tmdb, [("2975", "Laurence Fishburne")], "1999-01-01", "1999-12-31",
+                             depth=2, cast_limit=5, max_workers=max_workers, rate=rate)
+    return crawler.run()
+
+
+def parse_seed(tmdb: TMDBAPIUtils, seed: str) -> tuple:
+    """
+    Parse a seed given as 'id' or 'id:name'; without a name it is looked up with /person/{id}
+    """
+    sid, _, name = seed.partition(":")
+    sid = sid.strip()
+    if not name:
+        name = tmdb._get(f"/person/{sid}", params={}).get("name") or ""
+    return sid, name
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Crawl a TMDb co-actor network, resumable from a checkpoint.")
+    parser.add_argument("--seed", action="append", required=True,
+                        help="seed person as 'id' or 'id:name', may be repeated")
+    parser.add_argument("--start-date", default=None, help="earliest release date, YYYY-MM-DD")
+    parser.add_argument("--end-date", default=None, help="latest release date, YYYY-MM-DD")
+    parser.add_argument("--depth", type=int, default=2, help="expansion loops after the base graph")
+    parser.add_argument("--cast-limit", type=int, default=5, help="co-actors taken per movie (by billing order)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=None, help="max requests per second")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file to write / resume from")
+    parser.add_argument("--checkpoint-every", type=int, default=200, help="actors expanded between checkpoints")
+    parser.add_argument("--cache", default=None, help="response cache file (tmdb_cache.ResponseCache)")
+    parser.add_argument("--cache-mode", default="readwrite", choices=ResponseCache.MODES)
+    parser.add_argument("--metrics", default=None, help="write request/cache/pool metrics to this JSON file")
+    parser.add_argument("--log-requests", action="store_true", help="print every request path")
+    parser.add_argument("--compact", action="store_true", help="build a CompactGraph (interned ids, typed arrays)")
+    parser.add_argument("--stream", action="store_true",
+                        help="append nodes/edges to --nodes/--edges while crawling (graph_sink.StreamingGraph)")
+    parser.add_argument("--stream-batch", type=int, default=10000, help="rows buffered before each append")
+    parser.add_argument("--nodes", default="nodes.csv")
+    parser.add_argument("--edges", default="edges.csv")
+    args = parser.parse_args(argv)
+    if args.cache_mode == "replay" and not args.cache:
+        parser.error("--cache-mode replay needs a --cache file to replay from")
+
+    api_key = os.environ.get("TMDB_API_KEY")
+    if not api_key and args.cache_mode != "replay":
+        parser.error("set TMDB_API_KEY in your environment (or replay from --cache)")
+
+    cache = ResponseCache(args.cache, mode=args.cache_mode) if args.cache else None
+    tmdb = TMDBAPIUtils.create(api_key, cache=cache, log_requests=args.log_requests)
+    seeds = [parse_seed(tmdb, s) for s in args.seed]
+    if args.stream:
+        graph_factory = lambda: StreamingGraph(args.nodes, args.edges, batch_size=args.stream_batch)
+    else:
+        graph_factory = CompactGraph if args.compact else Graph
+    crawler = CoactorCrawler(tmdb, seeds, args.start_date, args.end_date, depth=args.depth,
+                             cast_limit=args.cast_limit, max_workers=args.workers, rate=args.rate,
+                             checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                             graph_factory=graph_factory)
+    graph = crawler.run()
+    graph.export_csv(args.nodes, args.edges)
+    print("nodes:", graph.total_nodes(), "edges:", graph.total_edges())
+    print("movie credits memo:", tmdb.memo_stats())
+    print("connections:", tmdb.connection_stats())
+    print("requests:", tmdb.metrics.snapshot()["totals"])
+    if args.metrics:
+        tmdb.dump_stats(args.metrics)
+    tmdb.close()
+    if cache is not None:
+        print("cache:", cache.stats())
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+from array import array
+from collections import Counter
+
+
+class DegreeIndex:
+    """
+    Incrementally maintained node degrees, bucketed by degree.
+
+    Graphs here only ever gain edges, so degrees only go up: increment() moves a node one
+    bucket up in O(1) and the maximum degree is tracked as it grows. max_nodes() is then
+    O(size of the top bucket) and top(k) only walks the highest non-empty buckets, instead
+    of rescanning every edge.
+    """
+
+    def __init__(self):
+        self._deg = {}                 # node -> degree
+        self._buckets = {}             # degree -> {node: None}, insertion ordered
+        self.max_degree = 0
+
+    def increment(self, node) -> None:
+        d = self._deg.get(node, 0)
+        if d:
+            bucket = self._buckets[d]
+            del bucket[node]
+            if not bucket:
+                del self._buckets[d]
+        d += 1
+        self._deg[node] = d
+        bucket = self._buckets.get(d)
+        if bucket is None:
+            bucket = self._buckets[d] = {}
+        bucket[node] = None
+        if d > self.max_degree:
+            self.max_degree = d
+
+    def update(self, nodes) -> None:
+        """
+        Bulk increment(): one increment per occurrence of a node in `nodes`. Occurrences are
+        counted first, so each distinct node changes bucket once however many edges it has.
+        """
+        buckets = self._buckets
+        for node, c in Counter(nodes).items():
+            d = self.degree(node)
+            if d:
+                bucket = buckets[d]
+                del bucket[node]
+                if not bucket:
+                    del buckets[d]
+            self._set_degree(node, d, d + c)
+            d += c
+            bucket = buckets.get(d)
+            if bucket is None:
+                bucket = buckets[d] = {}
+            bucket[node] = None
+            if d > self.max_degree:
+                self.max_degree = d
+
+    def _set_degree(self, node, old: int, new: int) -> None:
+        self._deg[node] = new
+
+    def degree(self, node) -> int:
+        return self._deg.get(node, 0)
+
+    def max_nodes(self) -> dict:
+        """
+        {node: degree} of the node(s) with the highest degree, {} if there are no edges
+        """
+        if not self.max_degree:
+            return {}
+        mx = self.max_degree
+        return {node: mx for node in self._buckets[mx]}
+
+    def top(self, k: int) -> list:
+        """
+        The k highest-degree nodes as [(node, degree), ...], highest first
+        """
+        out = []
+        for d in sorted(self._buckets, reverse=True):
+            for node in self._buckets[d]:
+                if len(out) >= k:
+                    return out
+                out.append((node, d))
+        return out
+
+    def histogram(self) -> dict:
+        """
+        {degree: number of nodes with that degree}, ascending by degree
+        """
+        return {d: len(self._buckets[d]) for d in sorted(self._buckets)}
+
+    def __len__(self) -> int:
+        return len(self._deg)
+
+
+class DenseDegreeIndex(DegreeIndex):
+    """
+    DegreeIndex for nodes that are consecutive ints (e.g. interned ids), with the
+    per-node degrees held in a uint32 array instead of a dict
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._deg = array("I")
+        self._count = 0                # nodes with degree > 0
+
+    def increment(self, node: int) -> None:
+        deg = self._deg
+        if node >= len(deg):
+            # grow geometrically so interning a run of new ids stays amortized O(1)
+            deg.extend(array("I", bytes(4 * max(node + 1 - len(deg), len(deg)))))
+        d = deg[node]
+        if d:
+            bucket = self._buckets[d]
+            del bucket[node]
+            if not bucket:
+                del self._buckets[d]
+        else:
+            self._count += 1
+        d += 1
+        deg[node] = d
+        bucket = self._buckets.get(d)
+        if bucket is None:
+            bucket = self._buckets[d] = {}
+        bucket[node] = None
+        if d > self.max_degree:
+            self.max_degree = d
+
+    def _set_degree(self, node: int, old: int, new: int) -> None:
+        deg = self._deg
+        if node >= len(deg):
+            deg.extend(array("I", bytes(4 * max(node + 1 - len(deg), len(deg)))))
+        deg[node] = new
+        if not old:
+            self._count += 1
+
+    def degree(self, node: int) -> int:
+        return self._deg[node] if node < len(self._deg) else 0
+
+    def __len__(self) -> int:
+        return self._count
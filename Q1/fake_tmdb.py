@@ -0,0 +1,244 @@
+import argparse
+import gzip
+import http.client
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Q1 import TMDBAPIUtils
+from tmdb_pool import ConnectionPool
+
+
+class SyntheticCredits:
+    """
+    Deterministic synthetic co-actor universe of `people` persons and as many movies.
+
+    Person p (0-based) holds cast slot j of movie (a_j*p + b_j) mod N for j in 0..cast_size-1, so slot j
+    of movie m is held by a_j_inv*(m - b_j) mod N - both directions are computed in O(cast_size) without
+    materializing anything, which keeps million-node universes free. Ids exposed over the API are 1-based.
+    """
+
+    def __init__(self, people: int = 1000, cast_size: int = 8, year_lo: int = 1995, year_hi: int = 2004):
+        self.n = max(int(people), cast_size + 1)
+        self.cast_size = cast_size
+        self.year_lo = year_lo
+        self.year_span = year_hi - year_lo + 1
+        rng = random.Random(self.n)
+        self.a, self.a_inv, self.b = [], [], []
+        for _ in range(cast_size):
+            a = rng.randrange(1, self.n)
+            while math.gcd(a, self.n) != 1:
+                a = rng.randrange(1, self.n)
+            self.a.append(a)
+            self.a_inv.append(pow(a, -1, self.n))
+            self.b.append(rng.randrange(self.n))
+
+    def person_name(self, p: int) -> str:
+        # every 50th name carries a comma so the name cleaning in Graph.add_node is exercised
+        return f"Person {p + 1}, Jr." if p % 50 == 0 else f"Person {p + 1}"
+
+    def release_date(self, m: int) -> str:
+        h = (m * 2654435761) & 0xFFFFFFFF
+        return f"{self.year_lo + h % self.year_span}-{1 + (h >> 8) % 12:02d}-{1 + (h >> 12) % 28:02d}"
+
+    def person(self, pid: int) -> dict:
+        p = pid - 1
+        if not 0 <= p < self.n:
+            return None
+        return {"id": pid, "name": self.person_name(p), "known_for_department": "Acting"}
+
+    def person_movie_credits(self, pid: int) -> dict:
+        p = pid - 1
+        if not 0 <= p < self.n:
+            return None
+        cast = []
+        for j in range(self.cast_size):
+            m = (self.a[j] * p + self.b[j]) % self.n
+            cast.append({
+                "id": m + 1,
+                "title": f"Movie {m + 1}",
+                "original_title": f"Movie {m + 1}",
+                "release_date": self.release_date(m),
+                "character": f"Role {j}",
+                "credit_id": f"c{m + 1}x{pid}",
+                "order": (j + m) % self.cast_size,
+                "popularity": round((m % 997) / 10.0, 1),
+                "adult": False,
+            })
+        return {"id": pid, "cast": cast, "crew": []}
+
+    def movie_credits(self, mid: int) -> dict:
+        m = mid - 1
+        if not 0 <= m < self.n:
+            return None
+        cast = []
+        for j in range(self.cast_size):
+            p = (self.a_inv[j] * (m - self.b[j])) % self.n
+            cast.append({
+                "id": p + 1,
+                "name": self.person_name(p),
+                "original_name": self.person_name(p),
+                "character": f"Role {j}",
+                "credit_id": f"c{mid}x{p + 1}",
+                "order": (j + m) % self.cast_size,
+                "gender": p % 3,
+                "known_for_department": "Acting",
+                "popularity": round((p % 991) / 10.0, 1),
+                "adult": False,
+            })
+        return {"id": mid, "cast": cast, "crew": []}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"      # keep-alive, like the real API
+    disable_nagle_algorithm = True     # headers and body go out in separate writes
+
+    ROUTES = [
+        (re.compile(r"^/3/person/(\d+)/movie_credits$"), "person_movie_credits"),
+        (re.compile(r"^/3/movie/(\d+)/credits$"), "movie_credits"),
+        (re.compile(r"^/3/person/(\d+)$"), "person"),
+    ]
+
+    def do_GET(self):
+        server = self.server
+        server.count_request()
+        if server.latency or server.jitter:
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        roll = random.random()
+        if roll < server.drop_rate:
+            # drop the connection without answering
+            self.close_connection = True
+            return
+        if roll < server.drop_rate + server.error_rate:
+            self._send(500, {"status_code": 11, "status_message": "Internal error."})
+            return
+
+        path = self.path.split("?", 1)[0]
+        for pattern, method in self.ROUTES:
+            match = pattern.match(path)
+            if match:
+                payload = getattr(server.universe, method)(int(match.group(1)))
+                if payload is not None:
+                    self._send(200, payload)
+                    return
+                break
+        self._send(404, {"status_code": 34, "status_message": "The resource you requested could not be found."})
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        encoding = None
+        if self.server.compress:
+            accepted = {e.split(";")[0].strip() for e in self.headers.get("Accept-Encoding", "").lower().split(",")}
+            if "gzip" in accepted:
+                encoding, body = "gzip", gzip.compress(body, compresslevel=6, mtime=0)
+            elif "deflate" in accepted:
+                encoding, body = "deflate", zlib.compress(body, 6)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTMDBServer(ThreadingHTTPServer):
+    """
+    Local stand-in for api.themoviedb.org serving a SyntheticCredits universe over plain HTTP,
+    with optional injected latency (seconds, +/- jitter), 500 errors and dropped connections
+    (fractions of requests). Like the real API, bodies are gzip/deflate compressed when the
+    client accepts it, unless `compress` is off.
+
+        with FakeTMDBServer(people=10_000, latency=0.005) as server:
+            tmdb = server.client()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, people: int = 1000, cast_size: int = 8, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, drop_rate: float = 0.0,
+                 year_lo: int = 1995, year_hi: int = 2004, compress: bool = True):
+        super().__init__((host, port), _Handler)
+        self.universe = SyntheticCredits(people, cast_size, year_lo, year_hi)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.compress = compress
+        self.requests = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    def count_request(self) -> None:
+        with self._count_lock:
+            self.requests += 1
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeTMDBServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-tmdb", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def client(self, api_key: str = "test", **kwargs) -> TMDBAPIUtils:
+        return local_client(self.port, api_key, host=self.server_address[0], **kwargs)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def local_client(port: int, api_key: str = "test", host: str = "127.0.0.1", **kwargs) -> TMDBAPIUtils:
+    """
+    TMDBAPIUtils talking plain HTTP to a stand-in server instead of api.themoviedb.org
+    """
+    tmdb = TMDBAPIUtils.create(api_key, **kwargs)
+    tmdb._host = host
+    tmdb._pool = ConnectionPool(host, port, timeout=20, connection_class=http.client.HTTPConnection)
+    return tmdb
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a synthetic TMDb co-actor universe on localhost.")
+    parser.add_argument("--people", type=int, default=1000)
+    parser.add_argument("--cast-size", type=int, default=8)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--no-compress", action="store_true", help="never gzip/deflate responses")
+    args = parser.parse_args(argv)
+
+    server = FakeTMDBServer(args.people, args.cast_size, args.host, args.port, latency=args.latency,
+                            jitter=args.jitter, error_rate=args.error_rate, drop_rate=args.drop_rate,
+                            compress=not args.no_compress)
+    print(f"listening on {server.server_address[0]}:{server.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import shutil
+
+from degree_index import DenseDegreeIndex
+
+
+class StreamingGraph:
+    """
+    Graph that streams accepted nodes and edges to nodes.csv / edges.csv as it grows.
+
+    add_node/add_edge have Graph's dedup semantics, but accepted rows are buffered and appended
+    to the files in batches of `batch_size` instead of being kept in lists. Only the dedup
+    structures stay in memory: interned node ids, packed 64-bit edge keys and a degree array.
+    Rows are written in acceptance order in the same format as Graph.write_*_file, so after
+    close() the files are byte-identical to what a Graph built with the same calls would write.
+    """
+
+    NODES_HEADER = "id,name\n"
+    EDGES_HEADER = "source,target\n"
+
+    def __init__(self, nodes_path="nodes.csv", edges_path="edges.csv", batch_size: int = 10000):
+        self.nodes_path = nodes_path
+        self.edges_path = edges_path
+        self.batch_size = batch_size
+        self._node_ids = {}            # node id -> interned int, also the "is a node" set
+        self._ids = []                 # interned int -> id, for ids in nodes and edges
+        self._index = {}               # id -> interned int, for ids only seen in edges
+        self._edge_keys = set()        # packed canonical edge keys
+        self._degrees = DenseDegreeIndex()
+        self._node_count = 0
+        self._edge_count = 0
+        self._pending_nodes = []
+        self._pending_edges = []
+        self._nodes_file = None
+        self._edges_file = None
+
+    def _intern(self, nid: str) -> int:
+        i = self._node_ids.get(nid)
+        if i is None:
+            i = self._index.get(nid)
+            if i is None:
+                i = self._index[nid] = len(self._ids)
+                self._ids.append(nid)
+        return i
+
+    def add_node(self, id: str, name: str) -> None:
+        """
+        add a node (id, name) if it does not already exist, commas are removed from the name
+        """
+        sid = str(id)
+        sname = str(name) if name is not None else ""
+        sname = sname.replace(",", "")
+        if sid not in self._node_ids:
+            i = self._index.pop(sid, None)
+            if i is None:
+                i = len(self._ids)
+                self._ids.append(sid)
+            self._node_ids[sid] = i
+            self._node_count += 1
+            self._pending_nodes.append(sid + "," + sname + "\n")
+            if len(self._pending_nodes) >= self.batch_size:
+                self.flush()
+
+    def add_edge(self, source: str, target: str) -> None:
+        """
+        Add an undirected edge between two node ids if it does not already exist (no self-loops)
+        """
+        u = str(source); v = str(target)
+        if u == v:
+            return
+        a, b = (u, v) if u < v else (v, u)
+        ia, ib = self._intern(a), self._intern(b)
+        key = ia << 32 | ib
+        if key not in self._edge_keys:
+            self._edge_keys.add(key)
+            self._edge_count += 1
+            self._degrees.increment(ia)
+            self._degrees.increment(ib)
+            self._pending_edges.append(a + "," + b + "\n")
+            if len(self._pending_edges) >= self.batch_size:
+                self.flush()
+
+    def total_nodes(self) -> int:
+        return self._node_count
+
+    def total_edges(self) -> int:
+        return self._edge_count
+
+    def max_degree_nodes(self) -> dict:
+        ids = self._ids
+        return {ids[i]: d for i, d in self._degrees.max_nodes().items()}
+
+    def top_degree_nodes(self, k: int = 10) -> list:
+        ids = self._ids
+        return [(ids[i], d) for i, d in self._degrees.top(k)]
+
+    def degree_histogram(self) -> dict:
+        return self._degrees.histogram()
+
+    def _open(self) -> None:
+        if self._nodes_file is None:
+            self._nodes_file = open(self.nodes_path, "w", encoding="utf-8")
+            self._nodes_file.write(self.NODES_HEADER)
+            self._edges_file = open(self.edges_path, "w", encoding="utf-8")
+            self._edges_file.write(self.EDGES_HEADER)
+
+    def flush(self) -> None:
+        """
+        Append the buffered rows to the files and flush them to the OS
+        """
+        if self._nodes_file is not None and self._nodes_file.closed:
+            return
+        self._open()
+        if self._pending_nodes:
+            self._nodes_file.writelines(self._pending_nodes)
+            self._pending_nodes = []
+        if self._pending_edges:
+            self._edges_file.writelines(self._pending_edges)
+            self._pending_edges = []
+        self._nodes_file.flush()
+        self._edges_file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._nodes_file.close()
+        self._edges_file.close()
+
+    def checkpoint_state(self) -> dict:
+        """
+        Flush and return the file sizes; restore() truncates back to exactly this point
+        """
+        self.flush()
+        os.fsync(self._nodes_file.fileno())
+        os.fsync(self._edges_file.fileno())
+        return {"nodes_path": self.nodes_path, "edges_path": self.edges_path,
+                "nodes_bytes": os.fstat(self._nodes_file.fileno()).st_size,
+                "edges_bytes": os.fstat(self._edges_file.fileno()).st_size}
+
+    def restore(self, state: dict) -> None:
+        """
+        Resume streaming into files written up to checkpoint_state(): rows after the
+        checkpoint are truncated away and the dedup structures are rebuilt from the files
+        """
+        self.nodes_path, self.edges_path = state["nodes_path"], state["edges_path"]
+        for path, size in ((self.nodes_path, state["nodes_bytes"]), (self.edges_path, state["edges_bytes"])):
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+        with open(self.nodes_path, encoding="utf-8") as f:
+            next(f, None)
+            for line in f:
+                sid = line.split(",", 1)[0]
+                if sid not in self._node_ids:
+                    self._node_ids[sid] = len(self._ids)
+                    self._ids.append(sid)
+                self._node_count += 1
+        with open(self.edges_path, encoding="utf-8") as f:
+            next(f, None)
+            for line in f:
+                a, b = line.rstrip("\n").split(",", 1)
+                ia, ib = self._intern(a), self._intern(b)
+                self._edge_keys.add(ia << 32 | ib)
+                self._degrees.increment(ia)
+                self._degrees.increment(ib)
+                self._edge_count += 1
+
+        self._nodes_file = open(self.nodes_path, "a", encoding="utf-8")
+        self._edges_file = open(self.edges_path, "a", encoding="utf-8")
+
+    @property
+    def nodes(self) -> list:
+        """
+        list of (id:str, name:str), read back from the nodes file
+        """
+        self.flush()
+        with open(self.nodes_path, encoding="utf-8") as f:
+            next(f, None)
+            return [tuple(line.rstrip("\n").split(",", 1)) for line in f]
+
+    @property
+    def edges(self) -> list:
+        """
+        list of (source_id:str, target_id:str), read back from the edges file
+        """
+        self.flush()
+        with open(self.edges_path, encoding="utf-8") as f:
+            next(f, None)
+            return [tuple(line.rstrip("\n").split(",", 1)) for line in f]
+
+    def write_edges_file(self, path="edges.csv") -> None:
+        """
+        finish streaming; the edges file is already written, it is copied if `path` is elsewhere
+        """
+        self.close()
+        if os.path.abspath(path) != os.path.abspath(self.edges_path):
+            shutil.copyfile(self.edges_path, path)
+        print("finished writing edges to csv")
+
+    def write_nodes_file(self, path="nodes.csv") -> None:
+        """
+        finish streaming; the nodes file is already written, it is copied if `path` is elsewhere
+        """
+        self.close()
+        if os.path.abspath(path) != os.path.abspath(self.nodes_path):
+            shutil.copyfile(self.nodes_path, path)
+        print("finished writing nodes to csv")
+
+    def export_csv(self, nodes_path="nodes.csv", edges_path="edges.csv") -> None:
+        """
+        same as Graph.export_csv: finish streaming and put both files at the given paths
+        """
+        self.write_nodes_file(nodes_path)
+        self.write_edges_file(edges_path)
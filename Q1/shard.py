@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from compact_graph import CompactGraph
+from crawl import CoactorCrawler, parse_seed
+from fake_tmdb import local_client
+from Q1 import TMDBAPIUtils
+from tmdb_cache import ResponseCache
+
+# one independent crawl: `seeds` expanded over the release date window [start_date, end_date]
+ShardSpec = namedtuple("ShardSpec", "label seeds start_date end_date")
+
+# a finished shard in CompactGraph's interned layout, small to pickle back to the parent
+ShardResult = namedtuple("ShardResult", "label ids node_idx names src dst stats")
+
+
+def shards_by_year(seeds: list, first_year: int, last_year: int) -> list:
+    """
+    One shard per calendar year, every shard crawling from all seeds
+    """
+    return [ShardSpec(str(y), seeds, f"{y}-01-01", f"{y}-12-31") for y in range(first_year, last_year + 1)]
+
+
+def shards_by_seed(seeds: list, start_date: str = None, end_date: str = None) -> list:
+    """
+    One shard per seed, all over the same date window
+    """
+    return [ShardSpec(str(sid), [(sid, name)], start_date, end_date) for sid, name in seeds]
+
+
+def make_client(config: dict, shard_index: int = 0) -> TMDBAPIUtils:
+    """
+    Build the TMDb client of a shard from a picklable config: {'ports': [...]} talks to local
+    stand-in servers (round-robin by shard), otherwise the real API with `api_key` and an
+    optional shared response `cache` file opened in `cache_mode`
+    """
+    cache = None
+    if config.get("cache"):
+        cache = ResponseCache(config["cache"], mode=config.get("cache_mode", "readwrite"))
+    ports = config.get("ports")
+    if ports:
+        return local_client(ports[shard_index % len(ports)], cache=cache)
+    return TMDBAPIUtils.create(config.get("api_key"), cache=cache)
+
+
+def crawl_shard(spec: ShardSpec, config: dict, shard_index: int = 0, depth: int = 2, cast_limit: int = 5,
+                max_workers: int = 8) -> ShardResult:
+    """
+    Crawl one shard into a CompactGraph (runs in a worker process)
+    """
+    tmdb = make_client(config, shard_index)
+    t0 = time.perf_counter()
+    crawler = CoactorCrawler(tmdb, spec.seeds, spec.start_date, spec.end_date, depth=depth,
+                             cast_limit=cast_limit, max_workers=max_workers, graph_factory=CompactGraph)
+    g = crawler.run()
+    stats = {
+        "shard": spec.label,
+        "pid": os.getpid(),
+        "nodes": g.total_nodes(),
+        "edges": g.total_edges(),
+        "wall_s": round(time.perf_counter() - t0, 4),
+        "requests": tmdb.metrics.snapshot()["totals"]["attempts"],
+    }
+    tmdb.close()
+    if tmdb.cache is not None:
+        tmdb.cache.close()
+    names = g._names
+    return ShardResult(spec.label, g._ids, g._node_idx, [names[i] for i in g._node_idx], g._src, g._dst, stats)
+
+
+class EdgeAttribution:
+    """
+    Which shards (e.g. years) produced each edge of a merged graph, as one bitmask per edge
+    """
+
+    def __init__(self):
+        self.labels = []               # shard index -> label
+        self._masks = {}               # packed edge key -> bitmask of shard indexes
+
+    def add(self, label: str, keys: list) -> None:
+        bit = 1 << len(self.labels)
+        self.labels.append(label)
+        masks = self._masks
+        for k in keys:
+            masks[k] = masks.get(k, 0) | bit
+
+    def labels_of(self, mask: int) -> list:
+        return [label for i, label in enumerate(self.labels) if mask >> i & 1]
+
+    def write_csv(self, g: CompactGraph, path: str = "edge_shards.csv") -> None:
+        """
+        write source,target,shards (';'-separated labels) in the graph's edge order
+        """
+        ids, masks = g._ids, self._masks
+        with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.write("source,target,shards\n")
+            f.writelines(f"{ids[u]},{ids[v]},{';'.join(self.labels_of(masks[u << 32 | v]))}\n"
+                         for u, v in zip(g._src, g._dst))
+
+
+def merge_shards(results, attribute: bool = False) -> tuple:
+    """
+    Union shard results into one deduplicated CompactGraph, in the order they are given.
+    Returns (graph, EdgeAttribution or None).
+    """
+    g = CompactGraph()
+    attribution = EdgeAttribution() if attribute else None
+    for r in results:
+        keys = g.merge_parts(r.ids, r.node_idx, r.names, r.src, r.dst)
+        if attribution is not None:
+            attribution.add(r.label, keys)
+    return g, attribution
+
+
+def run_sharded(specs: list, config: dict, processes: int = None, depth: int = 2, cast_limit: int = 5,
+                max_workers: int = 8, attribute: bool = False) -> tuple:
+    """
+    Crawl every shard in a process pool and merge the shard graphs as they complete, in shard order.
+    Returns (graph, EdgeAttribution or None, [per-shard stats]).
+    """
+    stats = []
+
+    def completed(pool):
+        futures = [pool.submit(crawl_shard, spec, config, i, depth, cast_limit, max_workers)
+                   for i, spec in enumerate(specs)]
+        for fut in futures:
+            result = fut.result()
+            stats.append(result.stats)
+            yield result
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        g, attribution = merge_shards(completed(pool), attribute)
+    return g, attribution, stats
+
+
+def _year_range(value: str) -> tuple:
+    first, _, last = value.partition("-")
+    return int(first), int(last or first)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Crawl a co-actor network sharded by year or seed across processes.")
+    parser.add_argument("--seed", action="append", required=True,
+                        help="seed person as 'id' or 'id:name', may be repeated")
+    parser.add_argument("--by", choices=("year", "seed"), default="year")
+    parser.add_argument("--years", type=_year_range, default=None, help="e.g. 1990-1999, required with --by year")
+    parser.add_argument("--start-date", default=None, help="release date window with --by seed")
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--cast-limit", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests within each shard")
+    parser.add_argument("--cache", default=None, help="response cache file shared by all shards")
+    parser.add_argument("--cache-mode", default="readwrite", choices=ResponseCache.MODES)
+    parser.add_argument("--port", type=int, action="append", default=None,
+                        help="crawl a local fake_tmdb.py server on this port instead of the API, may be repeated")
+    parser.add_argument("--attribution", default=None, help="also write source,target,shards to this csv")
+    parser.add_argument("--nodes", default="nodes.csv")
+    parser.add_argument("--edges", default="edges.csv")
+    args = parser.parse_args(argv)
+
+    if args.by == "year" and not args.years:
+        parser.error("--by year needs --years")
+    api_key = os.environ.get("TMDB_API_KEY")
+    if not api_key and not args.port and args.cache_mode != "replay":
+        parser.error("set TMDB_API_KEY in your environment (or replay from --cache, or use --port)")
+
+    config = {"api_key": api_key, "cache": args.cache, "cache_mode": args.cache_mode, "ports": args.port}
+    lookup = make_client(config)
+    seeds = [parse_seed(lookup, s) for s in args.seed]
+    lookup.close()
+    if lookup.cache is not None:
+        lookup.cache.close()
+    if args.by == "year":
+        specs = shards_by_year(seeds, *args.years)
+    else:
+        specs = shards_by_seed(seeds, args.start_date, args.end_date)
+
+    t0 = time.perf_counter()
+    graph, attribution, stats = run_sharded(specs, config, args.processes, args.depth, args.cast_limit,
+                                            args.workers, attribute=bool(args.attribution))
+    for s in stats:
+        print(json.dumps(s))
+    print("shards:", len(specs), "wall_s:", round(time.perf_counter() - t0, 3))
+    graph.export_csv(args.nodes, args.edges)
+    if attribution is not None:
+        attribution.write_csv(graph, args.attribution)
+    print("nodes:", graph.total_nodes(), "edges:", graph.total_edges())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import mmap
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain
+
+# Binary graph snapshot, little-endian, every section 8-byte aligned:
+#
+#   header        MAGIC, version u32, flags u32, n_ids u64, n_nodes u64, n_edges u64,
+#                 id_blob_len u64, name_blob_len u64 (padded to 64 bytes)
+#   id_offsets    u64[n_ids + 1]     string table of every id, interned ints index into it
+#   id_blob       utf-8 bytes
+#   node_idx      u32[n_nodes]       interned id of each node, in node order
+#   name_offsets  u64[n_nodes + 1]   name of each node, in node order
+#   name_blob     utf-8 bytes
+#   src, dst      u32[n_edges] each  interned endpoints of each edge, in edge order
+#
+# The fixed-width sections are read in place through memoryviews over a read-only mmap,
+# so opening a snapshot costs the same regardless of graph size.
+
+MAGIC = b"CGSNAP\x00\x01"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIQQQQQ")
+_HEADER_SIZE = 64
+
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _le(arr: array) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _string_table(strings) -> tuple:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array("Q", [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    return offsets, b"".join(encoded)
+
+
+def write_snapshot(path: str, ids: list, node_idx, names: list, src, dst) -> None:
+    """
+    Write a snapshot from interned parts: `ids` is the id string table, `node_idx` / `names` the
+    interned id and name of each node, `src` / `dst` the interned endpoints of each edge
+    """
+    id_offsets, id_blob = _string_table(ids)
+    name_offsets, name_blob = _string_table(names)
+    sections = [
+        _le(id_offsets), id_blob,
+        _le(array("I", node_idx)),
+        _le(name_offsets), name_blob,
+        _le(array("I", src)), _le(array("I", dst)),
+    ]
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(ids), len(names), len(src), len(id_blob), len(name_blob))
+    with open(path, "wb", buffering=1 << 20) as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\x00"))
+        for section in sections:
+            f.write(section)
+            f.write(b"\x00" * (_pad(len(section)) - len(section)))
+
+
+def write_graph_snapshot(path: str, nodes: list, edges: list) -> None:
+    """
+    Write a snapshot of Graph-style (id, name) node and (source, target) edge lists
+    """
+    # node ids first, then ids only seen in edges, each interned once in order of appearance
+    interner = _Interner()
+    node_idx = array("I", map(interner.__getitem__, (nid for nid, _ in nodes)))
+    flat = array("I", map(interner.__getitem__, chain.from_iterable(edges)))
+    write_snapshot(path, list(interner), node_idx, [name for _, name in nodes], flat[0::2], flat[1::2])
+
+
+class _Interner(dict):
+    """
+    id -> interned int, assigning the next int to ids not seen before
+    """
+
+    def __missing__(self, key):
+        i = self[key] = len(self)
+        return i
+
+
+class GraphSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file.
+
+    `src`, `dst`, `node_idx` and the offset tables are zero-copy memoryviews into the mapping;
+    strings are decoded only when asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _flags, n_ids, n_nodes, n_edges, id_len, name_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} graph snapshot")
+        if sys.byteorder == "big":
+            raise ValueError("graph snapshots are little-endian and are not mapped on big-endian hosts")
+        self.n_ids, self.n_nodes, self.n_edges = n_ids, n_nodes, n_edges
+
+        buf = memoryview(self._mm)
+        pos = _HEADER_SIZE
+
+        def take(nbytes, fmt=None):
+            nonlocal pos
+            view = buf[pos:pos + nbytes]
+            pos += _pad(nbytes)
+            return view.cast(fmt) if fmt else view
+
+        self.id_offsets = take(8 * (n_ids + 1), "Q")
+        self.id_blob = take(id_len)
+        self.node_idx = take(4 * n_nodes, "I")
+        self.name_offsets = take(8 * (n_nodes + 1), "Q")
+        self.name_blob = take(name_len)
+        self.src = take(4 * n_edges, "I")
+        self.dst = take(4 * n_edges, "I")
+        self._views = [buf, self.id_offsets, self.id_blob, self.node_idx, self.name_offsets,
+                       self.name_blob, self.src, self.dst]
+        self._ids = None
+
+    def total_nodes(self) -> int:
+        return self.n_nodes
+
+    def total_edges(self) -> int:
+        return self.n_edges
+
+    def id(self, i: int) -> str:
+        return bytes(self.id_blob[self.id_offsets[i]:self.id_offsets[i + 1]]).decode("utf-8")
+
+    @staticmethod
+    def _decode_all(blob: memoryview, offsets: memoryview) -> list:
+        raw = bytes(blob)
+        if raw.isascii():
+            # byte offsets are str offsets, slice one decoded string
+            text = raw.decode("ascii")
+            return [text[a:b] for a, b in zip(offsets, offsets[1:])]
+        return [raw[a:b].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+    def ids(self) -> list:
+        """
+        The whole id string table, decoded once and kept
+        """
+        if self._ids is None:
+            self._ids = self._decode_all(self.id_blob, self.id_offsets)
+        return self._ids
+
+    def names(self) -> list:
+        """
+        Names of all nodes, in node order
+        """
+        return self._decode_all(self.name_blob, self.name_offsets)
+
+    def name(self, k: int) -> str:
+        return bytes(self.name_blob[self.name_offsets[k]:self.name_offsets[k + 1]]).decode("utf-8")
+
+    def iter_nodes(self):
+        ids = self.ids()
+        return zip(map(ids.__getitem__, self.node_idx), self.names())
+
+    def iter_edges(self):
+        ids = self.ids().__getitem__
+        return zip(map(ids, self.src), map(ids, self.dst))
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_snapshot(path: str) -> GraphSnapshot:
+    return GraphSnapshot(path)
@@ -0,0 +1,20 @@
+import pytest
+
+from crawl import build_coactor_graph_concurrent
+from fake_tmdb import FakeTMDBServer
+from Q1 import build_coactor_graph_for_1999
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeTMDBServer(people=3000, year_lo=1999, year_hi=1999) as server:
+        yield server
+
+
+def test_concurrent_crawl_matches_serial(server):
+    serial = build_coactor_graph_for_1999("test", tmdb=server.client())
+    concurrent = build_coactor_graph_concurrent("test", max_workers=8, tmdb=server.client())
+    assert (serial.total_nodes(), serial.total_edges()) == (3000, 27871)
+    assert concurrent.nodes == serial.nodes
+    assert concurrent.edges == serial.edges
+    assert concurrent.max_degree_nodes() == serial.max_degree_nodes()
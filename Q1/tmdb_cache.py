@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlencode
+
+
+class CacheMiss(LookupError):
+    """
+    Raised in replay mode when a response is not in the cache
+    """
+
+
+class ResponseCache:
+    """
+    Persistent SQLite-backed cache of raw TMDb response bodies.
+
+    Entries are keyed by request path plus normalized query params (the api_key is left out)
+    and expire after `ttl` seconds. Once the stored bodies exceed `max_bytes` the least
+    recently used entries are evicted.
+
+    mode:
+        'readwrite' - serve fresh entries, fetch and store misses (default)
+        'record'    - always fetch and overwrite the stored entry
+        'replay'    - serve only from the cache regardless of age, a miss raises CacheMiss
+    """
+
+    MODES = ("readwrite", "record", "replay")
+
+    def __init__(self, path: str = "tmdb_cache.sqlite", ttl: float = 7 * 24 * 3600,
+                 max_bytes: int = 512 * 1024 * 1024, mode: str = "readwrite"):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown cache mode {mode!r}, expected one of {self.MODES}")
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key        TEXT PRIMARY KEY,
+                body       BLOB NOT NULL,
+                size       INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used  REAL NOT NULL
+            );
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(path: str, params: dict) -> str:
+        """
+        Cache key for a request: the path plus its params sorted by name, without the api_key
+        """
+        items = sorted((k, str(v)) for k, v in (params or {}).items() if k != "api_key")
+        return path + "?" + urlencode(items) if items else path
+
+    def get(self, key: str):
+        """
+        Returns the cached body (bytes) or None if there is no usable entry
+        """
+        if self.mode == "record":
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.mode != "replay" and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, body: bytes) -> None:
+        if self.mode == "replay":
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses(key, body, size, fetched_at, last_used) VALUES (?,?,?,?,?)",
+                (key, body, len(body), now, now))
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self.stores += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """
+        Drop least recently used entries until the cache is back under 90% of max_bytes
+        """
+        target = self.max_bytes * 0.9
+        cur = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used ASC")
+        victims = []
+        freed = 0
+        for key, size in cur:
+            if self._total_bytes - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        cur.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._total_bytes -= freed
+        self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "mode": self.mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class InflightMemo:
+    """
+    Per-run memo of computed values where concurrent callers asking for the same key
+    share one in-flight computation instead of each issuing their own request.
+    Empty results (e.g. {} from a failed request) are handed to waiting callers but not memoized.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = {}
+        self._inflight = {}            # key -> Future of the running computation
+        self.hits = 0                  # served from the memo
+        self.coalesced = 0             # waited on another caller's in-flight computation
+        self.misses = 0                # computed
+
+    def get_or_compute(self, key, fn):
+        with self._lock:
+            if key in self._done:
+                self.hits += 1
+                return self._done[key]
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return fut.result()
+
+        try:
+            value = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            if value:
+                self._done[key] = value
+            del self._inflight[key]
+        fut.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._done.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            saved = self.hits + self.coalesced
+            return {
+                "lookups": lookups,
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": round(saved / lookups, 4) if lookups else 0.0,
+                "http_calls_saved": saved,
+            }
@@ -0,0 +1,154 @@
+import re
+import threading
+from bisect import bisect_left
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_of(path: str) -> str:
+    """
+    Endpoint template of a request path: /person/2975/movie_credits -> /person/{id}/movie_credits
+    """
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram in milliseconds; percentiles are reported as the upper
+    bound of the bucket they fall in. Not locked on its own, ClientMetrics serializes updates.
+    """
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)   # last bucket is > 30 s
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.counts[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bound, c in zip(self.BOUNDS_MS, self.counts):
+            seen += c
+            if seen >= rank:
+                return float(bound)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> dict:
+        buckets = {f"le_{b}ms": c for b, c in zip(self.BOUNDS_MS, self.counts) if c}
+        if self.counts[-1]:
+            buckets["gt_30000ms"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "buckets": buckets,
+        }
+
+
+class _EndpointStats:
+
+    __slots__ = ("attempts", "responses", "statuses", "errors", "retries", "failures",
+                 "cache_hits", "bytes", "decoded_bytes", "latency")
+
+    def __init__(self):
+        self.attempts = 0              # HTTP requests sent, including retries
+        self.responses = 0
+        self.statuses = {}             # HTTP status -> count
+        self.errors = 0                # attempts that raised (timeouts, resets, ...)
+        self.retries = 0
+        self.failures = {}             # reason -> calls that gave up and returned {}
+        self.cache_hits = 0
+        self.bytes = 0                 # response body bytes received (on the wire, possibly compressed)
+        self.decoded_bytes = 0         # response body bytes after Content-Encoding was undone
+        self.latency = LatencyHistogram()
+
+    def to_dict(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "responses": self.responses,
+            "statuses": {str(s): c for s, c in sorted(self.statuses.items())},
+            "errors": self.errors,
+            "retries": self.retries,
+            "failures": dict(self.failures),
+            "cache_hits": self.cache_hits,
+            "bytes": self.bytes,
+            "decoded_bytes": self.decoded_bytes,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class ClientMetrics:
+    """
+    Thread-safe per-endpoint counters for TMDBAPIUtils: request latency histograms, HTTP statuses,
+    transport errors, retries, give-ups by reason, cache hits and response bytes.
+    Every record_* call is a dict lookup and a few additions under one lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _stats(self, endpoint: str) -> _EndpointStats:
+        s = self._endpoints.get(endpoint)
+        if s is None:
+            s = self._endpoints[endpoint] = _EndpointStats()
+        return s
+
+    def record_response(self, endpoint: str, status: int, nbytes: int, seconds: float,
+                        decoded_bytes: int = None) -> None:
+        with self._lock:
+            s = self._stats(endpoint)
+            s.attempts += 1
+            s.responses += 1
+            s.statuses[status] = s.statuses.get(status, 0) + 1
+            s.bytes += nbytes
+            s.decoded_bytes += nbytes if decoded_bytes is None else decoded_bytes
+            s.latency.observe(seconds)
+
+    def record_error(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            s = self._stats(endpoint)
+            s.attempts += 1
+            s.errors += 1
+            s.latency.observe(seconds)
+
+    def record_retry(self, endpoint: str) -> None:
+        with self._lock:
+            self._stats(endpoint).retries += 1
+
+    def record_failure(self, endpoint: str, reason: str) -> None:
+        with self._lock:
+            failures = self._stats(endpoint).failures
+            failures[reason] = failures.get(reason, 0) + 1
+
+    def record_cache_hit(self, endpoint: str) -> None:
+        with self._lock:
+            self._stats(endpoint).cache_hits += 1
+
+    def snapshot(self) -> dict:
+        """
+        {'endpoints': {template: counters}, 'totals': {...}} as plain JSON-serializable values
+        """
+        with self._lock:
+            endpoints = {ep: s.to_dict() for ep, s in sorted(self._endpoints.items())}
+        totals = {"attempts": 0, "responses": 0, "errors": 0, "retries": 0, "failures": 0,
+                  "cache_hits": 0, "bytes": 0, "decoded_bytes": 0}
+        for s in endpoints.values():
+            for k in totals:
+                totals[k] += sum(s[k].values()) if k == "failures" else s[k]
+        return {"endpoints": endpoints, "totals": totals}
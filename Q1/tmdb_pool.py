@@ -0,0 +1,134 @@
+import http.client
+import threading
+import zlib
+
+# sent with every request by clients that can decode_body() the response
+ACCEPT_ENCODING = "gzip, deflate"
+
+
+def decode_body(body: bytes, content_encoding: str = None) -> bytes:
+    """
+    Undo a gzip or deflate Content-Encoding; identity bodies are returned as is
+    """
+    encoding = (content_encoding or "").strip().lower()
+    if not encoding or encoding == "identity":
+        return body
+    # JSON compresses 4-6x; sizing the output buffer for that avoids zlib's 16 KiB default
+    bufsize = max(1024, 6 * len(body))
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS, bufsize)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body, zlib.MAX_WBITS, bufsize)
+        except zlib.error:
+            # some servers send a raw deflate stream without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS, bufsize)
+    raise ValueError(f"unsupported Content-Encoding {content_encoding!r}")
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of keep-alive HTTP(S) connections to a single host.
+
+    Each call checks out an idle connection (or opens a new one), issues one
+    request, reads the whole body and hands the connection back so the next
+    call can reuse it. Connections the server has already closed are detected
+    on reuse and transparently replaced by a fresh one.
+    """
+
+    # errors raised when a pooled keep-alive connection was closed by the server
+    _STALE_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        http.client.BadStatusLine,
+        ConnectionResetError,
+        BrokenPipeError,
+    )
+
+    def __init__(self, host: str, port: int = None, timeout: float = 20, maxsize: int = 8,
+                 connection_class=http.client.HTTPSConnection):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.connection_class = connection_class
+        self._idle = []                # idle connections, most recently used last
+        self._lock = threading.Lock()
+        self.created = 0               # connections opened
+        self.reused = 0                # requests served on an already open connection
+
+    def _new_connection(self):
+        conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _acquire(self):
+        """
+        Return (connection, reused) - an idle connection if there is one, else a new one
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _release(self, conn) -> None:
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _roundtrip(self, conn, method: str, path: str, headers: dict):
+        conn.request(method, path, headers=headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        return resp, body
+
+    def request(self, method: str, path: str, headers: dict = None):
+        """
+        Issue a single request and return (status, headers, body)
+        The connection goes back to the pool unless the server asked to close it.
+        """
+        headers = headers or {}
+        conn, reused = self._acquire()
+        try:
+            try:
+                resp, body = self._roundtrip(conn, method, path, headers)
+                if reused:
+                    # counted only once the pooled connection has answered, not when it turns out stale
+                    with self._lock:
+                        self.reused += 1
+            except self._STALE_ERRORS:
+                if not reused:
+                    raise
+                # the server closed the idle connection, reconnect once and retry
+                conn.close()
+                conn = self._new_connection()
+                resp, body = self._roundtrip(conn, method, path, headers)
+        except Exception:
+            conn.close()
+            raise
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return resp.status, resp.headers, body
+
+    def close(self) -> None:
+        """
+        Close every idle connection
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        """
+        Returns a dict with the number of connections created, requests that reused
+        a connection and connections currently idle
+        """
+        with self._lock:
+            return {"created": self.created, "reused": self.reused, "idle": len(self._idle)}
@@ -0,0 +1,84 @@
+import sys
+
+
+class _Record:
+    """
+    Slotted, read-only-by-convention credit record. get() and [] behave like the dicts the
+    API returns for the kept fields, so code written against the raw payload keeps working.
+    """
+
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        if key in self.__slots__:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, f) for f in self.__slots__))
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.__slots__ if getattr(self, f) is not None}
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class CastCredit(_Record):
+    """
+    A cast member of a movie (/movie/{id}/credits): person id, name and billing order
+    """
+
+    __slots__ = ("id", "name", "order")
+
+    def __init__(self, id, name=None, order=None):
+        self.id = id
+        self.name = name
+        self.order = order
+
+
+class MovieCredit(_Record):
+    """
+    A movie a person was cast in (/person/{id}/movie_credits): movie id and release date
+    """
+
+    __slots__ = ("id", "release_date")
+
+    def __init__(self, id, release_date=None):
+        self.id = id
+        self.release_date = release_date
+
+
+def _interned(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def cast_credits(payload: dict) -> list:
+    """
+    The 'cast' array of a movie credits payload as CastCredit records; names are interned
+    since the same actors recur across many movies
+    """
+    return [CastCredit(c.get("id"), _interned(c.get("name")), c.get("order"))
+            for c in payload.get("cast") or ()]
+
+
+def movie_credits(payload: dict) -> list:
+    """
+    The 'cast' array of a person movie credits payload as MovieCredit records; release dates are
+    interned since many movies share one
+    """
+    return [MovieCredit(c.get("id"), _interned(c.get("release_date")))
+            for c in payload.get("cast") or ()]
@@ -0,0 +1,377 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+NODES_HEADER = b"id,name"
+EDGES_HEADER = b"source,target"
+
+# problems that make the files invalid; everything else in the report is a warning
+ERRORS = ("bad_header", "malformed_row", "invalid_id", "id_out_of_range", "comma_in_name",
+          "duplicate_node", "self_loop", "duplicate_edge", "dangling_edge")
+WARNINGS = ("orphan_node", "empty_name", "flagged_id")
+
+MAX_ID = (1 << 32) - 1                 # ids are packed two to a uint64 edge key
+
+
+class Report:
+    """
+    Problem counts plus the first few examples of each kind
+    """
+
+    def __init__(self, max_samples: int = 10):
+        self.max_samples = max_samples
+        self.counts = Counter()
+        self.samples = {}
+
+    def add(self, kind: str, sample=None, n: int = 1) -> None:
+        self.counts[kind] += n
+        if sample is not None:
+            samples = self.samples.setdefault(kind, [])
+            if len(samples) < self.max_samples:
+                samples.append(sample)
+
+    def merge(self, other: "Report") -> None:
+        self.counts.update(other.counts)
+        for kind, samples in other.samples.items():
+            mine = self.samples.setdefault(kind, [])
+            mine.extend(samples[:self.max_samples - len(mine)])
+
+
+def _check_id(token: bytes):
+    """
+    The id as an int, or the problem kind if it is not a canonical unsigned decimal that fits 32 bits
+    """
+    if not token.isdigit() or (len(token) > 1 and token[:1] == b"0"):
+        return "invalid_id"
+    value = int(token)
+    return value if value <= MAX_ID else "id_out_of_range"
+
+
+def _read_lines(f, start: int, end: int, chunk_bytes: int):
+    """
+    Yield (offset, [lines]) chunks of about `chunk_bytes` from the byte range [start, end)
+    of a binary file, `start` and `end` being at line boundaries
+    """
+    f.seek(start)
+    pos = start
+    while pos < end:
+        lines = f.readlines(min(chunk_bytes, end - pos))
+        if not lines:
+            break
+        size = sum(map(len, lines))
+        # readlines() may run one line past the hint, i.e. into the next range
+        while pos + size > end:
+            size -= len(lines.pop())
+        yield pos, lines
+        pos += size
+        f.seek(pos)
+
+
+def _line_ranges(path: str, start: int, parts: int) -> list:
+    """
+    Split [start, size) into up to `parts` byte ranges that begin at line starts
+    """
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, "rb") as f:
+        for k in range(1, parts):
+            f.seek(max(bounds[-1], start + (size - start) * k // parts))
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _header(path: str, expected: bytes, report: Report) -> int:
+    """
+    Check the header line, returns the offset of the first data row
+    """
+    with open(path, "rb") as f:
+        line = f.readline()
+    if line.rstrip(b"\r\n") != expected:
+        report.add("bad_header", {"file": os.path.basename(path), "header": line[:80].decode("utf-8", "replace")})
+    return len(line)
+
+
+def scan_nodes(path: str, report: Report, chunk_bytes: int = 8 << 20, flag_ids=()) -> np.ndarray:
+    """
+    Validate nodes.csv and return its distinct valid ids as a sorted uint64 array
+    """
+    start = _header(path, NODES_HEADER, report)
+    flagged = {str(i).encode() for i in flag_ids}
+    ids = []
+    with open(path, "rb") as f:
+        for offset, lines in _read_lines(f, start, os.path.getsize(path), chunk_bytes):
+            chunk = np.empty(len(lines), dtype=np.uint64)
+            n = 0
+            for line in lines:
+                row = line.rstrip(b"\r\n")
+                fields = row.split(b",")
+                if len(fields) != 2:
+                    # Graph.add_node strips commas, so an extra field is a comma left in a name
+                    report.add("comma_in_name" if len(fields) > 2 else "malformed_row",
+                               {"offset": offset, "row": row[:200].decode("utf-8", "replace")})
+                    offset += len(line)
+                    continue
+                value = _check_id(fields[0])
+                if type(value) is str:
+                    report.add(value, {"offset": offset, "id": fields[0][:40].decode("utf-8", "replace")})
+                else:
+                    chunk[n] = value
+                    n += 1
+                    if not fields[1]:
+                        report.add("empty_name", {"offset": offset, "id": value})
+                    if fields[0] in flagged:
+                        report.add("flagged_id", {"offset": offset, "id": value})
+                offset += len(line)
+            ids.append(chunk[:n])
+
+    ids = np.sort(np.concatenate(ids)) if ids else np.zeros(0, dtype=np.uint64)
+    repeated = ids[1:] == ids[:-1]
+    if repeated.any():
+        dupes = np.unique(ids[1:][repeated])
+        report.add("duplicate_node", n=int(repeated.sum()))
+        for value in dupes[:report.max_samples]:
+            report.add("duplicate_node", {"id": int(value)}, n=0)
+        ids = np.unique(ids)
+    return ids
+
+
+def _parse_edges(lines: list, offset: int, report: Report) -> tuple:
+    """
+    Parse a chunk of edge rows into (source, target) uint64 arrays. Clean chunks are converted in
+    bulk by NumPy; a chunk with any irregular row falls back to row by row checks.
+    """
+    buf = b"".join(lines)
+    flat = buf.replace(b"\r\n", b"\n")
+    if not flat.endswith(b"\n"):
+        flat += b"\n"
+    raw = np.frombuffer(flat, dtype=np.uint8)
+    seps = raw[(raw == ord(",")) | (raw == ord("\n"))]
+    # exactly one comma per row: separators alternate ',' '\n' and everything else is a digit
+    shaped = len(seps) % 2 == 0 and (seps[0::2] == ord(",")).all() and (seps[1::2] == ord("\n")).all()
+    if shaped and flat.replace(b"\n", b"").replace(b",", b"").isdigit():
+        tokens = np.array(flat[:-1].replace(b"\n", b",").split(b","))
+        # digits only; now reject empty tokens, leading zeros and ids longer than a uint64
+        first = tokens.view(np.uint8).reshape(len(tokens), -1)[:, 0]
+        if tokens.itemsize <= 19 and not ((first == 0) | (first == ord("0")) & (np.char.str_len(tokens) > 1)).any():
+            values = tokens.astype(np.uint64)
+            if not (values > MAX_ID).any():
+                return values[0::2], values[1::2]
+
+    src, dst = [], []
+    for line in lines:
+        row = line.rstrip(b"\r\n")
+        fields = row.split(b",")
+        if len(fields) != 2:
+            report.add("malformed_row", {"offset": offset, "row": row[:200].decode("utf-8", "replace")})
+        else:
+            a, b = _check_id(fields[0]), _check_id(fields[1])
+            bad = a if type(a) is str else b if type(b) is str else None
+            if bad:
+                report.add(bad, {"offset": offset, "row": row[:200].decode("utf-8", "replace")})
+            else:
+                src.append(a)
+                dst.append(b)
+        offset += len(line)
+    return np.array(src, dtype=np.uint64), np.array(dst, dtype=np.uint64)
+
+
+def _partition_of(keys: np.ndarray, bits: int) -> np.ndarray:
+    if not bits:
+        return np.zeros(len(keys), dtype=np.int64)
+    # Fibonacci hashing spreads the (low << 32 | high) keys evenly over 2**bits partitions
+    return ((keys * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def scan_edges(path: str, start: int, end: int, node_ids: np.ndarray, spill: str, bits: int, tag: str,
+               chunk_bytes: int = 8 << 20, max_samples: int = 10) -> tuple:
+    """
+    Validate the edge rows in [start, end): row format, id types, self-loops and dangling endpoints.
+    The packed key of every valid edge is appended to partition file `{spill}/{partition}.{tag}`
+    for the duplicate pass (or returned in memory when `spill` is None).
+    Returns (report, bool array of which node ids are touched, edge rows seen, keys or None).
+    """
+    report = Report(max_samples)
+    touched = np.zeros(len(node_ids), dtype=bool)
+    rows = 0
+    kept = []
+    files = {}
+    try:
+        with open(path, "rb") as f:
+            for offset, lines in _read_lines(f, start, end, chunk_bytes):
+                rows += len(lines)
+                src, dst = _parse_edges(lines, offset, report)
+
+                loops = src == dst
+                if loops.any():
+                    report.add("self_loop", n=int(loops.sum()))
+                    for a in src[loops][:max_samples]:
+                        report.add("self_loop", {"source": int(a), "target": int(a)}, n=0)
+
+                ends = np.concatenate([src, dst])
+                pos = np.searchsorted(node_ids, ends)
+                found = pos < len(node_ids)
+                found[found] = node_ids[pos[found]] == ends[found]
+                touched[pos[found]] = True
+                missing = ~(found[:len(src)] & found[len(src):])
+                if missing.any():
+                    report.add("dangling_edge", n=int(missing.sum()))
+                    for a, b in zip(src[missing][:max_samples], dst[missing][:max_samples]):
+                        report.add("dangling_edge", {"source": int(a), "target": int(b)}, n=0)
+
+                keep = ~loops
+                lo = np.minimum(src[keep], dst[keep])
+                hi = np.maximum(src[keep], dst[keep])
+                keys = lo << np.uint64(32) | hi
+                if spill is None:
+                    kept.append(keys)
+                    continue
+                part = _partition_of(keys, bits)
+                order = np.argsort(part, kind="stable")
+                keys, part = keys[order], part[order]
+                cuts = np.flatnonzero(np.diff(part)) + 1
+                for block in np.split(keys, cuts):
+                    if len(block):
+                        p = int(_partition_of(block[:1], bits)[0])
+                        fh = files.get(p)
+                        if fh is None:
+                            fh = files[p] = open(os.path.join(spill, f"{p}.{tag}"), "ab")
+                        block.tofile(fh)
+    finally:
+        for fh in files.values():
+            fh.close()
+    keys = np.concatenate(kept) if kept else None
+    return report, touched, rows, keys
+
+
+def count_duplicates(keys: np.ndarray, max_samples: int = 10) -> tuple:
+    """
+    (number of repeated keys, up to max_samples repeated keys) in one in-memory batch of keys
+    """
+    keys = np.sort(keys)
+    repeated = keys[1:] == keys[:-1]
+    return int(repeated.sum()), [int(k) for k in np.unique(keys[1:][repeated])[:max_samples]]
+
+
+def _duplicates_in_partition(spill: str, p: int, max_samples: int) -> tuple:
+    parts = [np.fromfile(os.path.join(spill, name), dtype=np.uint64)
+             for name in os.listdir(spill) if name.split(".", 1)[0] == str(p)]
+    return count_duplicates(np.concatenate(parts), max_samples) if parts else (0, [])
+
+
+def validate(nodes_path: str = "nodes.csv", edges_path: str = "edges.csv", jobs: int = 1,
+             chunk_bytes: int = 8 << 20, partition_bytes: int = 256 << 20, spill_dir: str = None,
+             max_samples: int = 10, flag_ids=()) -> dict:
+    """
+    Validate a nodes.csv / edges.csv pair in bounded memory and return a JSON-serializable report.
+
+    Edge rows are streamed in chunks of `chunk_bytes` and checked in bulk with NumPy. Every valid
+    edge becomes one packed 64-bit key (low id << 32 | high id). When the keys would exceed
+    `partition_bytes` they are hash-partitioned to files under `spill_dir` and each partition is
+    sorted on its own to find duplicates, so memory is bounded by the node ids plus one partition.
+    With `jobs` > 1 the edge file is split into line-aligned byte ranges scanned by worker processes,
+    and partitions are deduplicated in parallel too.
+    """
+    t0 = time.perf_counter()
+    report = Report(max_samples)
+    node_ids = scan_nodes(nodes_path, report, chunk_bytes, flag_ids)
+    start = _header(edges_path, EDGES_HEADER, report)
+
+    # about 14 bytes per edge row in practice, i.e. one 8-byte key per row
+    est_keys = max(1, (os.path.getsize(edges_path) - start) // 14)
+    partitions = -(-est_keys * 8 // partition_bytes)
+    bits = max(0, (partitions - 1).bit_length()) if partitions > 1 else 0
+    spill = tempfile.mkdtemp(prefix="validate-", dir=spill_dir) if bits else None
+
+    try:
+        ranges = _line_ranges(edges_path, start, max(1, jobs))
+        args = [(edges_path, a, b, node_ids, spill, bits, str(i), chunk_bytes, max_samples)
+                for i, (a, b) in enumerate(ranges)]
+        pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        try:
+            scans = pool.map(scan_edges, *zip(*args)) if pool else [scan_edges(*a) for a in args]
+            touched = np.zeros(len(node_ids), dtype=bool)
+            edge_rows = 0
+            kept = []
+            for part_report, part_touched, rows, keys in scans:
+                report.merge(part_report)
+                touched |= part_touched
+                edge_rows += rows
+                if keys is not None:
+                    kept.append(keys)
+
+            if spill is None:
+                dup_results = [count_duplicates(np.concatenate(kept), max_samples)] if kept else []
+            elif pool:
+                dup_results = pool.map(_duplicates_in_partition, [spill] * (1 << bits), range(1 << bits),
+                                       [max_samples] * (1 << bits))
+            else:
+                dup_results = [_duplicates_in_partition(spill, p, max_samples) for p in range(1 << bits)]
+            for n, samples in dup_results:
+                if n:
+                    report.add("duplicate_edge", n=n)
+                for k in samples:
+                    report.add("duplicate_edge", {"source": k >> 32, "target": k & MAX_ID}, n=0)
+        finally:
+            if pool:
+                pool.shutdown()
+    finally:
+        if spill:
+            shutil.rmtree(spill, ignore_errors=True)
+
+    orphans = np.flatnonzero(~touched)
+    if len(orphans):
+        report.add("orphan_node", n=len(orphans))
+        for i in orphans[:max_samples]:
+            report.add("orphan_node", {"id": int(node_ids[i])}, n=0)
+
+    elapsed = time.perf_counter() - t0
+    errors = {k: report.counts[k] for k in ERRORS if report.counts[k]}
+    warnings = {k: report.counts[k] for k in WARNINGS if report.counts[k]}
+    return {
+        "ok": not errors,
+        "nodes": int(len(node_ids)),
+        "edge_rows": edge_rows,
+        "errors": errors,
+        "warnings": warnings,
+        "samples": report.samples,
+        "jobs": jobs,
+        "partitions": 1 << bits if bits else 1,
+        "elapsed_s": round(elapsed, 3),
+        "edge_rows_per_s": round(edge_rows / elapsed) if elapsed else None,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Validate nodes.csv / edges.csv and print a JSON report.")
+    parser.add_argument("--nodes", default="nodes.csv")
+    parser.add_argument("--edges", default="edges.csv")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes for the edge scan")
+    parser.add_argument("--chunk-mb", type=int, default=8, help="edge rows read per chunk, MiB")
+    parser.add_argument("--partition-mb", type=int, default=256,
+                        help="spill edge keys to disk partitions of about this size, MiB")
+    parser.add_argument("--spill-dir", default=None, help="where partitions are written, default the temp dir")
+    parser.add_argument("--samples", type=int, default=10, help="examples kept per problem kind")
+    parser.add_argument("--flag-id", action="append", default=[], help="warn if this node id is present")
+    args = parser.parse_args(argv)
+
+    report = validate(args.nodes, args.edges, args.jobs, args.chunk_mb << 20, args.partition_mb << 20,
+                      args.spill_dir, args.samples, args.flag_id)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
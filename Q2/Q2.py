@@ -6,6 +6,9 @@ import csv
 from typing import Any
 #################################################################################
 
+# the loaders fill the derived columns (incidents.year / month, outcomes.prison_days) in the same insert
+from derived import insert_sql
+
 ## Change to False to disable Sample
 SHOW = False
 
@@ -77,7 +80,9 @@ def part_1_a_i() -> str:
     CREATE TABLE IF NOT EXISTS incidents (
         report_id TEXT PRIMARY KEY,
         category  TEXT NOT NULL,
-        date      TEXT
+        date      TEXT,
+        year      INTEGER,
+        month     INTEGER
     );
     """
     ######################################################################
@@ -110,6 +115,7 @@ def part_1_a_iii() -> str:
         num_ppl_arrested  INTEGER,
         prison_time       REAL,
         prison_time_unit  TEXT,
+        prison_days       REAL,
         FOREIGN KEY (report_id) REFERENCES incidents(report_id)
     );
     """
@@ -121,10 +127,7 @@ def part_1_b_i(connection: Connection, path: str) -> None:
     with open(path, newline='', encoding='utf-8') as f:
         r = csv.DictReader(f)
         rows = [(row["report_id"], row["category"], row["date"]) for row in r]
-    connection.executemany(
-        "INSERT INTO incidents(report_id, category, date) VALUES (?,?,?)",
-        rows
-    )
+    connection.executemany(insert_sql("incidents", ("report_id", "category", "date")), rows)
     connection.commit()
 
 
@@ -139,14 +142,17 @@ def part_1_b_ii(connection: Connection, path: str) -> None:
     connection.commit()
 
 
-def part_1_b_iii(connection: Connection, path: str) -> None:
-        def to_int(x):
-            x = x.strip() if isinstance(x, str) else x
-            return int(x) if x not in (None, "",) else None
-        def to_float(x):
-            x = x.strip() if isinstance(x, str) else x
-            return float(x) if x not in (None, "",) else None
+def to_int(x):
+    x = x.strip() if isinstance(x, str) else x
+    return int(x) if x not in (None, "",) else None
 
+
+def to_float(x):
+    x = x.strip() if isinstance(x, str) else x
+    return float(x) if x not in (None, "",) else None
+
+
+def part_1_b_iii(connection: Connection, path: str) -> None:
         with open(path, newline='', encoding='utf-8') as f:
             r = csv.DictReader(f)
             rows = []
@@ -161,9 +167,8 @@ def part_1_b_iii(connection: Connection, path: str) -> None:
                     row["prison_time_unit"]
                 ))
         connection.executemany(
-            """INSERT INTO outcomes
-            (report_id, outcome, num_ppl_fined, fine, num_ppl_arrested, prison_time, prison_time_unit)
-            VALUES (?,?,?,?,?,?,?)""",
+            insert_sql("outcomes", ("report_id", "outcome", "num_ppl_fined", "fine", "num_ppl_arrested",
+                                    "prison_time", "prison_time_unit")),
             rows
         )
         connection.commit()
@@ -226,17 +231,11 @@ def part_5() -> str:
 
 
 def part_6() -> str:
+    # prison_days is the prison time in days, filled at ingest (derived.DERIVED_COLUMNS)
     query = """
         SELECT i.category,
             COUNT(*) AS count,
-            ROUND(AVG(
-                CASE
-                WHEN LOWER(o.prison_time_unit) LIKE 'year%'  THEN COALESCE(o.prison_time,0) * 365.0
-                WHEN LOWER(o.prison_time_unit) LIKE 'month%' THEN COALESCE(o.prison_time,0) * 30.0
-                WHEN LOWER(o.prison_time_unit) LIKE 'week%'  THEN COALESCE(o.prison_time,0) * 7.0
-                ELSE COALESCE(o.prison_time,0)
-                END
-            ), 2) AS avg_prison_time_days
+            ROUND(AVG(o.prison_days), 2) AS avg_prison_time_days
         FROM incidents i
         INNER JOIN outcomes o USING (report_id)
         GROUP BY i.category
@@ -251,6 +250,7 @@ def part_7_a() -> str:
     CREATE VIEW IF NOT EXISTS fines AS
     SELECT i.report_id,
            i.date,
+           i.year,
            o.num_ppl_fined,
            o.fine
     FROM incidents i
@@ -262,8 +262,9 @@ def part_7_a() -> str:
 
 
 def part_7_b() -> str:
+    # year is the derived incidents.year; as text, like strftime('%Y', date)
     query = """
-    SELECT strftime('%Y', date) AS year,
+    SELECT CAST(year AS TEXT)   AS year,
            SUM(num_ppl_fined)   AS total_ppl_fined,
            ROUND(SUM(fine), 2)  AS total_fine_amount
     FROM fines
@@ -275,18 +276,19 @@ def part_7_b() -> str:
 
 
 def part_8_a() -> str:
+    # external content: the text stays in details, the index reads it back by rowid (see search.py,
+    # which keeps it in step with details); the prefix indexes serve search-as-you-type
     query = """
     CREATE VIRTUAL TABLE IF NOT EXISTS incident_overviews
-    USING fts5(report_id, subject);
+    USING fts5(report_id, subject, content='details', content_rowid='rowid', prefix='2 3 4');
     """
     return query
 
 
 def part_8_b() -> str:
+    # index every details row (rowid = details rowid)
     query = """
-    INSERT INTO incident_overviews (report_id, subject)
-    SELECT report_id, subject
-    FROM details;
+    INSERT INTO incident_overviews (incident_overviews) VALUES ('rebuild');
     """
     return query
 
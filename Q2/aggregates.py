@@ -0,0 +1,304 @@
+import argparse
+import json
+import math
+import time
+from sqlite3 import Connection
+
+import Q2
+from derived import DERIVED_COLUMNS, current_sql, ensure_derived
+from Q2 import create_connection
+
+# Summary tables kept in step with the base tables by triggers. Each one groups `source` (filtered by
+# `where`) by `key`; `measures` are aggregate expressions whose per-group values can be added and
+# subtracted, `n` (the row count) is always there. `tables` maps every base table of `source` to its
+# alias and the columns whose updates can change a contribution. Year and prison days are the derived
+# columns (derived.DERIVED_COLUMNS); see trigger_sql for how a writer that leaves them stale is handled.
+AGGREGATES = {
+    # part_7_b: the fines view by year
+    "agg_fines_yearly": {
+        "key": ("year", "CAST(i.year AS TEXT)"),
+        "measures": {"ppl_fined": "SUM(o.num_ppl_fined)", "fine_sum": "TOTAL(o.fine)", "fine_n": "COUNT(o.fine)"},
+        "source": "incidents i INNER JOIN outcomes o ON o.report_id = i.report_id",
+        "where": "o.num_ppl_fined >= 1",
+        "tables": {"incidents": ("i", ("report_id", "date", "year")),
+                   "outcomes": ("o", ("report_id", "num_ppl_fined", "fine"))},
+    },
+    # part_6: prison time per category
+    "agg_category_prison": {
+        "key": ("category", "i.category"),
+        "measures": {"prison_days": "TOTAL(o.prison_days)"},
+        "source": "incidents i INNER JOIN outcomes o ON o.report_id = i.report_id",
+        "where": None,
+        "tables": {"incidents": ("i", ("report_id", "category")),
+                   "outcomes": ("o", ("report_id", "prison_time", "prison_time_unit", "prison_days"))},
+    },
+    # part_5: arrests per detection method
+    "agg_detection_arrests": {
+        "key": ("detection", "d.detection"),
+        "measures": {"ppl_arrested": "SUM(o.num_ppl_arrested)"},
+        "source": "details d INNER JOIN outcomes o ON o.report_id = d.report_id",
+        "where": "o.num_ppl_arrested > 0",
+        "tables": {"details": ("d", ("report_id", "detection")),
+                   "outcomes": ("o", ("report_id", "num_ppl_arrested"))},
+    },
+}
+
+
+def _columns(spec: dict) -> list:
+    return ["n"] + list(spec["measures"])
+
+
+def _grouped(spec: dict, extra_where: str = None) -> str:
+    """
+    SELECT of (k, n, measures...) per key over the rows of the source that pass `extra_where`
+    """
+    key_expr = spec["key"][1]
+    measures = ", ".join(f"{expr} AS {name}" for name, expr in spec["measures"].items())
+    where = [w for w in (spec["where"], extra_where) if w]
+    return (f"SELECT {key_expr} AS k, COUNT(*) AS n, {measures} FROM {spec['source']}"
+            f"{' WHERE ' + ' AND '.join(where) if where else ''} GROUP BY 1")
+
+
+def create_table_sql(name: str) -> str:
+    spec = AGGREGATES[name]
+    key = spec["key"][0]
+    integer = ("n", "ppl_fined", "fine_n", "ppl_arrested")
+    cols = ", ".join(f"{c} {'INTEGER' if c in integer else 'REAL'} NOT NULL DEFAULT 0" for c in _columns(spec))
+    # the key may be NULL (a date strftime can't parse, a missing detection), so it is UNIQUE, not a primary key,
+    # and the triggers match it with IS
+    return f"CREATE TABLE IF NOT EXISTS {name} ({key} TEXT UNIQUE, {cols});"
+
+
+def _add_sql(name: str, contrib: str) -> list:
+    spec = AGGREGATES[name]
+    key = spec["key"][0]
+    sets = ", ".join(f"{c} = {name}.{c} + c.{c}" for c in _columns(spec))
+    return [f"INSERT INTO {name}({key}) SELECT c.k FROM ({contrib}) AS c "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {name} WHERE {name}.{key} IS c.k);",
+            f"UPDATE {name} SET {sets} FROM ({contrib}) AS c WHERE {name}.{key} IS c.k;"]
+
+
+def _subtract_sql(name: str, contrib: str) -> list:
+    spec = AGGREGATES[name]
+    key = spec["key"][0]
+    sets = ", ".join(f"{c} = {name}.{c} - c.{c}" for c in _columns(spec))
+    return [f"UPDATE {name} SET {sets} FROM ({contrib}) AS c WHERE {name}.{key} IS c.k;",
+            f"DELETE FROM {name} WHERE n = 0;"]
+
+
+def trigger_sql(name: str) -> list:
+    """
+    CREATE TRIGGER statements that keep aggregate `name` current.
+
+    A base row's contribution is the grouped source restricted to that row (a primary key join, so
+    at most one row). It is subtracted BEFORE a delete or update, while the old row is still in its
+    table, and added AFTER an insert or update. Updates only fire for the columns the aggregate reads,
+    and do nothing unless one of them really changes.
+
+    A row counts only while the derived columns the aggregate reads are current. A writer that leaves
+    them stale (an INSERT without year, an UPDATE of date alone) is skipped, and the derived guard
+    trigger's UPDATE then adds the row; this holds whichever of the two triggers SQLite runs first.
+    """
+    spec = AGGREGATES[name]
+    statements = []
+    for table, (alias, columns) in spec["tables"].items():
+        old = _grouped(spec, f"{alias}.rowid = OLD.rowid")
+        new = _grouped(spec, f"{alias}.rowid = NEW.rowid")
+        of = ", ".join(columns)
+        derived = [c for c, _, _ in DERIVED_COLUMNS.get(table, ()) if c in columns]
+        old_current = [current_sql(table, "OLD", derived)] if derived else []
+        new_current = [current_sql(table, "NEW", derived)] if derived else []
+        changed = [" OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)]
+        for suffix, timing, event, when, body in (
+                ("ai", "AFTER", "INSERT", new_current, _add_sql(name, new)),
+                ("bd", "BEFORE", "DELETE", old_current, _subtract_sql(name, old)),
+                ("bu", "BEFORE", f"UPDATE OF {of}", changed + old_current, _subtract_sql(name, old)),
+                ("au", "AFTER", f"UPDATE OF {of}", changed + new_current, _add_sql(name, new))):
+            condition = f" WHEN {' AND '.join(f'({w})' for w in when)}" if when else ""
+            body = "\n        ".join(body)
+            statements.append(f"CREATE TRIGGER IF NOT EXISTS {name}_{table}_{suffix} {timing} {event} ON {table}"
+                              f"{condition}\n    BEGIN\n        {body}\n    END;")
+    return statements
+
+
+def apply_rows(connection: Connection, table: str, report_ids: str, subtract: bool = False, names=None) -> None:
+    """
+    Add (or `subtract`) the contributions of the `table` rows whose report_id is IN `report_ids` (a
+    subquery) to the aggregates that read `table`, one grouped statement each instead of a trigger run
+    per row. For a batch writer that suspended the triggers: subtract before it changes or deletes the
+    rows, add after it wrote them.
+    """
+    for name in names or AGGREGATES:
+        spec = AGGREGATES[name]
+        if table not in spec["tables"]:
+            continue
+        contrib = _grouped(spec, f"{spec['tables'][table][0]}.report_id IN ({report_ids})")
+        for sql in (_subtract_sql if subtract else _add_sql)(name, contrib):
+            connection.execute(sql)
+
+
+def trigger_names(connection: Connection, names=None) -> list:
+    names = list(names or AGGREGATES)
+    return [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' ORDER BY name") if row[0].rsplit("_", 2)[0] in names]
+
+
+def rebuild_aggregates(connection: Connection, names=None) -> dict:
+    """
+    Recompute aggregate tables from scratch in one transaction; returns {name: groups}
+    """
+    groups = {}
+    with connection:
+        for name in names or AGGREGATES:
+            spec = AGGREGATES[name]
+            cols = ", ".join(_columns(spec))
+            connection.execute(f"DELETE FROM {name};")
+            connection.execute(f"INSERT INTO {name}({spec['key'][0]}, {cols}) {_grouped(spec)};")
+            groups[name] = connection.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    return groups
+
+
+def create_aggregates(connection: Connection, names=None, rebuild: bool = True) -> dict:
+    """
+    Create the summary tables and their triggers, then fill them from the current base tables.
+    For a bulk load it is cheaper to drop_triggers() first and call this again afterwards.
+    """
+    names = list(names or AGGREGATES)
+    # the aggregates read the derived columns, kept current by the derived guard triggers
+    ensure_derived(connection)
+    with connection:
+        for name in names:
+            connection.execute(create_table_sql(name))
+            for sql in trigger_sql(name):
+                connection.execute(sql)
+    return rebuild_aggregates(connection, names) if rebuild else {}
+
+
+def drop_triggers(connection: Connection, names=None) -> None:
+    """
+    Stop maintaining the aggregates (their tables stay, and go stale until the next rebuild)
+    """
+    with connection:
+        for trigger in trigger_names(connection, names):
+            connection.execute(f"DROP TRIGGER IF EXISTS {trigger};")
+
+
+def drop_aggregates(connection: Connection, names=None) -> None:
+    drop_triggers(connection, names)
+    with connection:
+        for name in names or AGGREGATES:
+            connection.execute(f"DROP TABLE IF EXISTS {name};")
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        return a is not None and b is not None and math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
+def verify_aggregates(connection: Connection, names=None) -> dict:
+    """
+    Compare every aggregate table with a fresh GROUP BY over the base tables.
+    Returns {name: [problem, ...]}, empty lists when they agree (floats up to rounding).
+    """
+    problems = {}
+    for name in names or AGGREGATES:
+        spec = AGGREGATES[name]
+        cols = ", ".join(_columns(spec))
+        stored = {row[0]: row[1:] for row in connection.execute(f"SELECT {spec['key'][0]}, {cols} FROM {name}")}
+        fresh = {row[0]: row[1:] for row in connection.execute(_grouped(spec))}
+        found = []
+        for k in sorted(set(stored) | set(fresh), key=lambda k: (k is not None, k)):
+            if k not in stored:
+                found.append(f"missing group {k!r}")
+            elif k not in fresh:
+                found.append(f"extra group {k!r}")
+            elif not all(_same(a, b) for a, b in zip(stored[k], fresh[k])):
+                found.append(f"group {k!r}: stored {list(stored[k])}, expected {list(fresh[k])}")
+        problems[name] = found
+    return problems
+
+
+def part_5_materialized() -> str:
+    query = """
+    SELECT detection,
+           n AS count,
+           ROUND(ppl_arrested * 1.0 / n, 2) AS avg_ppl_arrested
+    FROM agg_detection_arrests
+    WHERE n >= 100
+    ORDER BY avg_ppl_arrested DESC, detection ASC
+    LIMIT 3;
+    """
+    return query
+
+
+def part_6_materialized() -> str:
+    query = """
+    SELECT category,
+           n AS count,
+           ROUND(prison_days / n, 2) AS avg_prison_time_days
+    FROM agg_category_prison
+    WHERE n > 50
+    ORDER BY avg_prison_time_days DESC, category ASC;
+    """
+    return query
+
+
+def part_7_b_materialized() -> str:
+    query = """
+    SELECT year,
+           ppl_fined AS total_ppl_fined,
+           CASE WHEN fine_n > 0 THEN ROUND(fine_sum, 2) END AS total_fine_amount
+    FROM agg_fines_yearly
+    ORDER BY total_fine_amount DESC, year ASC
+    LIMIT 3;
+    """
+    return query
+
+
+# report -> (query over the base tables, same report from the summary tables)
+MATERIALIZED = {
+    "part_5": (Q2.part_5, part_5_materialized),
+    "part_6": (Q2.part_6, part_6_materialized),
+    "part_7_b": (Q2.part_7_b, part_7_b_materialized),
+}
+
+
+def _best_ms(connection: Connection, sql: str, repeat: int) -> tuple:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = connection.execute(sql).fetchall()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, round(best * 1000, 3)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain and check the materialized Q2 summary tables.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the tables from the base tables")
+    parser.add_argument("--drop", action="store_true", help="drop the tables and triggers and exit")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per report")
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    if args.drop:
+        drop_aggregates(conn)
+        conn.close()
+        return
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if args.rebuild or not set(AGGREGATES) <= existing:
+        create_aggregates(conn)
+    result = {"problems": verify_aggregates(conn), "reports": {}}
+    conn.execute(Q2.part_7_a())
+    for report, (base, materialized) in MATERIALIZED.items():
+        base_rows, base_ms = _best_ms(conn, base(), args.repeat)
+        rows, ms = _best_ms(conn, materialized(), args.repeat)
+        result["reports"][report] = {"rows": rows, "same": rows == base_rows, "base_ms": base_ms, "materialized_ms": ms}
+    conn.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregates import create_aggregates
+from delta_ingest import delta_ingest
+from ingest import LOAD_ORDER, bulk_ingest
+from parallel_ingest import parallel_ingest
+from Q2 import (create_connection, part_1_a_i, part_1_a_ii, part_1_a_iii, part_1_b_i, part_1_b_ii, part_1_b_iii,
+                part_2_a, part_2_b, part_2_c)
+from search import create_search_index
+
+
+def scale_csv(src: str, dst: str, times: int) -> int:
+    """
+    Write `times` copies of the rows of `src` to `dst`, copy k > 0 with report_id suffixed '-k'
+    so primary keys stay unique; returns the number of data rows written
+    """
+    with open(src, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    header, body = rows[0], rows[1:]
+    key = header.index("report_id")
+    with open(dst, "w", newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for k in range(times):
+            if k == 0:
+                w.writerows(body)
+                continue
+            suffix = f"-{k}"
+            for row in body:
+                row = list(row)
+                row[key] += suffix
+                w.writerow(row)
+    return len(body) * times
+
+
+def scaled_data(data_dir: str, out_dir: str, times: int) -> dict:
+    """
+    {table: path} of the Q2 csv files scaled `times` over into out_dir
+    """
+    paths = {}
+    for table in LOAD_ORDER:
+        paths[table] = os.path.join(out_dir, f"{table}.csv")
+        scale_csv(os.path.join(data_dir, f"{table}.csv"), paths[table], times)
+    return paths
+
+
+def fresh_db(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = create_connection(path)
+    for query in (part_1_a_i(), part_1_a_ii(), part_1_a_iii()):
+        conn.execute(query)
+    conn.commit()
+    return conn
+
+
+def load_serial(conn, paths: dict) -> dict:
+    """
+    The part_1_b_* loaders one after another, then the part 2 indexes
+    """
+    t0 = time.perf_counter()
+    part_1_b_i(conn, paths["incidents"])
+    part_1_b_ii(conn, paths["details"])
+    part_1_b_iii(conn, paths["outcomes"])
+    load_s = time.perf_counter() - t0
+    t = time.perf_counter()
+    for query in (part_2_a(), part_2_b(), part_2_c()):
+        conn.execute(query)
+    conn.commit()
+    return {"load_s": round(load_s, 4), "index_s": round(time.perf_counter() - t, 4)}
+
+
+def _run_loader(loader: str, paths: dict, db: str, batch_size: int, workers: int = None) -> dict:
+    """
+    Load `paths` into a fresh `db` with one loader; runs in its own process, so the rusage figures
+    belong to this load alone
+    """
+    conn = fresh_db(db)
+    t0 = time.perf_counter()
+    if loader == "serial":
+        stats = load_serial(conn, paths)
+    elif loader == "bulk":
+        stats = bulk_ingest(conn, paths, batch_size)
+    else:
+        stats = parallel_ingest(conn, paths, workers, batch_size)
+    wall = time.perf_counter() - t0
+    rows = sum(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in LOAD_ORDER)
+    conn.close()
+    return {
+        "rows": rows,
+        "wall_s": round(wall, 4),
+        "load_s": stats["load_s"],
+        "index_s": stats["index_s"],
+        "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        # the largest parser process of a parallel load (0 for the others)
+        "workers_maxrss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def bench(args) -> list:
+    results = []
+    # a fresh interpreter per load: ru_maxrss is a high-water mark that never drops within a process
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=args.tmp) as tmp:
+        for times in args.scales:
+            paths = scaled_data(args.data, tmp, times)
+            db = os.path.join(tmp, "bench.db")
+            loaders = [("serial", "serial", None), ("bulk", "bulk", None)]
+            loaders += [(f"parallel_{w}", "parallel", w) for w in args.workers]
+            for name, loader, workers in loaders:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    run = pool.submit(_run_loader, loader, paths, db, args.batch_size, workers).result()
+                result = {
+                    "loader": name,
+                    "scale": times,
+                    "rows": run["rows"],
+                    "wall_s": run["wall_s"],
+                    "rows_per_s": round(run["rows"] / run["wall_s"]) if run["wall_s"] else None,
+                    "load_s": run["load_s"],
+                    "index_s": run["index_s"],
+                    "maxrss_kb": run["maxrss_kb"],
+                    "workers_maxrss_kb": run["workers_maxrss_kb"],
+                }
+                print(json.dumps(result), flush=True)
+                results.append(result)
+    return results
+
+
+def changed_extract(paths: dict, out_dir: str, pct: float, seed: int = 0) -> tuple:
+    """
+    Write a day's extract of the csv files at `paths`: `pct` percent of the reports with their
+    subject, fine and date edited. Returns ({table: full extract path}, {table: changed rows only path}).
+    """
+    rng = random.Random(seed)
+    full, delta = {}, {}
+    changed = None
+    for table in LOAD_ORDER:
+        with open(paths[table], newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        header, body = rows[0], rows[1:]
+        key = header.index("report_id")
+        if changed is None:
+            changed = {row[key] for row in rng.sample(body, int(len(body) * pct / 100))}
+        edit = {"incidents": "date", "details": "subject", "outcomes": "fine"}[table]
+        col = header.index(edit)
+        edited = []
+        for row in body:
+            if row[key] in changed:
+                if edit == "date":
+                    row[col] = "2023-01-01"
+                elif edit == "subject":
+                    row[col] += " (amended)"
+                else:
+                    row[col] = str(float(row[col] or 0) + 1)
+                edited.append(row)
+        full[table] = os.path.join(out_dir, f"{table}.full.csv")
+        delta[table] = os.path.join(out_dir, f"{table}.delta.csv")
+        for path, out in ((full[table], body), (delta[table], edited)):
+            with open(path, "w", newline='', encoding='utf-8') as f:
+                w = csv.writer(f)
+                w.writerow(header)
+                w.writerows(out)
+    return full, delta
+
+
+def reload_all(conn, paths: dict) -> None:
+    """
+    What a daily drop-and-reload does: load, index, full text index, aggregates
+    """
+    bulk_ingest(conn, paths)
+    create_search_index(conn)
+    create_aggregates(conn)
+
+
+def bench_delta(args) -> list:
+    """
+    Full reload vs delta_ingest of a full extract and of a changed-rows-only extract with
+    args.delta percent of the reports changed.
+
+    At --delta 1 (scales 5 and 10) the changed-rows extract costs about 0.11x a reload, not 0.01x: a
+    reload appends in key order with the indexes built once, while each changed row is a random-access
+    upsert plus its row_hashes and change_log rows, and the run has fixed costs (the index merge step,
+    suspending the triggers, the commit) of about 0.15 s. A full extract also reads and hashes every
+    row in Python, so it stays above half a reload whatever the change.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.tmp) as tmp:
+        for times in args.scales:
+            paths = scaled_data(args.data, tmp, times)
+            full, delta = changed_extract(paths, tmp, args.delta)
+            db = os.path.join(tmp, "bench.db")
+            conn = fresh_db(db)
+            t0 = time.perf_counter()
+            reload_all(conn, paths)
+            reload_s = time.perf_counter() - t0
+            delta_ingest(conn, paths)          # first run seeds row_hashes
+            conn.close()
+            for name, extract in (("full_extract", full), ("delta_extract", delta)):
+                # each extract is merged into its own copy of the reloaded database
+                copy = os.path.join(tmp, f"{name}.db")
+                with create_connection(db) as src, create_connection(copy) as dst:
+                    src.backup(dst)
+                conn = create_connection(copy)
+                t0 = time.perf_counter()
+                stats = delta_ingest(conn, extract)
+                wall = time.perf_counter() - t0
+                conn.close()
+                result = {
+                    "loader": name,
+                    "scale": times,
+                    "changed_pct": args.delta,
+                    "changed": stats["changed"],
+                    "wall_s": round(wall, 4),
+                    "reload_s": round(reload_s, 4),
+                    "vs_reload": round(wall / reload_s, 4),
+                }
+                print(json.dumps(result), flush=True)
+                results.append(result)
+    return results
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serial loaders vs bulk vs parallel-parse ingest of the Q2 csv files.")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--scales", type=_int_list, default=[1, 10, 50], help="comma separated copies of the data")
+    parser.add_argument("--workers", type=_int_list, default=[2, 4], help="comma separated parser process counts")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--delta", type=float, default=None,
+                        help="instead, time delta_ingest of extracts with this percent of reports changed")
+    parser.add_argument("--tmp", default=None, help="directory for the scaled csv files and database")
+    parser.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    args = parser.parse_args(argv)
+
+    results = bench(args) if args.delta is None else bench_delta(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
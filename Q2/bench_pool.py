@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from bench_queries import build_database
+from db_pool import REPORTS, DatabasePool, enable_wal, report_sql
+from Q2 import create_connection, execute_query_and_get_result
+
+
+def per_call(path: str):
+    """
+    The unpooled pattern: a fresh connection for every query
+    """
+    def run(name):
+        conn = create_connection(path)
+        try:
+            return execute_query_and_get_result(conn, report_sql(name))
+        finally:
+            conn.close()
+    return run, lambda: {}
+
+
+def pooled(path: str, threads: int):
+    pool = DatabasePool(path, maxsize=threads)
+
+    def finish():
+        stats = pool.stats()
+        pool.close()
+        return stats
+    return pool.report, finish
+
+
+def run_threads(run, threads: int, rounds: int) -> tuple:
+    """
+    Every thread runs all REPORTS `rounds` times; returns (wall seconds, queries run)
+    """
+    barrier = threading.Barrier(threads + 1)
+    errors = []
+
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(rounds):
+                for name in REPORTS:
+                    run(name)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - t0
+    if errors:
+        raise errors[0]
+    return wall, threads * rounds * len(REPORTS)
+
+
+def bench(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.tmp) as tmp:
+        path = os.path.join(tmp, "pool.db")
+        build_database(path, args.data, args.scale).close()
+        # both modes read the same WAL file, so the difference is the connection handling
+        enable_wal(path)
+        for threads in args.threads:
+            for mode in ("per_call", "pooled"):
+                run, finish = per_call(path) if mode == "per_call" else pooled(path, threads)
+                wall, queries = run_threads(run, threads, args.rounds)
+                result = {
+                    "mode": mode,
+                    "threads": threads,
+                    "scale": args.scale,
+                    "queries": queries,
+                    "wall_s": round(wall, 4),
+                    "queries_per_s": round(queries / wall, 1) if wall else None,
+                    "pool": finish(),
+                }
+                print(json.dumps(result), flush=True)
+                results.append(result)
+    return results
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Report query throughput: a connection per query vs DatabasePool.")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--scale", type=int, default=50000, help="generated incidents in the database")
+    parser.add_argument("--threads", type=_int_list, default=[1, 2, 4, 8], help="comma separated thread counts")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over all reports per thread")
+    parser.add_argument("--tmp", default=None, help="directory for the database")
+    parser.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    args = parser.parse_args(argv)
+
+    results = bench(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from itertools import islice
+
+import Q2
+import derived
+from derived import insert_sql
+from ingest import INGEST_PRAGMAS, LOAD_ORDER, TABLES, apply_pragmas, iter_rows
+
+# the analytical queries, in the order __main__ runs them
+QUERIES = ("part_3", "part_4", "part_5", "part_6", "part_7_b", "part_8_c")
+
+# what each plan must look like: indexes it has to use and tables (or aliases) it must not scan
+# without an index. A bare "SCAN x" step is a full table scan.
+EXPECTED_PLANS = {
+    "part_3": {"uses": ["idx_incidents_category_date"], "no_full_scan": ["incidents"]},
+    "part_4": {"uses": ["idx_details_detection_mode"], "no_full_scan": ["details"]},
+    "part_5": {"uses": ["idx_details_detection_mode", "sqlite_autoindex_outcomes_1"], "no_full_scan": ["d", "o"]},
+    "part_6": {"uses": ["sqlite_autoindex_outcomes_1"], "no_full_scan": ["o"]},
+    # outcomes is reached by primary key, or by idx_outcomes_fined once derived.py created it
+    "part_7_b": {"uses": [], "no_full_scan": ["o"]},
+    "part_8_c": {"uses": ["VIRTUAL TABLE INDEX"], "no_full_scan": []},
+    # with --derived: index-only scans on the derived column indexes
+    "part_6_sargable": {"uses": ["COVERING INDEX idx_incidents_category_report",
+                                 "COVERING INDEX idx_outcomes_report_prison"], "no_full_scan": ["i", "o"]},
+    "part_7_b_sargable": {"uses": ["COVERING INDEX idx_outcomes_fined",
+                                   "COVERING INDEX idx_incidents_report_year"], "no_full_scan": ["i", "o"]},
+}
+
+# the derived.py variants, run with --derived
+DERIVED_QUERIES = ("part_6_sargable", "part_7_b_sargable")
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def generate_rows(data_dir: str, rows: int, seed: int = 0) -> dict:
+    """
+    {table: row iterator} of a synthetic dataset with `rows` incidents. Each generated report resamples
+    one real report (incident, details and outcome together, so the value distributions and their
+    correlations are kept) under a new report_id, 'GEN000000001', ...
+    """
+    source = {t: list(iter_rows(os.path.join(data_dir, f"{t}.csv"), *TABLES[t])) for t in LOAD_ORDER}
+    by_id = {t: {r[0]: r for r in source[t]} for t in LOAD_ORDER}
+    rng = random.Random(seed)
+    reports = list(by_id["incidents"])
+    picks = [rng.choice(reports) for _ in range(rows)]
+
+    def rows_of(lookup):
+        for n, rid in enumerate(picks, 1):
+            row = lookup.get(rid)
+            if row is not None:
+                yield (f"GEN{n:09d}",) + row[1:]
+
+    return {t: rows_of(by_id[t]) for t in LOAD_ORDER}
+
+
+def build_database(path: str, data_dir: str, rows: int, seed: int = 0, analyze: bool = False,
+                   batch_size: int = 50000):
+    """
+    Create a Q2 database with `rows` generated incidents and everything __main__ builds on top:
+    the part 2 indexes, the fines view and the incident_overviews FTS table
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    conn = Q2.create_connection(path)
+    for query in (Q2.part_1_a_i(), Q2.part_1_a_ii(), Q2.part_1_a_iii()):
+        conn.execute(query)
+    previous = apply_pragmas(conn, INGEST_PRAGMAS)
+    with conn:
+        for table, it in generate_rows(data_dir, rows, seed).items():
+            columns = TABLES[table][0]
+            sql = insert_sql(table, columns)
+            while True:
+                batch = list(islice(it, batch_size))
+                if not batch:
+                    break
+                conn.executemany(sql, batch)
+    apply_pragmas(conn, previous)
+    for query in (Q2.part_2_a(), Q2.part_2_b(), Q2.part_2_c(), Q2.part_7_a(), Q2.part_8_a(), Q2.part_8_b()):
+        Q2.execute_query(conn, query)
+    if analyze:
+        conn.execute("ANALYZE;")
+    conn.commit()
+    return conn
+
+
+def query_plan(conn, sql: str) -> list:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def check_plan(plan: list, expected: dict) -> list:
+    """
+    Problems of a plan against its expectation: missing index uses and unexpected full scans
+    """
+    problems = []
+    text = "\n".join(plan)
+    for index in expected.get("uses", []):
+        if index not in text:
+            problems.append(f"does not use {index}")
+    for step in plan:
+        m = _FULL_SCAN.match(step)
+        if m and m.group(1) in expected.get("no_full_scan", []):
+            problems.append(f"full scan of {m.group(1)}")
+    return problems
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def time_query(conn, sql: str, repeat: int = 20, warmup: int = 2) -> dict:
+    for _ in range(warmup):
+        conn.execute(sql).fetchall()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = conn.execute(sql).fetchall()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "rows": len(result),
+        "p50_ms": round(_percentile(times, 50) * 1000, 3),
+        "p95_ms": round(_percentile(times, 95) * 1000, 3),
+        "p99_ms": round(_percentile(times, 99) * 1000, 3),
+        "mean_ms": round(sum(times) / len(times) * 1000, 3),
+    }
+
+
+def run(conn, scale: int, repeat: int, baseline: dict = None, with_derived: bool = False) -> list:
+    """
+    Time and explain every query; flags plans that break EXPECTED_PLANS or differ from `baseline`
+    """
+    results = []
+    names = QUERIES + (DERIVED_QUERIES if with_derived else ())
+    for name in names:
+        sql = getattr(derived if name in DERIVED_QUERIES else Q2, name)()
+        plan = query_plan(conn, sql)
+        problems = check_plan(plan, EXPECTED_PLANS.get(name, {}))
+        if baseline is not None and name in baseline and baseline[name] != plan:
+            problems.append("plan differs from baseline")
+        result = {"query": name, "scale": scale, "plan": plan, "regressions": problems}
+        result.update(time_query(conn, sql, repeat))
+        results.append(result)
+    return results
+
+
+def _int_list(value: str) -> list:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Time the Q2 queries on generated data and check their query plans.")
+    parser.add_argument("--data", default="data", help="the csv files generated rows are resampled from")
+    parser.add_argument("--scales", type=_int_list, default=[15000, 150000, 1500000],
+                        help="comma separated numbers of generated incidents")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--analyze", action="store_true", help="run ANALYZE before planning")
+    parser.add_argument("--derived", action="store_true",
+                        help="add the derived columns and indexes and also run the sargable variants")
+    parser.add_argument("--db-dir", default=None, help="where the generated databases go, default a temp dir")
+    parser.add_argument("--baseline", default=None, help="JSON {query: plan} to compare plans with")
+    parser.add_argument("--update-baseline", action="store_true", help="write the plans of the first scale to --baseline")
+    parser.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.db_dir) as tmp:
+        for scale in args.scales:
+            conn = build_database(os.path.join(tmp, f"q2_{scale}.db"), args.data, scale, args.seed, args.analyze)
+            if args.derived:
+                derived.add_derived_columns(conn)
+            for result in run(conn, scale, args.repeat, baseline, args.derived):
+                print(json.dumps(result), flush=True)
+                results.append(result)
+            conn.close()
+
+    if args.update_baseline and args.baseline and results:
+        first = results[0]["scale"]
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({r["query"]: r["plan"] for r in results if r["scale"] == first}, f, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    regressed = [r for r in results if r["regressions"]]
+    for r in regressed:
+        print(f"PLAN REGRESSION {r['query']} at scale {r['scale']}: {'; '.join(r['regressions'])}", file=sys.stderr)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from bench_queries import build_database
+from search import autocomplete, create_search_index, merge, optimize, search, to_match
+
+# (label, search() keyword arguments)
+QUERIES = (
+    ("common", {"text": "seized"}),
+    ("two_terms", {"text": "ivory tusks"}),
+    ("rare", {"text": "sandalwood"}),
+    ("phrase", {"text": '"dead pangolin"', "raw": True}),
+    ("prefix", {"text": "pang", "prefix": True}),
+    ("prefix_short", {"text": "ti", "prefix": True}),
+)
+
+
+def _ms(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {"p50_ms": round(times[len(times) // 2] * 1000, 3),
+            "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 3)}
+
+
+def page_by_offset(conn, text: str, limit: int, page: int) -> list:
+    """
+    The OFFSET way to reach a page, for comparison with keyset pagination
+    """
+    return conn.execute("SELECT rowid FROM incident_overviews WHERE incident_overviews MATCH ? ORDER BY rank, rowid "
+                        "LIMIT ? OFFSET ?",
+                        (text, limit, limit * page)).fetchall()
+
+
+def churn(conn, fraction: float, seed: int = 0) -> int:
+    """
+    Edit `fraction` of the subjects one transaction at a time, as trickling updates would, which
+    leaves the index in many small segments
+    """
+    rng = random.Random(seed)
+    n = conn.execute("SELECT MAX(rowid) FROM details").fetchone()[0]
+    edits = int(n * fraction)
+    for rowid in rng.sample(range(1, n + 1), edits):
+        with conn:
+            conn.execute("UPDATE details SET subject = subject || ' (amended)' WHERE rowid = ?", (rowid,))
+    return edits
+
+
+def measure(conn, scale: int, state: str, repeat: int, limit: int, page: int) -> list:
+    results = []
+    for label, kwargs in QUERIES:
+        match = kwargs["text"] if kwargs.get("raw") else to_match(kwargs["text"], kwargs.get("prefix", False))
+        hits = conn.execute("SELECT COUNT(*) FROM incident_overviews WHERE incident_overviews MATCH ?", (match,)).fetchone()[0]
+        result = {"scale": scale, "index": state, "query": label, "hits": hits}
+        result.update(_ms(lambda: search(conn, limit=limit, **kwargs), repeat))
+        results.append(result)
+    # reaching page `page` of a common term: keyset (one query from the cursor) vs OFFSET
+    after = None
+    for _ in range(page):
+        after = search(conn, "seized", limit=limit, after=after)["next"]
+    keyset = _ms(lambda: search(conn, "seized", limit=limit, after=after), repeat)
+    offset = _ms(lambda: page_by_offset(conn, to_match("seized"), limit, page), repeat)
+    results.append({"scale": scale, "index": state, "query": f"page_{page}_keyset", **keyset})
+    results.append({"scale": scale, "index": state, "query": f"page_{page}_offset", **offset})
+    results.append({"scale": scale, "index": state, "query": "autocomplete",
+                    **_ms(lambda: autocomplete(conn, "pa"), repeat)})
+    return results
+
+
+def bench(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.tmp) as tmp:
+        for scale in args.scales:
+            conn = build_database(os.path.join(tmp, f"search_{scale}.db"), args.data, scale)
+            t0 = time.perf_counter()
+            create_search_index(conn)
+            build_s = round(time.perf_counter() - t0, 4)
+            states = [("rebuilt", None)]
+            if args.churn:
+                states += [("churned", lambda: churn(conn, args.churn)), ("merged", lambda: merge(conn)),
+                           ("optimized", lambda: optimize(conn))]
+            for state, prepare in states:
+                step_s = None
+                if prepare is not None:
+                    t0 = time.perf_counter()
+                    prepare()
+                    step_s = round(time.perf_counter() - t0, 4)
+                for result in measure(conn, scale, state, args.repeat, args.limit, args.page):
+                    result["build_s" if state == "rebuilt" else "step_s"] = build_s if state == "rebuilt" else step_s
+                    print(json.dumps(result), flush=True)
+                    results.append(result)
+            conn.close()
+    return results
+
+
+def _int_list(value: str) -> list:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="incident_overviews search latency as the corpus grows.")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--scales", type=_int_list, default=[15000, 150000, 600000],
+                        help="comma separated numbers of generated incidents")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20, help="results per page")
+    parser.add_argument("--page", type=int, default=20, help="page reached by keyset vs OFFSET")
+    parser.add_argument("--churn", type=float, default=0.02,
+                        help="fraction of subjects edited one by one before re-measuring, 0 to skip")
+    parser.add_argument("--tmp", default=None, help="directory for the databases")
+    parser.add_argument("--out", default=None, help="also write the results as a JSON list to this file")
+    args = parser.parse_args(argv)
+
+    results = bench(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
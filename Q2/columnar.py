@@ -0,0 +1,390 @@
+import argparse
+import json
+import math
+import os
+import time
+from sqlite3 import Connection, OperationalError
+
+import numpy as np
+
+import Q2
+from derived import expression
+from Q2 import create_connection
+
+# On-disk columnar copy of incidents, details and outcomes, one .npy file per column, opened with
+# mmap_mode='r' so only the pages an aggregation touches are read:
+#
+#   manifest.json             row counts, column kinds and the fingerprint of the database exported
+#   report_id.dict.npy        every report_id of the three tables, sorted (shared, so it doubles as the join key)
+#   {table}.{column}.npy      int32 codes for strings, float64 (NaN = NULL) or int32 for numbers
+#   {table}.{column}.dict.npy sorted distinct values of a string column; code c is dict[c - 1], code 0 is NULL
+#
+# Sorted dictionaries keep codes in SQLite's text order (NULL first, then by code point, as BINARY
+# collation compares UTF-8), so ranges, ORDER BY and GROUP BY work on the codes alone. The join
+# columns outcomes.incident_row / outcomes.details_row hold the row of the same report_id in the
+# other table (-1 if there is none), a precomputed primary key join.
+MANIFEST = "manifest.json"
+VERSION = 1
+
+
+# table -> [(column, kind, SELECT expression)]; year and prison_days are computed like the derived
+# columns, so the export works on databases that predate them
+COLUMNS = {
+    "incidents": [
+        ("report_id", "key", "report_id"),
+        ("category", "str", "category"),
+        ("date", "str", "date"),
+        ("year", "int", expression("incidents", "year")),
+    ],
+    "details": [
+        ("report_id", "key", "report_id"),
+        ("transport_mode", "str", "transport_mode"),
+        ("detection", "str", "detection"),
+    ],
+    "outcomes": [
+        ("report_id", "key", "report_id"),
+        ("num_ppl_fined", "float", "num_ppl_fined"),
+        ("fine", "float", "fine"),
+        ("num_ppl_arrested", "float", "num_ppl_arrested"),
+        ("prison_days", "float", expression("outcomes", "prison_days")),
+    ],
+}
+
+# joined table -> column of outcomes holding its row
+JOINS = {"incidents": "incident_row", "details": "details_row"}
+
+_NULL_INT = -1
+
+
+# one counter per exported table, bumped by triggers on every row written, so a cache can tell it is
+# stale after in-place updates too (row counts and rowids don't move for those)
+CHANGE_COUNTERS = "CREATE TABLE IF NOT EXISTS columnar_changes (tbl TEXT PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0);"
+
+
+def counter_trigger_sql(table: str) -> list:
+    return [f"CREATE TRIGGER IF NOT EXISTS columnar_changes_{table}_{suffix} AFTER {event} ON {table}\n"
+            f"    BEGIN\n        UPDATE columnar_changes SET n = n + 1 WHERE tbl = '{table}';\n    END;"
+            for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))]
+
+
+def prepare_counters(connection: Connection) -> None:
+    """
+    Create columnar_changes and its triggers on the exported tables if they are missing
+    """
+    with connection:
+        connection.execute(CHANGE_COUNTERS)
+        for table in COLUMNS:
+            connection.execute("INSERT OR IGNORE INTO columnar_changes(tbl) VALUES (?)", (table,))
+            for sql in counter_trigger_sql(table):
+                connection.execute(sql)
+
+
+def fingerprint(connection: Connection) -> dict:
+    """
+    Signature of the exported tables: schema version, each table's row count and largest rowid, and
+    its columnar_changes counter (None where the counters aren't set up, which never matches a cache).
+    Dropping or recreating a table or a counter trigger changes the schema version.
+    """
+    tables = {t: list(connection.execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM {t}").fetchone())
+              for t in COLUMNS}
+    try:
+        changes = dict(connection.execute("SELECT tbl, n FROM columnar_changes").fetchall())
+    except OperationalError:
+        changes = {}
+    for t in COLUMNS:
+        tables[t].append(changes.get(t))
+    return {"schema_version": connection.execute("PRAGMA schema_version").fetchone()[0], "tables": tables}
+
+
+def _encode(values: list) -> tuple:
+    """
+    (codes, sorted dictionary) of a string column, code 0 for NULL
+    """
+    present = [v for v in values if v is not None]
+    dictionary = np.unique(np.array(present, dtype=str)) if present else np.array([], dtype=str)
+    codes = np.zeros(len(values), dtype=np.int32)
+    if present:
+        mask = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+        codes[mask] = np.searchsorted(dictionary, np.array(present, dtype=str)) + 1
+    return codes, dictionary
+
+
+def _numbers(values: list, kind: str) -> np.ndarray:
+    if kind == "int":
+        return np.fromiter((_NULL_INT if v is None else v for v in values), dtype=np.int32, count=len(values))
+    return np.fromiter((math.nan if v is None else v for v in values), dtype=np.float64, count=len(values))
+
+
+def export_columnar(connection: Connection, directory: str) -> dict:
+    """
+    Write the three tables to `directory` as a columnar cache, replacing any cache already there.
+    The change counters are set up first, then the columns are read in rowid order inside one read
+    transaction. Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        # a cache without its manifest is never opened, so a crash below can't leave a mixed one
+        os.remove(manifest_path)
+
+    def save(name, array):
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    t0 = time.perf_counter()
+    prepare_counters(connection)
+    # one snapshot for the fingerprint and every table, unless the caller already holds a transaction
+    own = not connection.in_transaction
+    if own:
+        connection.execute("BEGIN")
+    try:
+        source = fingerprint(connection)
+        columns = {t: list(zip(*connection.execute(
+            f"SELECT {', '.join(expr for _, _, expr in spec)} FROM {t} ORDER BY rowid").fetchall()))
+                   for t, spec in COLUMNS.items()}
+    finally:
+        if own:
+            connection.execute("ROLLBACK")
+
+    keys = {t: list(columns[t][0]) if columns[t] else [] for t in COLUMNS}
+    report_ids = np.unique(np.array([rid for ids in keys.values() for rid in ids], dtype=str))
+    save("report_id.dict", report_ids)
+    positions = {}
+    manifest = {"version": VERSION, "source": source, "tables": {}}
+    for table, spec in COLUMNS.items():
+        n = len(keys[table])
+        kinds = {}
+        for i, (name, kind, _) in enumerate(spec):
+            values = list(columns[table][i]) if n else []
+            if kind == "key":
+                codes = np.searchsorted(report_ids, np.array(values, dtype=str)).astype(np.int32)
+                # report_id -> row of this table, for the join columns
+                positions[table] = np.full(len(report_ids), -1, dtype=np.int32)
+                positions[table][codes] = np.arange(n, dtype=np.int32)
+                save(f"{table}.{name}", codes)
+            elif kind == "str":
+                codes, dictionary = _encode(values)
+                save(f"{table}.{name}", codes)
+                save(f"{table}.{name}.dict", dictionary)
+            else:
+                save(f"{table}.{name}", _numbers(values, kind))
+            kinds[name] = kind
+        manifest["tables"][table] = {"rows": n, "columns": kinds}
+
+    outcome_ids = np.load(os.path.join(directory, "outcomes.report_id.npy"))
+    for table, name in JOINS.items():
+        save(f"outcomes.{name}", positions[table][outcome_ids])
+        manifest["tables"]["outcomes"]["columns"][name] = "join"
+    manifest["seconds"] = round(time.perf_counter() - t0, 4)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ColumnarCache:
+    """
+    Read-only view of an exported cache; columns are memory-mapped on first use and kept
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != VERSION:
+            raise ValueError(f"{directory} is not a version {VERSION} columnar cache")
+        self._arrays = {}
+        self._strings = {}
+
+    def rows(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"]
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        key = f"{table}.{name}"
+        if key not in self._arrays:
+            if name not in self.manifest["tables"][table]["columns"]:
+                raise KeyError(key)
+            self._arrays[key] = np.load(os.path.join(self.directory, f"{key}.npy"), mmap_mode="r")
+        return self._arrays[key]
+
+    def dictionary(self, table: str, name: str) -> np.ndarray:
+        key = f"{table}.{name}.dict"
+        if key not in self._arrays:
+            self._arrays[key] = np.load(os.path.join(self.directory, f"{key}.npy"), mmap_mode="r")
+        return self._arrays[key]
+
+    def strings(self, table: str, name: str) -> list:
+        """
+        The values of a string column's codes as a list, [None] + dictionary, decoded once
+        """
+        key = f"{table}.{name}"
+        if key not in self._strings:
+            self._strings[key] = [None] + self.dictionary(table, name).tolist()
+        return self._strings[key]
+
+    def code_range(self, table: str, name: str, low: str, high: str) -> tuple:
+        """
+        [start, stop) of the codes whose values lie BETWEEN `low` AND `high`
+        """
+        dictionary = self.dictionary(table, name)
+        return (int(np.searchsorted(dictionary, low, "left")) + 1,
+                int(np.searchsorted(dictionary, high, "right")) + 1)
+
+    def is_current(self, connection: Connection) -> bool:
+        """
+        True while the database is as exported: no row inserted, updated or deleted since, no schema change
+        """
+        return self.manifest["source"] == fingerprint(connection)
+
+
+def _round(value, digits: int = 2):
+    return None if value is None else round(float(value), digits)
+
+
+def _desc_nulls_last(value) -> tuple:
+    # SQLite sorts NULL first, so after every value in a DESC order
+    return (value is None, -value if value is not None else 0)
+
+
+def part_3_columnar(cache: ColumnarCache) -> list:
+    dates = cache.column("incidents", "date")
+    if not len(dates):
+        return [(None,)]
+    start, stop = cache.code_range("incidents", "date", "2018-01-01", "2020-12-31")
+    hits = np.count_nonzero((dates >= start) & (dates < stop))
+    return [(_round(100.0 * hits / len(dates)),)]
+
+
+def part_4_columnar(cache: ColumnarCache) -> list:
+    modes = cache.strings("details", "transport_mode")
+    detection = cache.strings("details", "detection")
+    if "Intelligence" not in detection:
+        return []
+    # the per-value conditions are evaluated on the dictionary, not per row (TRIM strips spaces only)
+    usable = np.array([m is not None and m.strip(" ") != "" for m in modes], dtype=bool)
+    codes = np.asarray(cache.column("details", "transport_mode"))
+    rows = codes[(np.asarray(cache.column("details", "detection")) == detection.index("Intelligence"))
+                 & usable[codes]]
+    counts = np.bincount(rows, minlength=len(modes))
+    # codes follow the text order, so (count DESC, code ASC) is (count DESC, transport_mode ASC)
+    top = [int(c) for c in np.lexsort((np.arange(len(modes)), -counts)) if counts[c]][:3]
+    return [(modes[c], int(counts[c])) for c in top]
+
+
+def part_5_columnar(cache: ColumnarCache) -> list:
+    arrested = np.asarray(cache.column("outcomes", "num_ppl_arrested"))
+    details_row = np.asarray(cache.column("outcomes", "details_row"))
+    keep = (arrested > 0) & (details_row >= 0)
+    detections = cache.strings("details", "detection")
+    group = np.asarray(cache.column("details", "detection"))[details_row[keep]]
+    counts = np.bincount(group, minlength=len(detections))
+    sums = np.bincount(group, weights=arrested[keep], minlength=len(detections))
+    found = [(detections[g], int(counts[g]), _round(sums[g] / counts[g])) for g in np.flatnonzero(counts >= 100)]
+    # code order puts the NULL detection first, as ORDER BY ... ASC does
+    return sorted(found, key=lambda r: _desc_nulls_last(r[2]))[:3]
+
+
+def part_6_columnar(cache: ColumnarCache) -> list:
+    incident_row = np.asarray(cache.column("outcomes", "incident_row"))
+    keep = incident_row >= 0
+    categories = cache.strings("incidents", "category")
+    group = np.asarray(cache.column("incidents", "category"))[incident_row[keep]]
+    counts = np.bincount(group, minlength=len(categories))
+    days = np.bincount(group, weights=np.asarray(cache.column("outcomes", "prison_days"))[keep],
+                       minlength=len(categories))
+    found = [(categories[g], int(counts[g]), _round(days[g] / counts[g])) for g in np.flatnonzero(counts > 50)]
+    return sorted(found, key=lambda r: _desc_nulls_last(r[2]))
+
+
+def part_7_b_columnar(cache: ColumnarCache) -> list:
+    fined = np.asarray(cache.column("outcomes", "num_ppl_fined"))
+    incident_row = np.asarray(cache.column("outcomes", "incident_row"))
+    keep = (fined >= 1) & (incident_row >= 0)
+    years = np.asarray(cache.column("incidents", "year"))[incident_row[keep]]
+    fine = np.asarray(cache.column("outcomes", "fine"))[keep]
+    fined = fined[keep]
+    found = []
+    for year in np.unique(years):
+        mask = years == year
+        fines = fine[mask][~np.isnan(fine[mask])]
+        # SUM over no values (all fines NULL) is NULL
+        total = _round(fines.sum()) if len(fines) else None
+        found.append((None if year == _NULL_INT else f"{int(year):04d}", int(fined[mask].sum()), total))
+    # np.unique gives the years ascending with NULL (-1) first, the tie order of year ASC
+    return sorted(found, key=lambda r: _desc_nulls_last(r[2]))[:3]
+
+
+# report -> (query over the base tables, same report from the columnar cache)
+COLUMNAR = {
+    "part_3": (Q2.part_3, part_3_columnar),
+    "part_4": (Q2.part_4, part_4_columnar),
+    "part_5": (Q2.part_5, part_5_columnar),
+    "part_6": (Q2.part_6, part_6_columnar),
+    "part_7_b": (Q2.part_7_b, part_7_b_columnar),
+}
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        # both sides are ROUND(x, 2) of sums taken in a different order, so allow one unit of the last place
+        return a is not None and b is not None and math.isclose(a, b, rel_tol=1e-9, abs_tol=0.0100001)
+    return a == b
+
+
+def verify_columnar(connection: Connection, cache: ColumnarCache, names=None) -> dict:
+    """
+    Run every report both ways; returns {report: [problem, ...]}, empty lists when they agree
+    """
+    connection.execute(Q2.part_7_a())
+    problems = {}
+    for name in names or COLUMNAR:
+        base, columnar = COLUMNAR[name]
+        expected = [tuple(row) for row in connection.execute(base()).fetchall()]
+        got = columnar(cache)
+        found = []
+        if len(got) != len(expected):
+            found.append(f"{len(got)} rows, expected {len(expected)}")
+        for i, (row, want) in enumerate(zip(got, expected)):
+            if len(row) != len(want) or not all(_same(a, b) for a, b in zip(row, want)):
+                found.append(f"row {i}: {list(row)}, expected {list(want)}")
+        problems[name] = found
+    return problems
+
+
+def _best_ms(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 3)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Export the Q2 tables to a columnar cache and run the reports on it.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--cache", default="Q2.columnar", help="cache directory")
+    parser.add_argument("--export", action="store_true", help="(re)export even if the cache looks current")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per report")
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    result = {}
+    if args.export or not os.path.exists(os.path.join(args.cache, MANIFEST)) \
+            or not ColumnarCache(args.cache).is_current(conn):
+        manifest = export_columnar(conn, args.cache)
+        result["exported"] = {"rows": {t: m["rows"] for t, m in manifest["tables"].items()},
+                              "seconds": manifest["seconds"]}
+    cache = ColumnarCache(args.cache)
+    result["problems"] = verify_columnar(conn, cache)
+    result["reports"] = {}
+    for report, (base, columnar) in COLUMNAR.items():
+        result["reports"][report] = {
+            "sql_ms": _best_ms(lambda: conn.execute(base()).fetchall(), args.repeat),
+            "columnar_ms": _best_ms(lambda: columnar(cache), args.repeat),
+        }
+    conn.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
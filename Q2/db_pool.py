@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from urllib.parse import quote
+
+import Q2
+
+# the read-only report queries, in the order __main__ runs them
+REPORTS = ("part_3", "part_4", "part_5", "part_6", "part_7_b", "part_8_c")
+
+# per read connection; mmap and a bigger page cache help the repeated scans of the reports
+READER_PRAGMAS = {
+    "query_only": 1,
+    "cache_size": -65536,              # KiB, i.e. 64 MiB per connection
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",            # the GROUP BY / ORDER BY b-trees
+}
+
+
+def enable_wal(path: str) -> str:
+    """
+    Switch the database file to WAL journaling (persistent, so this is needed once per file), which
+    lets readers run alongside each other and alongside a writer. Returns the resulting journal mode.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA journal_mode=WAL;").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@lru_cache(maxsize=None)
+def report_sql(name: str) -> str:
+    """
+    The SQL of a part_* report, built once so every call hands sqlite3 the identical string and hits
+    the connection's prepared statement cache
+    """
+    return getattr(Q2, name)()
+
+
+class DatabasePool:
+    """
+    Thread-safe pool of read-only SQLite connections to one database file, plus one writer.
+
+    Readers are opened with a `mode=ro` URI in autocommit mode, so a SELECT never opens a transaction
+    and never commits; each keeps its own cache of `cached_statements` prepared statements, which
+    survives between checkouts. A connection is used by one thread at a time and goes back to the
+    pool afterwards. Writes are serialized on the single writer connection.
+    """
+
+    def __init__(self, path: str, maxsize: int = 8, cached_statements: int = 256, timeout: float = 30.0,
+                 pragmas: dict = READER_PRAGMAS, wal: bool = True):
+        self.path = os.path.abspath(path)
+        self.maxsize = maxsize
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.journal_mode = enable_wal(self.path) if wal else None
+        self._uri = f"file:{quote(self.path)}?mode=ro"
+        self._idle = []                # idle read connections, most recently used last
+        self._lock = threading.Lock()
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self.created = 0               # read connections opened
+        self.reused = 0                # checkouts served by an already open connection
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self._uri, uri=True, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        for name, value in (self.pragmas or {}).items():
+            conn.execute(f"PRAGMA {name}={value};")
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        return self._new_connection()
+
+    def _release(self, conn) -> None:
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def reader(self):
+        """
+        Check out a read-only connection for the duration of the with block
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                # the caller left a transaction open, don't hand that to the next one
+                conn.close()
+            else:
+                self._release(conn)
+
+    def query(self, sql: str, params=()) -> list:
+        """
+        Run a SELECT on a pooled read-only connection and return all rows; nothing is committed
+        """
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def report(self, name: str) -> list:
+        """
+        Rows of a part_* report query
+        """
+        return self.query(report_sql(name))
+
+    def execute(self, sql: str, params=()) -> int:
+        """
+        Run a write statement on the writer connection and commit; returns the changed row count
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                                               cached_statements=self.cached_statements)
+            with self._writer:
+                return self._writer.execute(sql, params).rowcount
+
+    def close(self) -> None:
+        """
+        Close every idle reader and the writer
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def stats(self) -> dict:
+        """
+        Returns a dict with the read connections created, checkouts that reused one and connections
+        currently idle
+        """
+        with self._lock:
+            return {"created": self.created, "reused": self.reused, "idle": len(self._idle),
+                    "journal_mode": self.journal_mode}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the Q2 report queries through a pool of read-only connections.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--reports", default=",".join(REPORTS), help="comma separated part_* names")
+    args = parser.parse_args(argv)
+
+    pool = DatabasePool(args.db)
+    try:
+        for name in [r for r in args.reports.split(",") if r]:
+            print(json.dumps({"report": name, "rows": pool.report(name)}))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from itertools import islice
+from sqlite3 import Connection
+
+from aggregates import apply_rows, trigger_names
+from derived import filled_columns, insert_sql, table_columns
+from ingest import LOAD_ORDER, TABLES, iter_rows
+from Q2 import create_connection, part_1_a_i, part_1_a_ii, part_1_a_iii
+from search import INDEX_TRIGGERS, after_ingest, ensure_search_index, index_rows
+
+# one hash per loaded row, so an extract's unchanged rows are recognised without touching their table
+ROW_HASHES = """
+CREATE TABLE IF NOT EXISTS row_hashes (
+    tbl       TEXT NOT NULL,
+    report_id TEXT NOT NULL,
+    hash      BLOB NOT NULL,
+    PRIMARY KEY (tbl, report_id)
+) WITHOUT ROWID;
+"""
+
+# what every delta run inserted, updated or deleted
+CHANGE_LOG = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq        INTEGER PRIMARY KEY,
+    run        INTEGER NOT NULL,
+    tbl        TEXT NOT NULL,
+    report_id  TEXT NOT NULL,
+    op         TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+    changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# the report_ids of the batch being written, for the grouped aggregate and index upkeep
+DELTA_IDS = "CREATE TEMP TABLE IF NOT EXISTS delta_ids (report_id TEXT PRIMARY KEY);"
+STAGED = "SELECT report_id FROM temp.delta_ids"
+
+# children before parents
+DELETE_ORDER = tuple(reversed(LOAD_ORDER))
+
+_LOOKUP_CHUNK = 500                    # report_ids per IN (...) lookup, well below SQLite's variable limit
+
+
+def row_hash(fields: tuple) -> bytes:
+    """
+    Hash of a row's csv fields as read, so unchanged rows are skipped before any type conversion
+    """
+    return hashlib.blake2b("\x1f".join(fields).encode("utf-8"), digest_size=16).digest()
+
+
+def upsert_sql(table: str, present: list = None) -> str:
+    """
+    INSERT of one row that updates the existing row with the same report_id instead of failing,
+    and leaves it alone (no write, no triggers) when nothing differs
+    """
+    columns = TABLES[table][0]
+    rest = [c for c in columns if c != "report_id"]
+    derived = [name for name, _ in filled_columns(table, columns, present)]
+    sets = ", ".join(f"{c} = excluded.{c}" for c in rest + derived)
+    old = ", ".join(f"{table}.{c}" for c in rest)
+    new = ", ".join(f"excluded.{c}" for c in rest)
+    return (f"{insert_sql(table, columns, present)} "
+            f"ON CONFLICT(report_id) DO UPDATE SET {sets} WHERE ({old}) IS NOT ({new})")
+
+
+def _exists(connection: Connection, name: str) -> bool:
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def _chunks(values: list, size: int = _LOOKUP_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _lookup(connection: Connection, sql: str, keys: list, *params) -> dict:
+    """
+    {report_id: rest of row} for `sql` (ending in 'report_id IN') over `keys`
+    """
+    found = {}
+    for chunk in _chunks(keys):
+        marks = ",".join("?" * len(chunk))
+        for row in connection.execute(f"{sql} ({marks})", params + tuple(chunk)):
+            found[row[0]] = row[1:]
+    return found
+
+
+def _suspend_triggers(connection: Connection) -> dict:
+    """
+    Drop the aggregate and incident_overviews triggers for the run, in its transaction; _maintain does
+    their work once per batch instead of once per row, and _resume_triggers puts them back. Returns the
+    suspended aggregates, whether the index was, and the triggers' SQL.
+    """
+    names = trigger_names(connection) + [name for name in INDEX_TRIGGERS if _exists(connection, name)]
+    sql = [connection.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()[0]
+           for name in names]
+    for name in names:
+        connection.execute(f"DROP TRIGGER {name};")
+    return {"aggregates": sorted({name.rsplit("_", 2)[0] for name in names if name not in INDEX_TRIGGERS}),
+            "search": any(name in INDEX_TRIGGERS for name in names),
+            "sql": sql}
+
+
+def _resume_triggers(connection: Connection, suspended: dict) -> None:
+    for sql in suspended["sql"]:
+        connection.execute(sql)
+
+
+def _maintain(connection: Connection, table: str, report_ids: list, suspended: dict, before: bool) -> None:
+    """
+    The suspended triggers' work for the `table` rows of `report_ids`, as grouped statements: `before` the
+    write their aggregate contributions are subtracted and their documents taken out of the index,
+    after it both are added back from the rows as written
+    """
+    if not report_ids or not (suspended["aggregates"] or (suspended["search"] and table == "details")):
+        return
+    if before:
+        connection.execute(DELTA_IDS)
+        connection.execute("DELETE FROM temp.delta_ids;")
+        connection.executemany("INSERT OR IGNORE INTO temp.delta_ids VALUES (?)", [(rid,) for rid in report_ids])
+    if suspended["aggregates"]:
+        apply_rows(connection, table, STAGED, subtract=before, names=suspended["aggregates"])
+    if suspended["search"] and table == "details":
+        index_rows(connection, STAGED, delete=before)
+
+
+def _apply_batch(connection: Connection, table: str, batch: list, run: int, counts: dict,
+                 suspended: dict) -> None:
+    """
+    Upsert the rows of a batch of csv field tuples that are new or differ from the table
+    """
+    columns, converters = TABLES[table]
+    hashes = {fields[0]: row_hash(fields) for fields in batch}
+    stored = _lookup(connection, "SELECT report_id, hash FROM row_hashes WHERE tbl = ? AND report_id IN",
+                     list(hashes), table)
+    candidates = [fields for fields in batch if stored.get(fields[0], (None,))[0] != hashes[fields[0]]]
+    counts["unchanged"] += len(batch) - len(candidates)
+    if not candidates:
+        return
+    if converters is not None:
+        candidates = [tuple([conv(v) for conv, v in zip(converters, fields)]) for fields in candidates]
+
+    # a stored hash is dropped by any other write to its row, so a row with a different stored hash is
+    # still as this ingest left it and the extract changed it. Only rows without a hash (new, written by
+    # someone else, or a first run over a loaded database) are compared with the table.
+    unknown = [row[0] for row in candidates if row[0] not in stored]
+    current = _lookup(connection, f"SELECT {', '.join(columns)} FROM {table} WHERE report_id IN", unknown)
+    changed, log = [], []
+    for row in candidates:
+        if row[0] in stored:
+            log.append((run, table, row[0], "update"))
+        else:
+            old = current.get(row[0])
+            if old is None:
+                log.append((run, table, row[0], "insert"))
+            elif old != row[1:]:
+                log.append((run, table, row[0], "update"))
+            else:
+                continue
+        changed.append(row)
+    counts["inserted"] += sum(1 for entry in log if entry[3] == "insert")
+    counts["updated"] += sum(1 for entry in log if entry[3] == "update")
+    counts["unchanged"] += len(candidates) - len(changed)
+
+    if changed:
+        ids = [row[0] for row in changed]
+        _maintain(connection, table, ids, suspended, before=True)
+        connection.executemany(upsert_sql(table, table_columns(connection, table)), changed)
+        _maintain(connection, table, ids, suspended, before=False)
+        connection.executemany("INSERT INTO change_log(run, tbl, report_id, op) VALUES (?,?,?,?)", log)
+    connection.executemany(
+        "INSERT INTO row_hashes(tbl, report_id, hash) VALUES (?,?,?) "
+        "ON CONFLICT(tbl, report_id) DO UPDATE SET hash = excluded.hash",
+        [(table, row[0], hashes[row[0]]) for row in candidates])
+
+
+def _delete_missing(connection: Connection, table: str, seen: set, run: int, suspended: dict) -> int:
+    gone = [rid for (rid,) in connection.execute(f"SELECT report_id FROM {table}") if rid not in seen]
+    for chunk in _chunks(gone):
+        marks = ",".join("?" * len(chunk))
+        _maintain(connection, table, chunk, suspended, before=True)
+        # the row_hashes entries go with the rows through their triggers
+        connection.execute(f"DELETE FROM {table} WHERE report_id IN ({marks})", chunk)
+    connection.executemany("INSERT INTO change_log(run, tbl, report_id, op) VALUES (?,?,?,'delete')",
+                           [(run, table, rid) for rid in gone])
+    return len(gone)
+
+
+def hash_trigger_sql(table: str) -> list:
+    """
+    Any other write to a row drops its hash, so a later extract can't mistake the row for unchanged
+    """
+    return [f"CREATE TRIGGER IF NOT EXISTS row_hashes_{table}_{suffix} AFTER {event} ON {table}\n"
+            f"    BEGIN\n        DELETE FROM row_hashes WHERE tbl = '{table}' AND report_id = OLD.report_id;\n    END;"
+            for suffix, event in (("ad", "DELETE"), ("au", "UPDATE"))]
+
+
+def prepare(connection: Connection) -> None:
+    """
+    Create the base tables if needed, plus row_hashes, change_log and the hash triggers
+    """
+    with connection:
+        for sql in (part_1_a_i(), part_1_a_ii(), part_1_a_iii(), ROW_HASHES, CHANGE_LOG):
+            connection.execute(sql)
+        for table in LOAD_ORDER:
+            if not _exists(connection, f"row_hashes_{table}_ad"):
+                # the table is new or was dropped and recreated, whatever hashes it had are stale
+                connection.execute("DELETE FROM row_hashes WHERE tbl = ?", (table,))
+            for sql in hash_trigger_sql(table):
+                connection.execute(sql)
+
+
+def delta_ingest(connection: Connection, paths: dict, batch_size: int = 5000, snapshot: bool = False) -> dict:
+    """
+    Merge {table: csv path} extracts into the existing tables by report_id, in one transaction.
+
+    New report_ids are inserted and rows that differ are updated with an upsert; rows whose hash matches
+    row_hashes are skipped before any table is touched. Only changed rows are written, so the indexes,
+    the aggregates and the incident_overviews documents do work in proportion to the change. The
+    aggregate and index triggers are suspended for the run and their work done per batch with grouped
+    statements (_maintain). Every insert, update and delete lands in change_log under a new run number.
+    With `snapshot`, the extracts are complete and rows missing from them are deleted too. An
+    incident_overviews search index gets its merge / periodic optimize step afterwards (search.after_ingest).
+    Returns per-table counts and timings.
+    """
+    prepare(connection)
+    tables = [t for t in LOAD_ORDER if t in paths]
+    stats = {"tables": {}}
+    t0 = time.perf_counter()
+    with connection:
+        run = connection.execute("SELECT COALESCE(MAX(run), 0) + 1 FROM change_log").fetchone()[0]
+        ensure_search_index(connection)
+        suspended = _suspend_triggers(connection)
+        seen = {}
+        for table in tables:
+            t = time.perf_counter()
+            counts = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+            rows = iter_rows(paths[table], TABLES[table][0])
+            ids = seen[table] = set()
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                counts["rows"] += len(batch)
+                ids.update(row[0] for row in batch)
+                _apply_batch(connection, table, batch, run, counts, suspended)
+            counts["seconds"] = round(time.perf_counter() - t, 4)
+            stats["tables"][table] = counts
+        if snapshot:
+            for table in DELETE_ORDER:
+                if table in seen:
+                    stats["tables"][table]["deleted"] = _delete_missing(connection, table, seen[table], run,
+                                                                        suspended)
+        _resume_triggers(connection, suspended)
+    stats["search_index"] = after_ingest(connection, run) if "details" in tables else None
+    stats.update({
+        "run": run,
+        "changed": sum(c["inserted"] + c["updated"] + c["deleted"] for c in stats["tables"].values()),
+        "seconds": round(time.perf_counter() - t0, 4),
+    })
+    return stats
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Merge Q2 csv extracts into an existing database by report_id.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--data", default="data", help="directory with incidents.csv, details.csv, outcomes.csv")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--snapshot", action="store_true", help="the extracts are complete, delete rows missing from them")
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    paths = {t: os.path.join(args.data, f"{t}.csv") for t in LOAD_ORDER
+             if os.path.exists(os.path.join(args.data, f"{t}.csv"))}
+    stats = delta_ingest(conn, paths, args.batch_size, args.snapshot)
+    conn.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
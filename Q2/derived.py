@@ -0,0 +1,280 @@
+import argparse
+import json
+import re
+import sqlite3
+import time
+from sqlite3 import Connection
+
+# table -> [(column, type, expression over the table's own columns)]. Plain columns, filled by the
+# loaders in the same INSERT (see insert_sql) so the value is computed once per row at ingest. They are
+# not generated columns: SQLite (up to 3.40 at least) treats a query that reads a generated column as
+# reading every column, so no index could cover it.
+DERIVED_COLUMNS = {
+    "incidents": [
+        ("year", "INTEGER", "CAST(strftime('%Y', date) AS INTEGER)"),
+        ("month", "INTEGER", "CAST(strftime('%m', date) AS INTEGER)"),
+    ],
+    "outcomes": [
+        ("prison_days", "REAL", """
+            CASE
+            WHEN LOWER(prison_time_unit) LIKE 'year%'  THEN COALESCE(prison_time,0) * 365.0
+            WHEN LOWER(prison_time_unit) LIKE 'month%' THEN COALESCE(prison_time,0) * 30.0
+            WHEN LOWER(prison_time_unit) LIKE 'week%'  THEN COALESCE(prison_time,0) * 7.0
+            ELSE COALESCE(prison_time,0)
+            END"""),
+    ],
+}
+
+# the columns each table's derived values are computed from
+SOURCES = {"incidents": ("date",), "outcomes": ("prison_time", "prison_time_unit")}
+
+# covering indexes for the sargable report variants below
+DERIVED_INDEXES = {
+    # part_7_b: the fined outcomes are a range of this index, each joined to its incident's year
+    "idx_outcomes_fined": "CREATE INDEX IF NOT EXISTS idx_outcomes_fined ON outcomes(num_ppl_fined, report_id, fine);",
+    "idx_incidents_report_year":
+        "CREATE INDEX IF NOT EXISTS idx_incidents_report_year ON incidents(report_id, year, month);",
+    # part_6: incidents walked in category order, each joined to its prison days
+    "idx_incidents_category_report":
+        "CREATE INDEX IF NOT EXISTS idx_incidents_category_report ON incidents(category, report_id);",
+    "idx_outcomes_report_prison":
+        "CREATE INDEX IF NOT EXISTS idx_outcomes_report_prison ON outcomes(report_id, prison_days);",
+}
+
+
+def bind(table: str, expr: str, refs: dict) -> str:
+    """
+    A derived expression with its source columns replaced by `refs` ({column: sql}), e.g. '?3' or 'NEW.date'
+    """
+    names = "|".join(sorted(SOURCES[table], key=len, reverse=True))
+    return re.sub(rf"\b({names})\b", lambda m: refs[m.group(1)], expr.strip())
+
+
+def expression(table: str, name: str, prefix: str = "") -> str:
+    """
+    The SQL of derived column `name` computed from the source columns, each prefixed with `prefix`
+    (an alias such as 'o.'); the one definition the loaders, reports and aggregates share
+    """
+    expr = next(expr for column, _, expr in DERIVED_COLUMNS[table] if column == name)
+    return bind(table, expr, {c: f"{prefix}{c}" for c in SOURCES[table]})
+
+
+def table_columns(connection: Connection, table: str) -> list:
+    # table_xinfo also lists hidden and generated columns
+    return [row[1] for row in connection.execute(f"PRAGMA table_xinfo({table});")]
+
+
+def filled_columns(table: str, columns: tuple, present: list = None) -> list:
+    """
+    [(name, expr)] of the derived columns an insert of `columns` fills; `present`, the table's actual
+    columns, leaves out derived columns an older table doesn't have
+    """
+    return [(name, expr) for name, _, expr in DERIVED_COLUMNS.get(table, ())
+            if (present is None or name in present) and all(s in columns for s in SOURCES[table])]
+
+
+def insert_sql(table: str, columns: tuple, present: list = None) -> str:
+    """
+    INSERT of `columns` (one ? each, in order) that also fills the table's derived columns from them
+    """
+    refs = {c: f"?{i}" for i, c in enumerate(columns, 1)}
+    derived = filled_columns(table, columns, present)
+    names = list(columns) + [name for name, _ in derived]
+    values = [f"?{i}" for i in range(1, len(columns) + 1)] + [bind(table, expr, refs) for _, expr in derived]
+    return f"INSERT INTO {table}({', '.join(names)}) VALUES ({', '.join(values)})"
+
+
+def current_sql(table: str, ref: str, names=None) -> str:
+    """
+    Condition that row `ref` ('NEW', 'OLD' or an alias) holds the derived values (all, or `names`)
+    its source columns give
+    """
+    refs = {c: f"{ref}.{c}" for c in SOURCES[table]}
+    return " AND ".join(f"{ref}.{name} IS ({bind(table, expr, refs)})"
+                       for name, _, expr in DERIVED_COLUMNS[table] if names is None or name in names)
+
+
+def trigger_sql(table: str) -> list:
+    """
+    Triggers that recompute the derived columns when a writer other than the loaders leaves them
+    stale, including one that writes a derived column itself. The WHEN clause compares first, so
+    rows the loaders filled correctly cost no extra write.
+    """
+    new = {c: f"NEW.{c}" for c in SOURCES[table]}
+    columns = DERIVED_COLUMNS[table]
+    stale = f"NOT ({current_sql(table, 'NEW')})"
+    sets = ", ".join(f"{name} = {bind(table, expr, new)}" for name, _, expr in columns)
+    of = ", ".join(list(SOURCES[table]) + [name for name, _, _ in columns])
+    return [f"CREATE TRIGGER IF NOT EXISTS derived_{table}_{suffix} AFTER {event} ON {table} WHEN {stale}\n"
+            f"    BEGIN\n        UPDATE {table} SET {sets} WHERE rowid = NEW.rowid;\n    END;"
+            for suffix, event in (("ai", "INSERT"), ("au", f"UPDATE OF {of}"))]
+
+
+def add_derived_columns(connection: Connection, indexes: bool = True) -> list:
+    """
+    Bring an existing database up to date: add missing derived columns (ALTER TABLE, no table rewrite),
+    fill them in one pass, create the guard triggers and DERIVED_INDEXES. Returns ["table.column"] added.
+    """
+    added = []
+    with connection:
+        for table, columns in DERIVED_COLUMNS.items():
+            present = table_columns(connection, table)
+            for name, type_, _ in columns:
+                if name not in present:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {type_};")
+                    added.append(f"{table}.{name}")
+            own = {c: c for c in SOURCES[table]}
+            sets = ", ".join(f"{name} = {bind(table, expr, own)}" for name, _, expr in columns)
+            stale = " OR ".join(f"{name} IS NOT ({bind(table, expr, own)})" for name, _, expr in columns)
+            connection.execute(f"UPDATE {table} SET {sets} WHERE {stale};")
+            for sql in trigger_sql(table):
+                connection.execute(sql)
+        if indexes:
+            for sql in DERIVED_INDEXES.values():
+                connection.execute(sql)
+    return added
+
+
+def ensure_derived(connection: Connection) -> list:
+    """
+    add_derived_columns() if any derived column, guard trigger or index is missing, e.g. on a database
+    built by Q2.py alone; otherwise only a sqlite_master read, cheap enough before every sargable query
+    """
+    names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+    wanted = set(DERIVED_INDEXES) | {f"derived_{t}_{s}" for t in DERIVED_COLUMNS for s in ("ai", "au")}
+    if wanted <= names and all({c for c, _, _ in columns} <= set(table_columns(connection, table))
+                                for table, columns in DERIVED_COLUMNS.items()):
+        return []
+    return add_derived_columns(connection)
+
+
+def run_sargable(connection: Connection, name: str) -> list:
+    """
+    Rows of the sargable variant of report `name`; the variants name their indexes with INDEXED BY,
+    so these are created first if needed
+    """
+    ensure_derived(connection)
+    return connection.execute(SARGABLE[name][1]()).fetchall()
+
+
+def part_6_sargable() -> str:
+    # without ANALYZE statistics the planner prefers the primary key for the join; INDEXED BY keeps
+    # it on the covering index, which must therefore exist (run_sargable / ensure_derived)
+    query = """
+    SELECT i.category,
+           COUNT(*) AS count,
+           ROUND(AVG(o.prison_days), 2) AS avg_prison_time_days
+    FROM incidents i INDEXED BY idx_incidents_category_report
+    INNER JOIN outcomes o INDEXED BY idx_outcomes_report_prison USING (report_id)
+    GROUP BY i.category
+    HAVING COUNT(*) > 50
+    ORDER BY avg_prison_time_days DESC, i.category ASC;
+    """
+    return query
+
+
+def part_7_b_sargable() -> str:
+    # the year comes back as text, as strftime('%Y', date) gives it in part_7_b
+    query = """
+    SELECT CAST(i.year AS TEXT)       AS year,
+           SUM(o.num_ppl_fined)       AS total_ppl_fined,
+           ROUND(SUM(o.fine), 2)      AS total_fine_amount
+    FROM outcomes o INDEXED BY idx_outcomes_fined
+    INNER JOIN incidents i INDEXED BY idx_incidents_report_year USING (report_id)
+    WHERE o.num_ppl_fined >= 1
+    GROUP BY i.year
+    ORDER BY total_fine_amount DESC, year ASC
+    LIMIT 3;
+    """
+    return query
+
+
+def fines_by_month(year: int) -> str:
+    """
+    Monthly fines of one year, a time bucketed report over the same covering indexes
+    """
+    query = f"""
+    SELECT i.month,
+           SUM(o.num_ppl_fined)  AS total_ppl_fined,
+           ROUND(SUM(o.fine), 2) AS total_fine_amount
+    FROM outcomes o INDEXED BY idx_outcomes_fined
+    INNER JOIN incidents i INDEXED BY idx_incidents_report_year USING (report_id)
+    WHERE o.num_ppl_fined >= 1 AND i.year = {int(year)}
+    GROUP BY i.month
+    ORDER BY i.month;
+    """
+    return query
+
+
+def part_6_computed() -> str:
+    # part_6 as it was before the derived columns: prison days computed per row at query time
+    query = f"""
+    SELECT i.category,
+           COUNT(*) AS count,
+           ROUND(AVG({expression("outcomes", "prison_days", "o.")}), 2) AS avg_prison_time_days
+    FROM incidents i
+    INNER JOIN outcomes o USING (report_id)
+    GROUP BY i.category
+    HAVING COUNT(*) > 50
+    ORDER BY avg_prison_time_days DESC, i.category ASC;
+    """
+    return query
+
+
+def part_7_b_computed() -> str:
+    # part_7_b as it was before the derived columns: the year taken from the date at query time
+    query = """
+    SELECT strftime('%Y', i.date)     AS year,
+           SUM(o.num_ppl_fined)       AS total_ppl_fined,
+           ROUND(SUM(o.fine), 2)      AS total_fine_amount
+    FROM incidents i
+    INNER JOIN outcomes o USING (report_id)
+    WHERE o.num_ppl_fined >= 1
+    GROUP BY year
+    ORDER BY total_fine_amount DESC, year ASC
+    LIMIT 3;
+    """
+    return query
+
+
+# report -> (computed at query time, sargable variant returning the same rows)
+SARGABLE = {
+    "part_6": (part_6_computed, part_6_sargable),
+    "part_7_b": (part_7_b_computed, part_7_b_sargable),
+}
+
+
+def _best_ms(connection: Connection, sql: str, repeat: int) -> tuple:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = connection.execute(sql).fetchall()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, round(best * 1000, 3)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Add derived year/month/prison_days columns and compare the reports.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per report")
+    args = parser.parse_args(argv)
+
+    # sqlite3 directly: Q2 imports this module for insert_sql
+    conn = sqlite3.connect(args.db)
+    result = {"added": ensure_derived(conn), "reports": {}}
+    for report, (base, sargable) in SARGABLE.items():
+        base_rows, base_ms = _best_ms(conn, base(), args.repeat)
+        rows, ms = _best_ms(conn, sargable(), args.repeat)
+        result["reports"][report] = {
+            "same": rows == base_rows,
+            "base_ms": base_ms,
+            "sargable_ms": ms,
+            "plan": [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sargable())],
+        }
+    conn.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
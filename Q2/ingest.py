@@ -0,0 +1,188 @@
+import argparse
+import csv
+import json
+import os
+import resource
+import time
+from itertools import islice
+from sqlite3 import Connection
+
+from derived import insert_sql, table_columns
+from Q2 import (create_connection, part_1_a_i, part_1_a_ii, part_1_a_iii, part_2_a, part_2_b, part_2_c,
+                to_float, to_int)
+from search import after_ingest, ensure_search_index
+
+# table -> (csv columns in insert order, per-column converters or None to keep the text)
+TABLES = {
+    "incidents": (("report_id", "category", "date"), None),
+    "details": (("report_id", "subject", "transport_mode", "detection"), None),
+    "outcomes": (("report_id", "outcome", "num_ppl_fined", "fine", "num_ppl_arrested", "prison_time",
+                  "prison_time_unit"),
+                 (str, str, to_int, to_float, to_int, to_float, str)),
+}
+
+# parents first, so the load order also satisfies the foreign keys
+LOAD_ORDER = ("incidents", "details", "outcomes")
+
+# trade durability for speed while the load runs; restored afterwards
+INGEST_PRAGMAS = {
+    "journal_mode": "MEMORY",          # rollback still works, no journal file writes
+    "synchronous": "OFF",
+    "cache_size": -262144,             # KiB, i.e. 256 MiB of page cache
+    "temp_store": "MEMORY",
+}
+
+
+def apply_pragmas(connection: Connection, pragmas: dict) -> dict:
+    """
+    Set the given pragmas and return their previous values
+    """
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = connection.execute(f"PRAGMA {name};").fetchone()[0]
+        connection.execute(f"PRAGMA {name}={value};")
+    return previous
+
+
+def secondary_indexes(connection: Connection, tables) -> list:
+    """
+    [(name, sql)] of the explicitly created indexes on `tables` (primary key autoindexes excluded)
+    """
+    marks = ",".join("?" * len(tables))
+    return connection.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marks})",
+        tuple(tables)).fetchall()
+
+
+def drop_secondary_indexes(connection: Connection, tables) -> list:
+    """
+    Drop the secondary indexes on `tables` and return their [(name, sql)] for rebuilding afterwards.
+    The drops join the open transaction (one is started if there is none), so a load that fails and
+    rolls back gets its indexes back with it.
+    """
+    deferred = secondary_indexes(connection, tables)
+    if deferred and not connection.in_transaction:
+        connection.execute("BEGIN")
+    for name, _ in deferred:
+        connection.execute(f"DROP INDEX IF EXISTS {name};")
+    return deferred
+
+
+def iter_rows(path: str, columns: tuple, converters: tuple = None):
+    """
+    Stream `columns` of every csv row as tuples, converted if `converters` are given
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        r = csv.reader(f)
+        header = next(r)
+        idx = [header.index(c) for c in columns]
+        if converters is None:
+            for row in r:
+                yield tuple([row[i] for i in idx])
+        else:
+            pairs = list(zip(idx, converters))
+            for row in r:
+                yield tuple([conv(row[i]) for i, conv in pairs])
+
+
+def load_table(connection: Connection, table: str, path: str, batch_size: int = 50000) -> int:
+    """
+    Insert a csv into `table` in batches of `batch_size` rows, returns the number of rows.
+    Commits nothing, the caller owns the transaction.
+    """
+    columns, converters = TABLES[table]
+    sql = insert_sql(table, columns, table_columns(connection, table))
+    rows = iter_rows(path, columns, converters)
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return total
+        connection.executemany(sql, batch)
+        total += len(batch)
+
+
+def bulk_ingest(connection: Connection, paths: dict, batch_size: int = 50000, pragmas: dict = INGEST_PRAGMAS,
+                defer_indexes: bool = True, create_indexes: bool = True) -> dict:
+    """
+    Load {table: csv path} into existing tables in one transaction.
+
+    Rows are streamed in fixed-size batches so memory does not grow with the file. Ingest pragmas are
+    applied for the duration of the load. With `defer_indexes`, secondary indexes on the loaded tables
+    are dropped in the load's transaction and rebuilt after the commit (one sort per index instead of a b-tree insert per
+    row); `create_indexes` also builds the part 2 indexes if they did not exist yet.
+    An incident_overviews search index follows the load through its triggers (search.ensure_search_index)
+    and is optimized afterwards (search.after_ingest).
+    Returns per-table rows, seconds and rows/sec plus the index build time.
+    """
+    tables = [t for t in LOAD_ORDER if t in paths]
+    previous = apply_pragmas(connection, pragmas) if pragmas else {}
+    stats = {"tables": {}}
+    try:
+        t0 = time.perf_counter()
+        with connection:
+            deferred = drop_secondary_indexes(connection, tables) if defer_indexes else []
+            if "details" in tables:
+                ensure_search_index(connection)
+            for table in tables:
+                t = time.perf_counter()
+                rows = load_table(connection, table, paths[table], batch_size)
+                elapsed = time.perf_counter() - t
+                stats["tables"][table] = {"rows": rows, "seconds": round(elapsed, 4),
+                                          "rows_per_s": round(rows / elapsed) if elapsed else None}
+        load_s = time.perf_counter() - t0
+
+        t = time.perf_counter()
+        index_sql = [sql for _, sql in deferred]
+        if create_indexes:
+            index_sql += [part_2_a(), part_2_b(), part_2_c()]
+        with connection:
+            for sql in index_sql:
+                connection.execute(sql)
+        # the load went through incident_overviews' triggers, if there is one
+        stats["search_index"] = after_ingest(connection) if "details" in tables else None
+        index_s = time.perf_counter() - t
+    finally:
+        if previous:
+            apply_pragmas(connection, previous)
+
+    rows = sum(s["rows"] for s in stats["tables"].values())
+    stats.update({
+        "rows": rows,
+        "load_s": round(load_s, 4),
+        "index_s": round(index_s, 4),
+        "rows_per_s": round(rows / (load_s + index_s)) if load_s + index_s else None,
+        "batch_size": batch_size,
+        "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+    return stats
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load the Q2 csv files into SQLite.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--data", default="data", help="directory with incidents.csv, details.csv, outcomes.csv")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--no-pragmas", action="store_true", help="load with the connection's default pragmas")
+    parser.add_argument("--no-defer-indexes", action="store_true", help="keep existing indexes during the load")
+    parser.add_argument("--fresh", action="store_true", help="drop and recreate the three tables first")
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    if args.fresh:
+        conn.execute("DROP VIEW IF EXISTS fines;")
+        for table in reversed(LOAD_ORDER):
+            conn.execute(f"DROP TABLE IF EXISTS {table};")
+    for query in (part_1_a_i(), part_1_a_ii(), part_1_a_iii()):
+        conn.execute(query)
+    conn.commit()
+
+    paths = {t: os.path.join(args.data, f"{t}.csv") for t in LOAD_ORDER}
+    stats = bulk_ingest(conn, paths, args.batch_size, pragmas=None if args.no_pragmas else INGEST_PRAGMAS,
+                        defer_indexes=not args.no_defer_indexes)
+    conn.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from sqlite3 import Connection
+
+from derived import insert_sql, table_columns
+from ingest import INGEST_PRAGMAS, LOAD_ORDER, TABLES, apply_pragmas, drop_secondary_indexes
+from Q2 import create_connection, part_1_a_i, part_1_a_ii, part_1_a_iii, part_2_a, part_2_b, part_2_c
+from search import after_ingest, ensure_search_index
+
+_BLOCK = 1 << 16
+_queue = None                          # the batch queue, set in every worker by _init_worker
+
+
+def _next_record_start(f, pos: int, quotes_before: int) -> int:
+    """
+    Offset just after the first newline at or after `pos` that ends a csv record, i.e. where the
+    number of '"' since the start of the file is even; `quotes_before` is that count up to `pos`
+    """
+    f.seek(pos)
+    parity = quotes_before & 1
+    while True:
+        block = f.read(_BLOCK)
+        if not block:
+            return f.tell()
+        start = 0
+        while True:
+            nl = block.find(b"\n", start)
+            if nl < 0:
+                parity ^= block.count(b'"', start) & 1
+                break
+            parity ^= block.count(b'"', start, nl) & 1
+            if not parity:
+                return pos + nl + 1
+            start = nl + 1
+        pos += len(block)
+
+
+def _count_quotes(f, start: int, end: int) -> int:
+    f.seek(start)
+    n = 0
+    while start < end:
+        block = f.read(min(_BLOCK * 16, end - start))
+        if not block:
+            break
+        n += block.count(b'"')
+        start += len(block)
+    return n
+
+
+def record_ranges(path: str, chunk_bytes: int = 8 << 20) -> tuple:
+    """
+    (header, [(start, end), ...]): byte ranges of about `chunk_bytes` covering the data rows, each
+    starting at a record boundary. Quoted fields may contain newlines, so a boundary is a newline
+    preceded by an even number of quotes.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+        bounds = [f.tell()]
+        quotes = header_line.count(b'"')
+        while True:
+            target = bounds[-1] + chunk_bytes
+            if target >= size:
+                break
+            quotes += _count_quotes(f, bounds[-1], target)
+            nxt = _next_record_start(f, target, quotes)
+            if nxt >= size:
+                break
+            quotes += _count_quotes(f, target, nxt)
+            bounds.append(nxt)
+    bounds.append(size)
+    return header, list(zip(bounds, bounds[1:]))
+
+
+def _init_worker(q) -> None:
+    global _queue
+    _queue = q
+
+
+def parse_range(table: str, path: str, start: int, end: int, idx: list, batch_size: int) -> int:
+    """
+    Parse and convert the csv records in [start, end) of `path` and put typed batches of `table` rows
+    on the queue, followed by a ('done', table, rows) marker. Runs in a worker process.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            text = f.read(end - start).decode("utf-8")
+        _, converters = TABLES[table]
+        rows = csv.reader(io.StringIO(text, newline=""))
+        if converters is None:
+            convert = lambda row: tuple([row[i] for i in idx])
+        else:
+            pairs = list(zip(idx, converters))
+            convert = lambda row: tuple([conv(row[i]) for i, conv in pairs])
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(convert(row))
+            if len(batch) >= batch_size:
+                _queue.put(("rows", table, batch))
+                total += len(batch)
+                batch = []
+        if batch:
+            _queue.put(("rows", table, batch))
+            total += len(batch)
+        _queue.put(("done", table, total))
+        return total
+    except BaseException:
+        _queue.put(("error", table, traceback.format_exc()))
+        raise
+
+
+def parallel_ingest(connection: Connection, paths: dict, workers: int = None, batch_size: int = 20000,
+                    chunk_bytes: int = 8 << 20, queue_batches: int = 16, pragmas: dict = INGEST_PRAGMAS,
+                    defer_indexes: bool = True, create_indexes: bool = True) -> dict:
+    """
+    Load {table: csv path} with csv parsing and type conversion spread over `workers` processes.
+
+    Every file is cut into record-aligned byte ranges of about `chunk_bytes` and each range is parsed
+    by a worker, which streams typed batches of `batch_size` rows through a bounded queue (at most
+    `queue_batches` batches in flight, so memory stays flat) to this process. Here a single connection
+    inserts them in one transaction while the workers keep parsing. The rows end up the same as with
+    ingest.bulk_ingest, only their insertion (rowid) order follows batch arrival, and like there an
+    incident_overviews search index follows the load through its triggers and is optimized afterwards.
+    """
+    tables = [t for t in LOAD_ORDER if t in paths]
+    tasks = []
+    for table in tables:
+        header, ranges = record_ranges(paths[table], chunk_bytes)
+        idx = [header.index(c) for c in TABLES[table][0]]
+        tasks += [(table, paths[table], a, b, idx, batch_size) for a, b in ranges if b > a]
+    sql = {t: insert_sql(t, TABLES[t][0], table_columns(connection, t)) for t in tables}
+
+    previous = apply_pragmas(connection, pragmas) if pragmas else {}
+    counts = {t: 0 for t in tables}
+    try:
+        deferred = []
+        t0 = time.perf_counter()
+        ctx = multiprocessing.get_context()
+        q = ctx.Queue(maxsize=queue_batches)
+        insert_s = 0.0
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(q,)) as pool:
+            futures = [pool.submit(parse_range, *task) for task in tasks]
+            pending = len(futures)
+            try:
+                with connection:
+                    if defer_indexes:
+                        deferred = drop_secondary_indexes(connection, tables)
+                    if "details" in tables:
+                        ensure_search_index(connection)
+                    while pending:
+                        try:
+                            kind, table, payload = q.get(timeout=1.0)
+                        except queue_module.Empty:
+                            # a worker that died without reporting surfaces through its future
+                            for fut in futures:
+                                if fut.done() and fut.exception() is not None:
+                                    raise fut.exception()
+                            continue
+                        if kind == "rows":
+                            t = time.perf_counter()
+                            connection.executemany(sql[table], payload)
+                            insert_s += time.perf_counter() - t
+                            counts[table] += len(payload)
+                        elif kind == "done":
+                            pending -= 1
+                        else:
+                            raise RuntimeError(f"parsing {table} failed:\n{payload}")
+            except BaseException:
+                # stop handing out work and drain the queue so no worker stays blocked on put()
+                for fut in futures:
+                    fut.cancel()
+                while not all(fut.done() for fut in futures):
+                    try:
+                        q.get(timeout=0.1)
+                    except queue_module.Empty:
+                        pass
+                raise
+        load_s = time.perf_counter() - t0
+
+        t = time.perf_counter()
+        index_sql = [s for _, s in deferred]
+        if create_indexes:
+            index_sql += [part_2_a(), part_2_b(), part_2_c()]
+        with connection:
+            for s in index_sql:
+                connection.execute(s)
+        search_index = after_ingest(connection) if "details" in tables else None
+        index_s = time.perf_counter() - t
+    finally:
+        if previous:
+            apply_pragmas(connection, previous)
+
+    rows = sum(counts.values())
+    return {
+        "tables": {t: {"rows": n} for t, n in counts.items()},
+        "rows": rows,
+        "chunks": len(tasks),
+        "workers": workers or os.cpu_count(),
+        "load_s": round(load_s, 4),
+        "writer_busy_s": round(insert_s, 4),
+        "index_s": round(index_s, 4),
+        "rows_per_s": round(rows / (load_s + index_s)) if load_s + index_s else None,
+        "search_index": search_index,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load the Q2 csv files with parallel parsing and one SQLite writer.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--data", default="data", help="directory with incidents.csv, details.csv, outcomes.csv")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes, default one per core")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--chunk-mb", type=int, default=8, help="csv bytes parsed per task, MiB")
+    parser.add_argument("--fresh", action="store_true", help="drop and recreate the three tables first")
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    if args.fresh:
+        conn.execute("DROP VIEW IF EXISTS fines;")
+        for table in reversed(LOAD_ORDER):
+            conn.execute(f"DROP TABLE IF EXISTS {table};")
+    for query in (part_1_a_i(), part_1_a_ii(), part_1_a_iii()):
+        conn.execute(query)
+    conn.commit()
+
+    paths = {t: os.path.join(args.data, f"{t}.csv") for t in LOAD_ORDER}
+    stats = parallel_ingest(conn, paths, args.workers, args.batch_size, args.chunk_mb << 20)
+    conn.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from sqlite3 import Connection
+
+from db_pool import report_sql
+from Q2 import create_connection
+
+# string literals and quoted identifiers are kept as written, comments dropped, whitespace runs
+# outside them collapsed to one space
+_SQL_TOKEN = re.compile(r"""
+    (?P<quoted>'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<space>\s+)
+""", re.VERBOSE | re.DOTALL)
+
+# statements whose rows can be reused; anything else (writes, PRAGMA, ATTACH, ...) always runs
+_READ_ONLY = re.compile(r"^(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+
+# functions whose result changes without the data changing
+_VOLATILE = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid|sqlite_offset)\s*\(|'now'"
+    r"|\bcurrent_(time|date|timestamp)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """
+    SQL text with comments removed, whitespace collapsed and trailing semicolons stripped, so the
+    same query written with different layout maps to the same cache entry
+    """
+    def token(m):
+        return m.group("quoted") or " "
+    # the second pass joins the spaces a removed comment leaves next to others
+    return _SQL_TOKEN.sub(token, _SQL_TOKEN.sub(token, sql)).strip().rstrip(";").strip()
+
+
+def _params_key(params):
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    return tuple(params)
+
+
+def _sizeof(rows: list) -> int:
+    """
+    Approximate memory held by a fetched result: the list, its tuples and their values
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+    return size
+
+
+class ResultCache:
+    """
+    Cache of query results for one connection, valid until the database changes.
+
+    Entries are keyed by the normalized SQL and its parameters. Every lookup reads the connection's
+    version: PRAGMA data_version (moves when another connection commits), the connection's own
+    total_changes (its writes, committed or not) and PRAGMA schema_version (DDL, which total_changes
+    doesn't count). Any difference since the entries were stored drops them all. data_version is only
+    comparable on the connection that read it, so a cache belongs to a single connection; with
+    DatabasePool that means one cache per reader.
+
+    Results are kept least recently used first and evicted by their approximate size in bytes, so
+    `max_bytes` bounds the memory. Only SELECT / WITH / VALUES statements that call none of the
+    volatile functions (random(), 'now', ...) are cached, and a statement that turns out to write is
+    never stored.
+    """
+
+    def __init__(self, connection: Connection, max_bytes: int = 16 * 1024 * 1024):
+        self.connection = connection
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (rows, size), least recently used first
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0              # statements run without the cache
+        self.invalidations = 0         # times a change dropped the entries
+        self.evictions = 0
+
+    def version(self) -> tuple:
+        conn = self.connection
+        return (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes,
+                conn.execute("PRAGMA schema_version").fetchone()[0])
+
+    def _check(self) -> tuple:
+        version = self.version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+        return version
+
+    def _store(self, key, rows: list) -> None:
+        size = _sizeof(rows)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (rows, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.evictions += 1
+
+    def query(self, sql: str, params=()) -> list:
+        """
+        Rows of `sql`, like execute_query_and_get_result, from the cache while the database is unchanged
+        """
+        normalized = normalize_sql(sql)
+        try:
+            key = (normalized, _params_key(params))
+            hash(key)
+        except TypeError:
+            key = None
+        if key is None or not _READ_ONLY.match(normalized) or _VOLATILE.search(normalized):
+            with self._lock:
+                self.bypassed += 1
+            return self.connection.execute(sql, params).fetchall()
+
+        with self._lock:
+            version = self._check()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[0])
+            self.misses += 1
+            rows = self.connection.execute(sql, params).fetchall()
+            # a WITH ... DELETE (or a function with side effects) changed something: don't keep it
+            if self._check() == version:
+                self._store(key, rows)
+            return list(rows)
+
+    def report(self, name: str) -> list:
+        """
+        Rows of a part_* report query
+        """
+        return self.query(report_sql(name))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "bypassed": self.bypassed,
+                    "invalidations": self.invalidations, "evictions": self.evictions}
+
+
+def _timed_us(fn, repeat: int) -> tuple:
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return result, round(best * 1e6, 1)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Time the Q2 reports with and without the result cache.")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--reports", default="part_4,part_5,part_6", help="comma separated part_* names")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per report")
+    parser.add_argument("--max-bytes", type=int, default=16 * 1024 * 1024)
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    cache = ResultCache(conn, args.max_bytes)
+    names = [r for r in args.reports.split(",") if r]
+    results = {}
+    for name in names:
+        rows, uncached = _timed_us(lambda: conn.execute(report_sql(name)).fetchall(), args.repeat)
+        cached_rows, cached = _timed_us(lambda: cache.report(name), args.repeat)
+        results[name] = {"same": rows == cached_rows, "uncached_us": uncached, "cached_us": cached}
+
+    # a commit from another connection must be seen. That is shown on a temporary copy, the benchmark
+    # never writes to --db; the row has to really change (SQLite skips rewriting an identical cell).
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, "copy.db")
+        dst = sqlite3.connect(copy)
+        conn.backup(dst)
+        dst.close()
+        copy_conn = create_connection(copy)
+        copy_cache = ResultCache(copy_conn, args.max_bytes)
+        for name in names:
+            copy_cache.report(name)
+        other = sqlite3.connect(copy)
+        with other:
+            other.execute("UPDATE outcomes SET num_ppl_arrested = num_ppl_arrested + 1 "
+                          "WHERE rowid = (SELECT MIN(rowid) FROM outcomes WHERE num_ppl_arrested IS NOT NULL)")
+        other.close()
+        for name in names:
+            before = copy_cache.misses
+            rows = copy_cache.report(name)
+            results[name]["rerun_after_write"] = copy_cache.misses > before
+            results[name]["same_after_write"] = rows == copy_conn.execute(report_sql(name)).fetchall()
+        copy_conn.close()
+    print(json.dumps({"reports": results, "cache": cache.stats()}, indent=2))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
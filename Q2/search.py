@@ -0,0 +1,271 @@
+import argparse
+import json
+import re
+from sqlite3 import Connection, DatabaseError
+
+from Q2 import create_connection, part_8_a, part_8_b
+
+# part_8's incident_overviews (Q2.part_8_a) is the one full text index: external content over
+# details(report_id, subject), so the text lives only in details and the FTS table keeps the inverted
+# index, reading subjects back by rowid for snippets. Prefix indexes on 2-4 characters answer the 'pan*'
+# queries of search-as-you-type without merging every term that starts with 'pan'.
+INDEX = "incident_overviews"
+
+# per column, so autocomplete can offer subject terms only
+INDEX_VOCAB = f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX}_vocab USING fts5vocab({INDEX}, 'col');"
+
+# keep the index in step with details for every writer; an external-content index must be told the old
+# values to delete
+INDEX_TRIGGERS = {
+    f"{INDEX}_ai": f"""
+    CREATE TRIGGER IF NOT EXISTS {INDEX}_ai AFTER INSERT ON details BEGIN
+        INSERT INTO {INDEX}(rowid, report_id, subject) VALUES (new.rowid, new.report_id, new.subject);
+    END;
+    """,
+    f"{INDEX}_ad": f"""
+    CREATE TRIGGER IF NOT EXISTS {INDEX}_ad AFTER DELETE ON details BEGIN
+        INSERT INTO {INDEX}({INDEX}, rowid, report_id, subject)
+        VALUES ('delete', old.rowid, old.report_id, old.subject);
+    END;
+    """,
+    f"{INDEX}_au": f"""
+    CREATE TRIGGER IF NOT EXISTS {INDEX}_au AFTER UPDATE OF report_id, subject ON details
+    WHEN old.report_id IS NOT new.report_id OR old.subject IS NOT new.subject BEGIN
+        INSERT INTO {INDEX}({INDEX}, rowid, report_id, subject)
+        VALUES ('delete', old.rowid, old.report_id, old.subject);
+        INSERT INTO {INDEX}(rowid, report_id, subject) VALUES (new.rowid, new.report_id, new.subject);
+    END;
+    """,
+}
+
+# what earlier layouts left behind: a separate details_fts index with its own triggers
+LEGACY = (("trigger", "details_fts_ai"), ("trigger", "details_fts_ad"), ("trigger", "details_fts_au"),
+          ("table", "details_fts_vocab"), ("table", "details_fts"))
+
+_EXTERNAL = re.compile(r"content\s*=\s*'details'", re.IGNORECASE)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# delta ingest runs between full optimizes of the index, see after_ingest
+OPTIMIZE_EVERY = 20
+
+
+def _schema(connection: Connection, name: str) -> str:
+    row = connection.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def ensure_search_index(connection: Connection, create: bool = False) -> bool:
+    """
+    Make incident_overviews the external-content index with its vocabulary table and sync triggers,
+    inside the caller's transaction. An index of an older layout (part_8's former plain fts5 table, the
+    separate details_fts) is replaced, and one that was missing its triggers may be stale; both are
+    rebuilt from details. Without an index nothing is created unless `create`.
+    Returns None without an index, True if it was (re)built, False if it was already in step.
+    """
+    for kind, name in LEGACY:
+        connection.execute(f"DROP {kind.upper()} IF EXISTS {name};")
+    sql = _schema(connection, INDEX)
+    if sql is None and not create:
+        return None
+    rebuild = sql is None or not _EXTERNAL.search(sql) \
+        or any(_schema(connection, name) is None for name in INDEX_TRIGGERS)
+    if sql is not None and not _EXTERNAL.search(sql):
+        # the old triggers delete by rowid, which an external-content index can't do
+        for name in INDEX_TRIGGERS:
+            connection.execute(f"DROP TRIGGER IF EXISTS {name};")
+        connection.execute(f"DROP TABLE IF EXISTS {INDEX}_vocab;")
+        connection.execute(f"DROP TABLE {INDEX};")
+    connection.execute(part_8_a())
+    connection.execute(INDEX_VOCAB)
+    for trigger in INDEX_TRIGGERS.values():
+        connection.execute(trigger)
+    if rebuild:
+        connection.execute(part_8_b())
+    return rebuild
+
+
+def create_search_index(connection: Connection, rebuild: bool = True) -> int:
+    """
+    Create incident_overviews, its vocabulary table and sync triggers (ensure_search_index); with
+    `rebuild`, index the current details rows even if the index looked in step. Returns the number of
+    indexed rows.
+    """
+    with connection:
+        if ensure_search_index(connection, create=True) is False and rebuild:
+            connection.execute(part_8_b())
+    return connection.execute(f"SELECT COUNT(*) FROM {INDEX}").fetchone()[0]
+
+
+def index_rows(connection: Connection, report_ids: str, delete: bool = False) -> None:
+    """
+    Index (or with `delete`, take out) the details rows whose report_id is IN `report_ids` (a subquery),
+    in rowid order, for a batch writer that suspended INDEX_TRIGGERS: delete before it changes or deletes
+    the rows, index after it wrote them. FTS5 flushes its pending changes to a new segment whenever a
+    document's rowid is not above the last one buffered, so the triggers' delete-then-insert per row
+    writes a segment per row; all deletes and then all inserts in rowid order write one each.
+    """
+    if delete:
+        connection.execute(f"INSERT INTO {INDEX}({INDEX}, rowid, report_id, subject) "
+                           f"SELECT 'delete', rowid, report_id, subject FROM details "
+                           f"WHERE report_id IN ({report_ids}) ORDER BY rowid;")
+    else:
+        connection.execute(f"INSERT INTO {INDEX}(rowid, report_id, subject) "
+                           f"SELECT rowid, report_id, subject FROM details "
+                           f"WHERE report_id IN ({report_ids}) ORDER BY rowid;")
+
+
+def drop_search_index(connection: Connection) -> None:
+    with connection:
+        for name in INDEX_TRIGGERS:
+            connection.execute(f"DROP TRIGGER IF EXISTS {name};")
+        connection.execute(f"DROP TABLE IF EXISTS {INDEX}_vocab;")
+        connection.execute(f"DROP TABLE IF EXISTS {INDEX};")
+
+
+def to_match(text: str, prefix: bool = False) -> str:
+    """
+    FTS5 MATCH expression for free text: every word must occur in the subject, the last one as a prefix
+    with `prefix` (as typed into a search box). Words are quoted so user input can't be a syntax error.
+    """
+    words = _TOKEN.findall(text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    if prefix:
+        terms[-1] += "*"
+    return f"subject : ({' '.join(terms)})"
+
+
+def search(connection: Connection, text: str, limit: int = 20, after: list = None, raw: bool = False,
+           prefix: bool = False, marks: tuple = ("[", "]"), tokens: int = 12) -> dict:
+    """
+    bm25-ranked details matching `text`, best first, `limit` per page.
+
+    Each hit has the report_id, its score (lower is better, as bm25() returns it), the rowid and a
+    snippet of the subject with the matches wrapped in `marks`. Pages are keyset paginated on
+    (score, rowid): pass the returned "next" as `after` to get the following page, which costs
+    the same as the first instead of growing like OFFSET. `raw` takes `text` as an FTS5 query.
+    """
+    match = text if raw else to_match(text, prefix)
+    if not match:
+        return {"results": [], "next": None}
+    # rank every match but carry only (rowid, rank) through the sort; the report_id (read from details)
+    # and the snippet are fetched for the page alone
+    sql = f"""
+    SELECT rowid, rank
+    FROM {INDEX}
+    WHERE {INDEX} MATCH ?{" AND (rank > ? OR (rank = ? AND rowid > ?))" if after else ""}
+    ORDER BY rank, rowid
+    LIMIT ?;
+    """
+    params = [match]
+    if after:
+        params += [after[0], after[0], after[1]]
+    page = connection.execute(sql, params + [limit]).fetchall()
+    if not page:
+        return {"results": [], "next": None}
+    marks_sql = ",".join("?" * len(page))
+    found = {rowid: (rid, snippet) for rowid, rid, snippet in connection.execute(
+        f"SELECT rowid, report_id, snippet({INDEX}, 1, ?, ?, '…', {int(tokens)}) FROM {INDEX} "
+        f"WHERE {INDEX} MATCH ? AND rowid IN ({marks_sql})", [marks[0], marks[1], match] + [r for r, _ in page])}
+    results = [{"rowid": rowid, "report_id": found[rowid][0], "score": score, "snippet": found[rowid][1]}
+               for rowid, score in page]
+    nxt = [results[-1]["score"], results[-1]["rowid"]] if len(results) == limit else None
+    return {"results": results, "next": nxt}
+
+
+def autocomplete(connection: Connection, prefix: str, limit: int = 10) -> list:
+    """
+    [(term, documents)] of indexed subject terms starting with `prefix`, most frequent first
+    """
+    prefix = prefix.lower()
+    if not prefix:
+        return []
+    # the vocabulary is sorted by term, so the prefix is a range
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return connection.execute(
+        f"SELECT term, doc FROM {INDEX}_vocab WHERE col = 'subject' AND term >= ? AND term < ? "
+        "ORDER BY doc DESC, term LIMIT ?",
+        (prefix, upper, limit)).fetchall()
+
+
+def merge(connection: Connection, pages: int = 500) -> int:
+    """
+    One bounded step of incremental segment merging, cheap enough to run after every ingest.
+    Returns the changes the step made, roughly the pages written; 0 once there is nothing left
+    worth merging, so `while merge(conn): pass` ends.
+    """
+    with connection:
+        before = connection.total_changes
+        connection.execute(f"INSERT INTO {INDEX}({INDEX}, rank) VALUES ('merge', ?);", (pages,))
+        changes = connection.total_changes - before
+    # the 'merge' command itself counts as one change; FTS5 documents fewer than 2 as a no-op
+    return changes if changes >= 2 else 0
+
+
+def optimize(connection: Connection) -> None:
+    """
+    Merge every segment into one, the fastest layout to query; rewrites the whole index
+    """
+    with connection:
+        connection.execute(f"INSERT INTO {INDEX}({INDEX}) VALUES ('optimize');")
+
+
+def after_ingest(connection: Connection, run: int = None, pages: int = 500) -> str:
+    """
+    Index upkeep for the ingest paths. After a bulk load (`run` None) the index was mostly rewritten,
+    so it is optimized; after delta run `run` one bounded merge step tidies the new segments, and every
+    OPTIMIZE_EVERY runs a full optimize. Returns what was done, None without an incident_overviews index.
+    """
+    if _schema(connection, INDEX) is None:
+        return None
+    if run is None or run % OPTIMIZE_EVERY == 0:
+        optimize(connection)
+        return "optimize"
+    merge(connection, pages)
+    return "merge"
+
+
+def check(connection: Connection) -> bool:
+    """
+    True if the index matches the details table ('integrity-check' with the content table)
+    """
+    try:
+        connection.execute(f"INSERT INTO {INDEX}({INDEX}, rank) VALUES ('integrity-check', 1);")
+        return True
+    except DatabaseError:
+        return False
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Full text search over the Q2 incident subjects.")
+    parser.add_argument("query", nargs="?", default=None, help="words to search for")
+    parser.add_argument("--db", default="Q2")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--after", default=None, help="the 'next' cursor of the previous page, as JSON")
+    parser.add_argument("--prefix", action="store_true", help="treat the last word as a prefix")
+    parser.add_argument("--raw", action="store_true", help="the query is FTS5 syntax")
+    parser.add_argument("--complete", default=None, help="list terms starting with this prefix")
+    parser.add_argument("--rebuild", action="store_true", help="(re)create and fill the index first")
+    parser.add_argument("--optimize", action="store_true", help="merge the index into one segment")
+    args = parser.parse_args(argv)
+
+    conn = create_connection(args.db)
+    with conn:
+        built = ensure_search_index(conn, create=True)
+    if args.rebuild or built:
+        print(json.dumps({"indexed": create_search_index(conn, rebuild=args.rebuild)}))
+    if args.optimize:
+        optimize(conn)
+    if args.complete is not None:
+        print(json.dumps(autocomplete(conn, args.complete, args.limit)))
+    if args.query is not None:
+        after = json.loads(args.after) if args.after else None
+        print(json.dumps(search(conn, args.query, args.limit, after, args.raw, args.prefix), ensure_ascii=False,
+                         indent=2))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+Q2_DIR = os.path.dirname(HERE)
+# the modules import each other as top-level names, the way they run from Q2/
+sys.path.insert(0, Q2_DIR)
+
+from aggregates import create_aggregates  # noqa: E402
+from ingest import bulk_ingest  # noqa: E402
+from Q2 import create_connection, part_1_a_i, part_1_a_ii, part_1_a_iii  # noqa: E402
+from search import create_search_index  # noqa: E402
+
+DATA = {table: os.path.join(Q2_DIR, "data", f"{table}.csv") for table in ("incidents", "details", "outcomes")}
+
+
+@pytest.fixture
+def paths() -> dict:
+    return dict(DATA)
+
+
+@pytest.fixture
+def connection(tmp_path):
+    """
+    A database loaded the way a reload does it: tables, data, part 2 indexes, search index, aggregates
+    """
+    conn = create_connection(str(tmp_path / "q2.db"))
+    for query in (part_1_a_i(), part_1_a_ii(), part_1_a_iii()):
+        conn.execute(query)
+    conn.commit()
+    bulk_ingest(conn, DATA)
+    create_search_index(conn)
+    create_aggregates(conn)
+    yield conn
+    conn.close()
@@ -0,0 +1,30 @@
+from aggregates import verify_aggregates
+
+
+def problems(connection) -> dict:
+    return {name: found for name, found in verify_aggregates(connection).items() if found}
+
+
+def test_filled_aggregates_match(connection):
+    assert problems(connection) == {}
+
+
+def test_aggregates_follow_updates(connection):
+    with connection:
+        connection.execute("UPDATE incidents SET date = '2011-01-01' WHERE rowid % 9 = 0")
+        connection.execute("UPDATE outcomes SET prison_time = 3, prison_time_unit = 'months' WHERE rowid % 7 = 0")
+        connection.execute("UPDATE outcomes SET num_ppl_fined = 2, fine = 150.5 WHERE rowid % 5 = 0")
+        connection.execute("UPDATE details SET detection = 'Inspection' WHERE rowid % 4 = 0")
+    assert problems(connection) == {}
+
+
+def test_aggregates_follow_inserts_and_deletes(connection):
+    with connection:
+        connection.execute("INSERT INTO incidents(report_id, category, date) VALUES ('T1', '1. Seizure', '2016-05-01')")
+        connection.execute("INSERT INTO details(report_id, subject, detection) VALUES ('T1', 'test', 'Inspection')")
+        connection.execute("INSERT INTO outcomes(report_id, outcome, num_ppl_fined, fine, prison_time, "
+                           "prison_time_unit) VALUES ('T1', 'o', 3, 100.5, 2, 'years')")
+        connection.execute("DELETE FROM outcomes WHERE rowid % 11 = 0")
+        connection.execute("DELETE FROM details WHERE rowid % 12 = 0")
+        connection.execute("DELETE FROM incidents WHERE rowid % 13 = 0")
+    assert problems(connection) == {}
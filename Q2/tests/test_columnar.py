@@ -0,0 +1,18 @@
+from columnar import ColumnarCache, export_columnar, verify_columnar
+
+
+def test_reports_agree_with_sql(connection, tmp_path):
+    directory = str(tmp_path / "columnar")
+    export_columnar(connection, directory)
+    cache = ColumnarCache(directory)
+    assert cache.is_current(connection)
+    problems = verify_columnar(connection, cache)
+    assert problems and not any(problems.values())
+
+
+def test_cache_goes_stale_on_write(connection, tmp_path):
+    directory = str(tmp_path / "columnar")
+    export_columnar(connection, directory)
+    with connection:
+        connection.execute("UPDATE outcomes SET fine = fine + 1 WHERE rowid = 1")
+    assert not ColumnarCache(directory).is_current(connection)
@@ -0,0 +1,41 @@
+import search
+from aggregates import verify_aggregates
+from bench_ingest import changed_extract
+from delta_ingest import delta_ingest
+
+
+def test_reapplied_extract_changes_nothing(connection, paths, tmp_path):
+    full, delta = changed_extract(paths, str(tmp_path), 1.0)
+    first = delta_ingest(connection, delta)
+    assert first["changed"] > 0
+    assert all(c["updated"] for c in first["tables"].values())
+
+    again = delta_ingest(connection, delta)
+    assert again["changed"] == 0
+    # the full extract holds the same rows, so only hashing happens
+    again = delta_ingest(connection, full, snapshot=True)
+    assert again["changed"] == 0
+    assert all(c["unchanged"] == c["rows"] for c in again["tables"].values())
+
+    logged = connection.execute("SELECT COUNT(*) FROM change_log WHERE run = ?", (first["run"],)).fetchone()[0]
+    assert logged == first["changed"]
+    assert not any(verify_aggregates(connection).values())
+    assert search.check(connection)
+
+
+def test_snapshot_deletes_missing_rows(connection, paths, tmp_path):
+    full, _ = changed_extract(paths, str(tmp_path), 1.0)
+    with open(full["details"], encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(full["details"], "w", encoding="utf-8") as f:
+        f.writelines(lines[:1] + lines[2:])
+    stats = delta_ingest(connection, full, snapshot=True)
+    assert stats["tables"]["details"]["deleted"] == 1
+    assert not any(verify_aggregates(connection).values())
+    assert search.check(connection)
+    # the suspended triggers are back
+    with connection:
+        connection.execute("UPDATE outcomes SET fine = 1 WHERE rowid % 3 = 0")
+        connection.execute("UPDATE details SET subject = 'edited' WHERE rowid % 3 = 0")
+    assert not any(verify_aggregates(connection).values())
+    assert search.check(connection)
@@ -0,0 +1,16 @@
+import search
+
+
+def test_index_in_step_after_load(connection):
+    assert search.ensure_search_index(connection) is False
+    assert search.check(connection)
+
+
+def test_index_follows_edits(connection):
+    with connection:
+        connection.execute("UPDATE details SET subject = 'dead pangolin amended' WHERE rowid % 50 = 0")
+        connection.execute("DELETE FROM details WHERE rowid % 77 = 0")
+        connection.execute("INSERT INTO details(report_id, subject) VALUES ('T1', 'pangolin scales seized')")
+    assert search.check(connection)
+    hits = search.search(connection, "pangolin scales", limit=50)["results"]
+    assert "T1" in [hit["report_id"] for hit in hits]